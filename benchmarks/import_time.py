@@ -0,0 +1,156 @@
+"""Benchmarks of the time to import jsonrpcserver, and to handle a first request.
+
+    $ python benchmarks/import_time.py                # Run them all
+    $ python benchmarks/import_time.py --detail sync  # The slowest modules to import
+    $ python benchmarks/import_time.py -o after.json  # Save the results
+    $ python benchmarks/import_time.py --compare before.json after.json
+
+This is what a CLI tool or a serverless function handling one request pays on every
+start. Each scenario is run in a fresh interpreter, repeatedly, and the time is the
+median, less that of an interpreter that does nothing.
+
+Run from the root of the repo (or with jsonrpcserver installed).
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+
+PING = '{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+
+SCENARIOS = {
+    "import": "import jsonrpcserver",
+    "sync": "from jsonrpcserver import dispatch, method, Success",
+    "async": "from jsonrpcserver import async_dispatch, method, Success",
+    "sync_first_request": f"""
+from jsonrpcserver import dispatch, method, Success
+method(lambda: Success("pong"), name="ping")
+dispatch({PING!r})
+""",
+    "async_first_request": f"""
+import asyncio
+from jsonrpcserver import async_dispatch, method, Success
+method(lambda: Success("pong"), name="ping")
+asyncio.run(async_dispatch({PING!r}))
+""",
+    "jsonschema_validator": f"""
+from jsonrpcserver import dispatch, method, Success
+from jsonrpcserver.main import jsonschema_validator
+method(lambda: Success("pong"), name="ping")
+dispatch({PING!r}, validator=jsonschema_validator)
+""",
+}
+
+
+def run_python(code: str, *options: str) -> Tuple[float, str]:
+    """Run code in a fresh interpreter, giving the time taken and its stderr."""
+    env = {**os.environ, "PYTHONPATH": ROOT, "PYTHONDONTWRITEBYTECODE": "1"}
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, *options, "-c", code],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return time.perf_counter() - start, completed.stderr
+
+
+def median_time(code: str, repeat: int) -> float:
+    """The median seconds to run code in a fresh interpreter."""
+    return statistics.median(run_python(code)[0] for _ in range(repeat))
+
+
+def run(pattern: str = "", repeat: int = 20) -> Dict[str, float]:
+    """Run the scenarios with pattern in their name, printing the milliseconds each
+    takes, over an empty interpreter's start up.
+    """
+    run_python("import jsonrpcserver")  # Warm up the filesystem cache
+    baseline = median_time("pass", repeat)
+    results = {}
+    for name, code in SCENARIOS.items():
+        if pattern in name:
+            results[name] = (median_time(code, repeat) - baseline) * 1000
+            print(f"{name:25} {results[name]:8.1f}ms")
+    return results
+
+
+def detail(name: str, top: int = 15) -> None:
+    """Print the modules with the longest cumulative import times in a scenario, from
+    python -X importtime.
+    """
+    _, stderr = run_python(SCENARIOS[name], "-X", "importtime")
+    rows: List[Tuple[int, str]] = []
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, microseconds, module = line.split("|")
+            if microseconds.strip().isdigit():
+                rows.append((int(microseconds), module.rstrip()))
+    for cumulative, module in sorted(rows, reverse=True)[:top]:
+        print(f"{cumulative / 1000:8.1f}ms {module}")
+
+
+def save(results: Dict[str, float], path: str) -> None:
+    """Save the results as JSON, with the Python version and platform."""
+    Path(path).write_text(
+        json.dumps(
+            {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results_ms": results,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+
+
+def compare(before_path: str, after_path: str) -> None:
+    """Print the change in each scenario's time between two saved results."""
+    before = json.loads(Path(before_path).read_text(encoding="utf-8"))["results_ms"]
+    after = json.loads(Path(after_path).read_text(encoding="utf-8"))["results_ms"]
+    for name in (name for name in after if name in before):
+        print(
+            f"{name:25} {before[name]:8.1f}ms -> {after[name]:8.1f}ms"
+            f"  ({after[name] / before[name] - 1:+.1%})"
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the benchmarks, or show the detail of one, or compare saved results."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("-k", default="", help="Only run scenarios matching this")
+    parser.add_argument(
+        "-n", "--repeat", type=int, default=20, help="Runs of each scenario"
+    )
+    parser.add_argument("-o", "--output", help="Save the results as JSON")
+    parser.add_argument(
+        "--detail", choices=SCENARIOS, help="Show the slowest imports of a scenario"
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="Compare two saved results",
+    )
+    args = parser.parse_args(argv)
+    if args.detail:
+        detail(args.detail)
+    elif args.compare:
+        compare(*args.compare)
+    else:
+        results = run(args.k, args.repeat)
+        if args.output:
+            save(results, args.output)
+
+
+if __name__ == "__main__":
+    main()
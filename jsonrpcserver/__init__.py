@@ -1,32 +1,118 @@
-"""Use __all__ so mypy considers these re-exported."""
+"""Use __all__ so mypy considers these re-exported.
+
+The names are imported lazily, on first use, so importing jsonrpcserver is quick, and
+the async stack and the server are only imported by programs that use them.
+"""
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
 __all__ = [
+    "Cache",
     "Error",
     "InvalidParams",
     "JsonRpcError",
+    "RateLimit",
     "Result",
     "Success",
     "async_dispatch",
+    "async_dispatch_to_bytes",
+    "async_dispatch_incremental",
+    "async_dispatch_to_bytes_stream",
     "async_dispatch_to_response",
+    "async_dispatch_to_response_stream",
     "async_dispatch_to_serializable",
     "dispatch",
+    "dispatch_incremental",
+    "dispatch_to_bytes",
+    "dispatch_to_bytes_stream",
     "dispatch_to_response",
+    "dispatch_to_response_stream",
     "dispatch_to_serializable",
     "method",
     "serve",
 ]
 
+# Where each name is imported from: the module, and the name in it.
+LAZY_NAMES = {
+    "Cache": (".cache", "Cache"),
+    "Error": (".result", "Error"),
+    "InvalidParams": (".result", "InvalidParams"),
+    "JsonRpcError": (".exceptions", "JsonRpcError"),
+    "RateLimit": (".rate_limit", "RateLimit"),
+    "Result": (".result", "Result"),
+    "Success": (".result", "Success"),
+    "async_dispatch": (".async_main", "dispatch"),
+    "async_dispatch_to_bytes": (".async_main", "dispatch_to_bytes"),
+    "async_dispatch_incremental": (".async_main", "dispatch_incremental"),
+    "async_dispatch_to_bytes_stream": (".async_main", "dispatch_to_bytes_stream"),
+    "async_dispatch_to_response": (".async_main", "dispatch_to_response"),
+    "async_dispatch_to_response_stream": (
+        ".async_main",
+        "dispatch_to_response_stream",
+    ),
+    "async_dispatch_to_serializable": (".async_main", "dispatch_to_serializable"),
+    "dispatch": (".main", "dispatch"),
+    "dispatch_incremental": (".main", "dispatch_incremental"),
+    "dispatch_to_bytes": (".main", "dispatch_to_bytes"),
+    "dispatch_to_bytes_stream": (".main", "dispatch_to_bytes_stream"),
+    "dispatch_to_response": (".main", "dispatch_to_response"),
+    "dispatch_to_response_stream": (".main", "dispatch_to_response_stream"),
+    "dispatch_to_serializable": (".main", "dispatch_to_serializable"),
+    "method": (".methods", "method"),
+    "serve": (".server", "serve"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Import a public name on first use (PEP 562)."""
+    try:
+        module, attr = LAZY_NAMES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), attr)
+    globals()[name] = value  # So __getattr__ isn't needed next time
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + __all__)
+
 
-from .async_main import (
-    dispatch as async_dispatch,
-)
-from .async_main import (
-    dispatch_to_response as async_dispatch_to_response,
-)
-from .async_main import (
-    dispatch_to_serializable as async_dispatch_to_serializable,
-)
-from .exceptions import JsonRpcError
-from .main import dispatch, dispatch_to_response, dispatch_to_serializable
-from .methods import method
-from .result import Error, InvalidParams, Result, Success
-from .server import serve
+if TYPE_CHECKING:  # pragma: no cover
+    # pylint: disable=ungrouped-imports
+    from .async_main import (
+        dispatch as async_dispatch,
+    )
+    from .async_main import (
+        dispatch_incremental as async_dispatch_incremental,
+    )
+    from .async_main import (
+        dispatch_to_bytes as async_dispatch_to_bytes,
+    )
+    from .async_main import (
+        dispatch_to_bytes_stream as async_dispatch_to_bytes_stream,
+    )
+    from .async_main import (
+        dispatch_to_response as async_dispatch_to_response,
+    )
+    from .async_main import (
+        dispatch_to_response_stream as async_dispatch_to_response_stream,
+    )
+    from .async_main import (
+        dispatch_to_serializable as async_dispatch_to_serializable,
+    )
+    from .cache import Cache
+    from .exceptions import JsonRpcError
+    from .main import (
+        dispatch,
+        dispatch_incremental,
+        dispatch_to_bytes,
+        dispatch_to_bytes_stream,
+        dispatch_to_response,
+        dispatch_to_response_stream,
+        dispatch_to_serializable,
+    )
+    from .methods import method
+    from .rate_limit import RateLimit
+    from .result import Error, InvalidParams, Result, Success
+    from .server import serve
@@ -0,0 +1,92 @@
+"""Serve JSON-RPC over HTTP from the command line.
+
+    $ python -m jsonrpcserver --host 0.0.0.0 --port 5000 --methods mymodule
+
+The methods module is imported, so any functions in it decorated with @method are
+served.
+"""
+import argparse
+import importlib
+import logging
+from typing import List, Optional
+
+from .async_server import run
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m jsonrpcserver", description="Serve JSON-RPC over HTTP."
+    )
+    parser.add_argument("--host", default="", help="Address to bind to (default: all)")
+    parser.add_argument("--port", type=int, default=5000, help="Port (default: 5000)")
+    parser.add_argument(
+        "--methods",
+        action="append",
+        default=[],
+        metavar="MODULE",
+        help="Module to import methods from (can be given more than once)",
+    )
+    parser.add_argument("--max-connections", type=int, default=1000)
+    parser.add_argument("--idle-timeout", type=float, default=60.0)
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--max-batch-size", type=int, help="Reject batches with more requests"
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        help="Most requests from one batch to dispatch at a time",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        help="Most requests to dispatch at a time, across all connections",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Seconds to allow a request, before cancelling it with a Timeout error",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes (default: 1)"
+    )
+    parser.add_argument(
+        "--max-requests",
+        type=int,
+        help="Restart a worker after it dispatches this many requests",
+    )
+    parser.add_argument(
+        "--pin-cpus", action="store_true", help="Pin each worker to a CPU"
+    )
+    parser.add_argument(
+        "--metrics", action="store_true", help="Serve metrics at /metrics"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Import the methods modules (once, before any workers are forked) and serve."""
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    for module in args.methods:
+        importlib.import_module(module)
+    run(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        pin_cpus=args.pin_cpus,
+        max_requests=args.max_requests,
+        max_connections=args.max_connections,
+        idle_timeout=args.idle_timeout,
+        shutdown_timeout=args.shutdown_timeout,
+        max_batch_size=args.max_batch_size,
+        max_concurrency=args.max_concurrency,
+        max_in_flight=args.max_in_flight,
+        timeout=args.timeout,
+        metrics=args.metrics,
+    )
+
+
+if __name__ == "__main__":
+    main()
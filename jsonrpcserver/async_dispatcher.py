@@ -1,31 +1,67 @@
-"""Async version of dispatcher.py"""
+"""Async version of dispatcher.py
+
+Methods can be coroutine functions, or plain functions. Plain functions are run in an
+executor (by default the loop's default thread pool) so they don't block the event
+loop.
+
+A method call that overruns its timeout (from @method(timeout=...)), or the dispatch's
+timeout, is cancelled and gets a Timeout error; the rest of a batch is unaffected.
+Note a plain function can't be stopped - its thread runs on, but isn't waited for.
+"""
 import asyncio
+import inspect
 import logging
-from functools import partial
-from itertools import starmap
-from typing import Any, Callable, Iterable, Tuple, Union
-
-from oslash.either import Left  # type: ignore
+from concurrent.futures import Executor
+from contextvars import copy_context
+from functools import lru_cache, partial
+from time import perf_counter
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
 
+from .background import AsyncBackgroundQueue, QueueFull
+from .cache import canonical_key
+from .codec import RequestData
 from .dispatcher import (
     Deserialized,
+    check_rate_limit,
     create_request,
+    deserialize_batch_item,
     deserialize_request,
     extract_args,
     extract_kwargs,
     extract_list,
+    get_batch_size,
     get_method,
-    not_notification,
+    respond,
     to_response,
+    to_responses,
     validate_args,
+    validate_batch_size,
     validate_request,
     validate_result,
 )
+from .either import Left, Right
 from .exceptions import JsonRpcError
-from .methods import Method, Methods
+from .hooks import error_code, hooks, report
+from .methods import Method, Methods, get_options, unwrap
+from .process_pool import submit
 from .request import Request
+from .sentinels import NOID
 from .response import Response, ServerErrorResponse
-from .result import ErrorResult, InternalErrorResult, Result
+from .result import ErrorResult, InternalErrorResult, Result, TimeoutResult
+from .single_flight import coalesce
 from .utils import make_list
 
 logger = logging.getLogger(__name__)
@@ -33,71 +69,314 @@ logger = logging.getLogger(__name__)
 # pylint: disable=missing-function-docstring,duplicate-code
 
 
-async def call(request: Request, context: Any, method: Method) -> Result:
+def is_coroutine_method(method: Method) -> bool:
+    """True if calling the method gives a coroutine, which can be awaited in the loop.
+    Includes objects with an async __call__.
+    """
+    method = unwrap(method)
+    return inspect.iscoroutinefunction(method) or inspect.iscoroutinefunction(
+        getattr(method, "__call__", None)
+    )
+
+
+@lru_cache(maxsize=1024)
+def is_coroutine_method_cached(method: Method) -> bool:
+    """Cached version of is_coroutine_method, so methods are checked only once."""
+    return is_coroutine_method(method)
+
+
+def is_async(method: Method) -> bool:
     try:
-        result = await method(
-            *extract_args(request, context), **extract_kwargs(request)
+        return is_coroutine_method_cached(method)
+    except TypeError:  # Unhashable
+        return is_coroutine_method(method)
+
+
+async def invoke(
+    method: Method,
+    args: List[Any],
+    kwargs: Dict[str, Any],
+    executor: Optional[Executor],
+) -> Any:
+    """Call the method, awaiting it if it's a coroutine function, otherwise running it
+    in the executor (or the process pool, for methods with executor="process").
+    """
+    if get_options(method).executor == "process":
+        return await asyncio.wrap_future(submit(method, args, kwargs))
+    if is_async(method):
+        return await method(*args, **kwargs)
+    # Run in a thread, with a copy of the context variables like asyncio.to_thread.
+    result: Any = await asyncio.get_running_loop().run_in_executor(
+        executor, partial(copy_context().run, method, *args, **kwargs)
+    )
+    # A plain function that returns an awaitable.
+    return (await result) if inspect.isawaitable(result) else result
+
+
+def get_timeout(method: Method, deadline: Optional[float]) -> Optional[float]:
+    """Seconds the method can run for - the method's own timeout, or until the dispatch
+    deadline, whichever is sooner.
+    """
+    timeout = get_options(method).timeout
+    if deadline is None:
+        return timeout
+    remaining = deadline - asyncio.get_running_loop().time()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+class MethodTimeout(Exception):
+    """The method didn't complete within its timeout."""
+
+
+async def invoke_with_timeout(awaitable: Awaitable[Any], timeout: float) -> Any:
+    """Like asyncio.wait_for, but raises MethodTimeout, so it can't be confused with a
+    TimeoutError raised inside the method.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    finally:
+        # Cancel the call if it overran, or if we were cancelled.
+        if not task.done():
+            task.cancel()
+            await asyncio.wait({task})
+    if not done:
+        raise MethodTimeout
+    return task.result()
+
+
+async def call(
+    request: Request,
+    context: Any,
+    method: Method,
+    *,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+) -> Result:
+    try:
+        awaitable = invoke(
+            method, extract_args(request, context), extract_kwargs(request), executor
+        )
+        timeout = get_timeout(method, deadline)
+        result = await (
+            awaitable if timeout is None else invoke_with_timeout(awaitable, timeout)
         )
         validate_result(result)
+    except MethodTimeout:
+        return Left(TimeoutResult())
     except JsonRpcError as exc:
         return Left(ErrorResult(code=exc.code, message=exc.message, data=exc.data))
     except Exception as exc:  # pylint: disable=broad-except
         # Other error inside method - Internal error
         logger.exception(exc)
         return Left(InternalErrorResult(str(exc)))
-    return result
+    return cast(Result, result)
+
+
+async def call_cached(
+    request: Request,
+    context: Any,
+    method: Method,
+    *,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+) -> Result:
+    """Call the method, or give its cached result if it has a cache (see cache.py).
+
+    With single_flight, the call is shared with any identical calls in flight (see
+    single_flight.py). The shared call runs without a deadline; each caller waits for it
+    until its own deadline.
+    """
+    options = get_options(method)
+    cache = options.cache
+    if cache is None and not options.single_flight:
+        return await call(
+            request, context, method, executor=executor, deadline=deadline
+        )
+    key = canonical_key(request.params) if cache is None else cache.key(request.params)
+    if cache is not None and (cached := cache.get(key)) is not None:
+        return cached
+
+    async def call_and_cache(deadline: Optional[float] = None) -> Result:
+        result = await call(
+            request, context, method, executor=executor, deadline=deadline
+        )
+        if cache is not None:
+            cache.put(key, result)
+        return result
+
+    if not options.single_flight:
+        return await call_and_cache(deadline)
+    timeout = None if deadline is None else deadline - asyncio.get_running_loop().time()
+    try:
+        return cast(Result, await coalesce((method, key), call_and_cache, timeout))
+    except asyncio.TimeoutError:
+        return Left(TimeoutResult())
 
 
 async def dispatch_request(
-    methods: Methods, context: Any, request: Request
+    methods: Methods,
+    context: Any,
+    request: Request,
+    *,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+    batch_size: Optional[int] = None,
 ) -> Tuple[Request, Result]:
-    method = get_method(methods, request.method).bind(
-        partial(validate_args, request, context)
-    )
-    return (
-        request,
-        method
-        if isinstance(method, Left)
-        else await call(
+    start = perf_counter() if hooks else 0.0
+    method = check_rate_limit(context, get_method(methods, request.method))
+    if hooks:
+        start = report("lookup", start, request.method, batch_size, error_code(method))
+    if isinstance(method, Right):
+        method = validate_args(
             request, context, method._value  # pylint: disable=protected-access
-        ),
-    )
+        )
+        if hooks:
+            start = report(
+                "bind", start, request.method, batch_size, error_code(method)
+            )
+        if isinstance(method, Right):
+            result: Optional[Result] = None
+            try:
+                result = await call_cached(
+                    request,
+                    context,
+                    method._value,  # pylint: disable=protected-access
+                    executor=executor,
+                    deadline=deadline,
+                )
+            finally:
+                # Reported however the call ends, so the in-flight gauge always goes
+                # back down.
+                if hooks and result is None:
+                    report("cancelled", start, request.method, batch_size)
+                elif hooks:
+                    report(
+                        "call", start, request.method, batch_size, error_code(result)
+                    )
+            return (request, result)
+    return (request, method)
+
+
+async def dispatch_limited(
+    semaphore: asyncio.Semaphore,
+    methods: Methods,
+    context: Any,
+    request: Request,
+    **options: Any,
+) -> Tuple[Request, Result]:
+    """Dispatch once the semaphore allows, limiting requests in flight."""
+    async with semaphore:
+        return await dispatch_request(methods, context, request, **options)
+
+
+async def gather_limited(
+    dispatch: Callable[[Request], Awaitable[Tuple[Request, Result]]],
+    requests: List[Request],
+    max_concurrency: Optional[int],
+) -> List[Tuple[Request, Result]]:
+    """Dispatch the requests, at most max_concurrency at a time, giving the results in
+    the order of the requests.
+
+    Rather than starting a coroutine for every request, which would all be waiting on a
+    semaphore, only max_concurrency workers are started, taking requests in turn.
+    """
+    if max_concurrency is None or max_concurrency >= len(requests):
+        return list(await asyncio.gather(*map(dispatch, requests)))
+    results: List[Any] = [None] * len(requests)
+    pending = iter(enumerate(requests))
+
+    async def worker() -> None:
+        for index, request in pending:
+            results[index] = await dispatch(request)
+
+    await asyncio.gather(*(worker() for _ in range(max_concurrency)))
+    return results
+
+
+async def submit_notifications(
+    background: AsyncBackgroundQueue,
+    dispatch: Callable[[Request], Awaitable[Any]],
+    requests: List[Request],
+) -> List[Request]:
+    """Hand the notifications to the background queue (see background.py).
+
+    Returns: The other requests, to be dispatched now.
+    """
+    for request in requests:
+        if request.id is NOID:
+            await background.submit(dispatch, request)
+    return [request for request in requests if request.id is not NOID]
 
 
 async def dispatch_deserialized(
     methods: Methods,
     context: Any,
-    post_process: Callable[[Response], Iterable[Any]],
+    post_process: Callable[[Response], Any],
     deserialized: Deserialized,
-) -> Union[Response, Iterable[Response], None]:
-    results = await asyncio.gather(
-        *(
-            dispatch_request(methods, context, r)
-            for r in map(create_request, make_list(deserialized))
+    *,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+    background: Optional[AsyncBackgroundQueue] = None,
+) -> Any:
+    batch_size = get_batch_size(deserialized)
+    options = {"executor": executor, "deadline": deadline, "batch_size": batch_size}
+    requests = list(map(create_request, make_list(deserialized)))
+    if background is not None:
+        # Notifications run without the dispatch's deadline, as no one is waiting.
+        requests = await submit_notifications(
+            background,
+            partial(
+                dispatch_request,
+                methods,
+                context,
+                executor=executor,
+                batch_size=batch_size,
+            ),
+            requests,
         )
+    results = await gather_limited(
+        (
+            partial(dispatch_request, methods, context, **options)
+            if in_flight is None
+            else partial(dispatch_limited, in_flight, methods, context, **options)
+        ),
+        requests,
+        max_concurrency,
     )
     return extract_list(
-        isinstance(deserialized, list),
-        map(
-            post_process,
-            starmap(to_response, filter(not_notification, results)),
-        ),
+        isinstance(deserialized, list), to_responses(post_process, batch_size, results)
     )
 
 
 async def dispatch_to_response_pure(
     *,
-    deserializer: Callable[[str], Deserialized],
+    deserializer: Callable[[Any], Deserialized],
     validator: Callable[[Deserialized], Deserialized],
     methods: Methods,
     context: Any,
-    post_process: Callable[[Response], Iterable[Any]],
-    request: str,
-) -> Union[Response, Iterable[Response], None]:
+    post_process: Callable[[Response], Any],
+    request: RequestData,
+    max_batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+    background: Optional[AsyncBackgroundQueue] = None,
+) -> Any:
+    deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
     try:
-        result = deserialize_request(deserializer, request).bind(
-            partial(validate_request, validator)
-        )
+        result = deserialize_request(deserializer, request)
+        if isinstance(result, Right):
+            result = validate_batch_size(
+                max_batch_size, result._value  # pylint: disable=protected-access
+            )
+        if isinstance(result, Right):
+            result = validate_request(
+                validator, result._value  # pylint: disable=protected-access
+            )
         return (
             post_process(result)
             if isinstance(result, Left)
@@ -106,8 +385,283 @@ async def dispatch_to_response_pure(
                 context,
                 post_process,
                 result._value,  # pylint: disable=protected-access
+                max_concurrency=max_concurrency,
+                in_flight=in_flight,
+                executor=executor,
+                deadline=deadline,
+                background=background,
+            )
+        )
+    except QueueFull:
+        raise
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception(exc)
+        return post_process(Left(ServerErrorResponse(str(exc), None)))
+
+
+async def iterate_limited(
+    dispatch: Callable[[Request], Awaitable[Tuple[Request, Result]]],
+    requests: List[Request],
+    max_concurrency: Optional[int],
+    ordered: bool,
+) -> AsyncIterator[Tuple[Request, Result]]:
+    """The streaming version of gather_limited. Yields the results as they complete, or
+    with ordered=True, in the order of the requests (holding back any that complete
+    before those ahead of them).
+
+    If iteration is stopped early, the requests still in flight are cancelled.
+    """
+    completed: "asyncio.Queue[Tuple[int, Any]]" = asyncio.Queue()
+    pending = iter(enumerate(requests))
+
+    async def worker() -> None:
+        try:
+            for index, request in pending:
+                completed.put_nowait((index, await dispatch(request)))
+        except Exception as exc:  # pylint: disable=broad-except
+            completed.put_nowait((-1, exc))  # Raised by the iterator
+
+    workers = [
+        asyncio.ensure_future(worker())
+        for _ in range(min(max_concurrency or len(requests), len(requests)))
+    ]
+    held: Dict[int, Tuple[Request, Result]] = {}
+    next_index = 0
+    try:
+        for _ in requests:
+            index, result = await completed.get()
+            if index < 0:
+                raise result
+            if not ordered:
+                yield result
+                continue
+            held[index] = result
+            while next_index in held:
+                yield held.pop(next_index)
+                next_index += 1
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+async def dispatch_deserialized_stream(
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    deserialized: Deserialized,
+    *,
+    ordered: bool = True,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+) -> AsyncIterator[Any]:
+    batch_size = get_batch_size(deserialized)
+    options = {"executor": executor, "deadline": deadline, "batch_size": batch_size}
+    results = iterate_limited(
+        (
+            partial(dispatch_request, methods, context, **options)
+            if in_flight is None
+            else partial(dispatch_limited, in_flight, methods, context, **options)
+        ),
+        list(map(create_request, make_list(deserialized))),
+        max_concurrency,
+        ordered,
+    )
+    async for request, result in results:
+        if request.id is not NOID and hooks:
+            yield respond(post_process, batch_size, request, result)
+        elif request.id is not NOID:
+            yield post_process(to_response(request, result))
+
+
+async def single(response: Any) -> AsyncIterator[Any]:
+    yield response
+
+
+async def dispatch_to_response_stream_pure(
+    *,
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    request: RequestData,
+    ordered: bool = True,
+    max_batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    timeout: Optional[float] = None,
+) -> Tuple[bool, AsyncIterator[Any]]:
+    deadline = None if timeout is None else asyncio.get_running_loop().time() + timeout
+    try:
+        result = deserialize_request(deserializer, request)
+        if isinstance(result, Right):
+            result = validate_batch_size(
+                max_batch_size, result._value  # pylint: disable=protected-access
+            )
+        if isinstance(result, Right):
+            result = validate_request(
+                validator, result._value  # pylint: disable=protected-access
+            )
+        if isinstance(result, Left):
+            return (False, single(post_process(result)))
+        return (
+            isinstance(result._value, list),  # pylint: disable=protected-access
+            dispatch_deserialized_stream(
+                methods,
+                context,
+                post_process,
+                result._value,  # pylint: disable=protected-access
+                ordered=ordered,
+                max_concurrency=max_concurrency,
+                in_flight=in_flight,
+                executor=executor,
+                deadline=deadline,
+            ),
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception(exc)
+        return (False, single(post_process(Left(ServerErrorResponse(str(exc), None)))))
+
+
+async def dispatch_batch_item(
+    *,
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    request: Union[RequestData, ValueError],
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    deadline: Optional[float] = None,
+) -> Any:
+    try:
+        result = deserialize_batch_item(deserializer, validator, request)
+        if isinstance(result, Left):
+            return post_process(result)
+        request_ = create_request(
+            cast(Dict[str, Any], result._value)  # pylint: disable=protected-access
+        )
+        request_, method_result = await (
+            dispatch_request(
+                methods, context, request_, executor=executor, deadline=deadline
+            )
+            if in_flight is None
+            else dispatch_limited(
+                in_flight,
+                methods,
+                context,
+                request_,
+                executor=executor,
+                deadline=deadline,
             )
         )
+        if request_.id is NOID:
+            return None
+        if hooks:
+            return respond(post_process, None, request_, method_result)
+        return post_process(to_response(request_, method_result))
     except Exception as exc:  # pylint: disable=broad-except
         logger.exception(exc)
         return post_process(Left(ServerErrorResponse(str(exc), None)))
+
+
+async def iterate_incremental(  # pylint: disable=too-many-locals
+    dispatch: Callable[[Any], Awaitable[Any]],
+    items: AsyncIterable[Any],
+    max_concurrency: Optional[int],
+    ordered: bool,
+) -> AsyncIterator[Any]:
+    """Like iterate_limited, but the requests come from an async iterable, and each is
+    dispatched as soon as it arrives.
+
+    With max_concurrency, at most that many requests are in flight or completed but not
+    yet yielded, so however large the batch, memory stays bounded. Reading from items
+    waits until one has been yielded.
+    """
+    limit = None if max_concurrency is None else asyncio.Semaphore(max_concurrency)
+    completed: "asyncio.Queue[Tuple[int, asyncio.Future[Any]]]" = asyncio.Queue()
+    tasks: "Set[asyncio.Future[Any]]" = set()
+
+    def done(index: int, task: "asyncio.Future[Any]") -> None:
+        tasks.discard(task)
+        if not task.cancelled():
+            completed.put_nowait((index, task))
+
+    async def feed() -> int:
+        count = 0
+        async for item in items:
+            if limit is not None:
+                await limit.acquire()
+            task = asyncio.ensure_future(dispatch(item))
+            tasks.add(task)
+            task.add_done_callback(partial(done, count))
+            count += 1
+        return count
+
+    feeder = asyncio.ensure_future(feed())
+    feeder.add_done_callback(partial(done, -1))  # -1 gives the number of requests
+    held: Dict[int, Any] = {}
+    next_index = received = 0
+    total: Optional[int] = None
+    try:
+        while total is None or received < total:
+            index, task = await completed.get()
+            if index < 0:
+                total = task.result()  # Raises if reading the items failed
+                continue
+            received += 1
+            if not ordered:
+                yield task.result()
+                if limit is not None:
+                    limit.release()
+                continue
+            held[index] = task.result()
+            while next_index in held:
+                yield held.pop(next_index)
+                if limit is not None:
+                    limit.release()
+                next_index += 1
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+async def dispatch_batch_items_stream(
+    *,
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    elements: AsyncIterable[Union[RequestData, ValueError]],
+    ordered: bool = True,
+    max_concurrency: Optional[int] = None,
+    **options: Any,
+) -> AsyncIterator[Any]:
+    """Dispatch the requests of a batch as they're split from the request (see
+    incremental.py), yielding the responses. Notifications give no response.
+
+    options (in_flight, executor, deadline) are passed to dispatch_batch_item.
+    """
+
+    async def dispatch_item(element: Union[RequestData, ValueError]) -> Any:
+        return await dispatch_batch_item(
+            deserializer=deserializer,
+            validator=validator,
+            methods=methods,
+            context=context,
+            post_process=post_process,
+            request=element,
+            **options,
+        )
+
+    async for response in iterate_incremental(
+        dispatch_item, elements, max_concurrency, ordered
+    ):
+        if response is not None:
+            yield response
@@ -1,12 +1,78 @@
-"""Async version of main.py. The public async functions."""
+"""Async version of main.py. The public async functions.
+
+The async functions take some extra options to limit how much work a request can
+start:
+
+- max_batch_size: Batches with more requests are rejected with an Invalid request
+  error, before any of the requests are dispatched.
+- max_concurrency: The most requests from one batch to dispatch at the same time.
+- in_flight: An asyncio.Semaphore, shared by all dispatches, limiting the requests in
+  flight across all of them.
+- timeout: Seconds allowed for the dispatch. Method calls still running at the deadline
+  are cancelled and get a Timeout error. (Methods can also have their own timeout, with
+  @method(timeout=...).)
+
+Notifications can be run in the background, without waiting for them, by passing an
+AsyncBackgroundQueue as background (see background.py).
+
+Methods that aren't coroutine functions are run in an executor, so they don't block the
+event loop. Pass executor to choose one, or max_workers to use a shared thread pool of
+that size; otherwise the loop's default executor is used.
+
+The streaming functions, dispatch_to_response_stream and dispatch_to_bytes_stream, are
+async iterators giving the responses of a batch as they complete (in the order of the
+requests, or with ordered=False, in the order they complete).
+
+dispatch_incremental reads the request from an asyncio.StreamReader (or async chunks of
+bytes), dispatching each request in a batch as soon as it's been read. With
+max_concurrency, memory use is bounded however large the batch.
+"""
+import asyncio
 import json
-from typing import Any, Callable, Dict, Iterable, List, Optional, Union, cast
+from concurrent.futures import Executor
+from functools import partial
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+    cast,
+)
 
-from .async_dispatcher import dispatch_to_response_pure
+from .async_dispatcher import (
+    dispatch_batch_items_stream,
+    dispatch_to_response_pure,
+    dispatch_to_response_stream_pure,
+)
+from .background import AsyncBackgroundQueue
+from .codec import Codec, RequestData, default_codec
 from .dispatcher import Deserialized
-from .main import default_deserializer, default_validator
+from .either import Left
+from .hooks import serialize
+from .incremental import (
+    CHUNK_SIZE,
+    ArraySplitter,
+    Element,
+    read_chunks_async,
+    split_async,
+)
+from .main import default_deserializer, default_validator, get_executor
 from .methods import Methods, global_methods
-from .response import Response, to_serializable
+from .response import (
+    COMPACT_FRAGMENTS,
+    FRAGMENTS,
+    InvalidRequestResponse,
+    Response,
+    join_bytes,
+    join_bytes_stream_async,
+    to_bytes,
+    to_serializable,
+)
 from .sentinels import NOCONTEXT
 from .utils import identity
 
@@ -14,21 +80,37 @@ from .utils import identity
 
 
 async def dispatch_to_response(
-    request: str,
+    request: RequestData,
     methods: Optional[Methods] = None,
     *,
     context: Any = NOCONTEXT,
-    deserializer: Callable[[str], Deserialized] = default_deserializer,
+    deserializer: Callable[[Any], Deserialized] = default_deserializer,
     validator: Callable[[Deserialized], Deserialized] = default_validator,
     post_process: Callable[[Response], Any] = identity,
+    max_batch_size: Optional[int] = None,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    background: Optional[AsyncBackgroundQueue] = None,
 ) -> Union[Response, Iterable[Response], None]:
-    return await dispatch_to_response_pure(
-        deserializer=deserializer,
-        validator=validator,
-        post_process=post_process,
-        context=context,
-        methods=global_methods if methods is None else methods,
-        request=request,
+    return cast(
+        Union[Response, Iterable[Response], None],
+        await dispatch_to_response_pure(
+            deserializer=deserializer,
+            validator=validator,
+            post_process=post_process,
+            context=context,
+            methods=global_methods if methods is None else methods,
+            request=request,
+            max_batch_size=max_batch_size,
+            max_concurrency=max_concurrency,
+            in_flight=in_flight,
+            executor=get_executor(executor, max_workers),
+            timeout=timeout,
+            background=background,
+        ),
     )
 
 
@@ -49,7 +131,152 @@ async def dispatch_to_json(
     **kwargs: Any,
 ) -> str:
     response = await dispatch_to_serializable(*args, **kwargs)
-    return "" if response is None else serializer(response)
+    return "" if response is None else serialize(serializer, response)
+
+
+async def dispatch_to_bytes(
+    request: RequestData,
+    *args: Any,
+    codec: Codec = default_codec,
+    **kwargs: Any,
+) -> bytes:
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    options: Dict[str, Any] = {
+        "deserializer": codec.loads,
+        "post_process": partial(to_bytes, dumps=codec.dumps, fragments=fragments),
+        **kwargs,
+    }
+    response = await dispatch_to_response(request, *args, **options)
+    return serialize(
+        partial(join_bytes, fragments=fragments),
+        cast(Union[bytes, List[bytes], None], response),
+    )
 
 
 dispatch = dispatch_to_json
+
+
+async def dispatch_to_response_stream(
+    request: RequestData,
+    methods: Optional[Methods] = None,
+    *,
+    context: Any = NOCONTEXT,
+    deserializer: Callable[[Any], Deserialized] = default_deserializer,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    post_process: Callable[[Response], Any] = identity,
+    ordered: bool = True,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    **options: Any,
+) -> AsyncGenerator[Any, None]:
+    _, responses = await dispatch_to_response_stream_pure(
+        deserializer=deserializer,
+        validator=validator,
+        post_process=post_process,
+        context=context,
+        methods=global_methods if methods is None else methods,
+        request=request,
+        ordered=ordered,
+        executor=get_executor(executor, max_workers),
+        **options,
+    )
+    async for response in responses:
+        yield response
+
+
+async def dispatch_to_bytes_stream(
+    request: RequestData,
+    methods: Optional[Methods] = None,
+    *,
+    codec: Codec = default_codec,
+    context: Any = NOCONTEXT,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    ordered: bool = True,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    **options: Any,
+) -> AsyncGenerator[bytes, None]:
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    is_batch, responses = await dispatch_to_response_stream_pure(
+        deserializer=codec.loads,
+        validator=validator,
+        post_process=partial(to_bytes, dumps=codec.dumps, fragments=fragments),
+        context=context,
+        methods=global_methods if methods is None else methods,
+        request=request,
+        ordered=ordered,
+        executor=get_executor(executor, max_workers),
+        **options,
+    )
+    async for part in join_bytes_stream_async(is_batch, responses, fragments):
+        yield part
+
+
+async def prepend(
+    first: Element, rest: AsyncIterator[Element]
+) -> AsyncIterator[Element]:
+    yield first
+    async for element in rest:
+        yield element
+
+
+async def dispatch_incremental(  # pylint: disable=too-many-locals
+    source: Any,
+    methods: Optional[Methods] = None,
+    *,
+    codec: Codec = default_codec,
+    context: Any = NOCONTEXT,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    ordered: bool = True,
+    max_concurrency: Optional[int] = None,
+    in_flight: Optional[asyncio.Semaphore] = None,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    chunk_size: int = CHUNK_SIZE,
+) -> AsyncGenerator[bytes, None]:
+    executor = get_executor(executor, max_workers)
+    splitter = ArraySplitter()
+    elements = split_async(splitter, read_chunks_async(source, chunk_size))
+    try:
+        first: Optional[Element] = await elements.__anext__()
+    except StopAsyncIteration:
+        first = None
+    if not splitter.is_batch:  # The whole request
+        response = await dispatch_to_bytes(
+            cast(bytes, first),
+            methods,
+            codec=codec,
+            context=context,
+            validator=validator,
+            in_flight=in_flight,
+            executor=executor,
+            timeout=timeout,
+        )
+        if response:
+            yield response
+        return
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    post_process = partial(to_bytes, dumps=codec.dumps, fragments=fragments)
+    if first is None:  # An empty batch
+        yield post_process(
+            Left(InvalidRequestResponse("The request failed schema validation"))
+        )
+        return
+    responses = dispatch_batch_items_stream(
+        deserializer=codec.loads,
+        validator=validator,
+        methods=global_methods if methods is None else methods,
+        context=context,
+        post_process=post_process,
+        elements=prepend(first, elements),
+        ordered=ordered,
+        max_concurrency=max_concurrency,
+        in_flight=in_flight,
+        executor=executor,
+        deadline=None
+        if timeout is None
+        else asyncio.get_running_loop().time() + timeout,
+    )
+    async for part in join_bytes_stream_async(True, responses, fragments):
+        yield part
@@ -0,0 +1,542 @@
+"""An asyncio HTTP/1.1 server for serving JSON-RPC requests, using only the standard
+library.
+
+Unlike the development server in server.py, this server keeps connections alive,
+accepts pipelined requests, limits connections and idle time, shuts down gracefully,
+and dispatches with the async dispatcher so coroutine methods run concurrently.
+
+    >>> asyncio.run(serve(port=5000))
+
+To serve from several processes sharing the port (see prefork.py):
+
+    >>> run(port=5000, workers=4)
+
+Or from the command line:
+
+    $ python -m jsonrpcserver --port 5000 --methods mymodule
+
+With metrics=True (or --metrics), metrics are collected and served at /metrics (see
+metrics.py).
+
+Clients can also upgrade a connection to a WebSocket, and send requests as messages,
+which are dispatched concurrently (see websocket.py).
+"""
+import asyncio
+import logging
+import shutil
+import tempfile
+from http import HTTPStatus
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .async_main import dispatch_to_bytes
+from .background import QueueFull
+from .codec import Codec, default_codec
+from .methods import Methods, global_methods
+from .metrics import CONTENT_TYPE, Exporter, install, uninstall
+from .prefork import prefork
+from .transport import run_connection, serve_until_stopped, wait_for_connections
+from .websocket import WebSocket, handshake_response, is_upgrade
+
+logger = logging.getLogger(__name__)
+
+
+class HttpError(Exception):
+    """Raised while reading a request that can't be handled. The connection is closed
+    after responding with the status.
+    """
+
+    def __init__(self, status: HTTPStatus):
+        super().__init__(status.phrase)
+        self.status = status
+
+
+class RequestHead(NamedTuple):
+    """The request line and headers of an HTTP request. Header names are lowercase."""
+
+    method: str
+    path: str
+    version: str
+    headers: Dict[str, str]
+
+
+def wants_keep_alive(head: RequestHead) -> bool:
+    """HTTP/1.1 connections persist by default, HTTP/1.0 ones don't."""
+    connection = head.headers.get("connection", "").lower()
+    if head.version == "HTTP/1.0":
+        return connection == "keep-alive"
+    return connection != "close"
+
+
+def http_response(
+    status: HTTPStatus,
+    body: bytes,
+    keep_alive: bool,
+    content_type: str = "application/json",
+) -> bytes:
+    """Build a complete HTTP response."""
+    return b"".join(
+        (
+            b"HTTP/1.1 %d %s\r\n" % (status.value, status.phrase.encode()),
+            b"Content-Type: %s\r\n" % content_type.encode() if body else b"",
+            b"Allow: POST\r\n" if status == HTTPStatus.METHOD_NOT_ALLOWED else b"",
+            b"Content-Length: %d\r\n" % len(body),
+            b"Connection: keep-alive\r\n\r\n"
+            if keep_alive
+            else b"Connection: close\r\n\r\n",
+            body,
+        )
+    )
+
+
+async def read_head(reader: asyncio.StreamReader) -> Optional[RequestHead]:
+    """Read the request line and headers.
+
+    Returns: The RequestHead, or None if the client closed the connection cleanly.
+    """
+    try:
+        data = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial.strip():
+            raise HttpError(HTTPStatus.BAD_REQUEST) from exc
+        return None
+    except asyncio.LimitOverrunError as exc:
+        raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE) from exc
+    # Tolerate empty lines before the request line (RFC 9112 section 2.2).
+    request_line, *header_lines = data.decode("latin-1").lstrip("\r\n").split("\r\n")
+    try:
+        method, path, version = request_line.split(" ")
+    except ValueError as exc:
+        raise HttpError(HTTPStatus.BAD_REQUEST) from exc
+    if version not in ("HTTP/1.0", "HTTP/1.1"):
+        raise HttpError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+    headers = {}
+    for line in filter(None, header_lines):
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return RequestHead(method, path, version, headers)
+
+
+async def read_chunked(reader: asyncio.StreamReader, max_body_size: int) -> bytes:
+    """Read a body sent with "Transfer-Encoding: chunked"."""
+    chunks: List[bytes] = []
+    total = 0
+    while True:
+        try:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+        except ValueError as exc:
+            raise HttpError(HTTPStatus.BAD_REQUEST) from exc
+        if size == 0:
+            # Skip any trailers
+            while await reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+            return b"".join(chunks)
+        total += size
+        if total > max_body_size:
+            raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+async def read_body(
+    reader: asyncio.StreamReader, head: RequestHead, max_body_size: int
+) -> bytes:
+    """Read the request body, using either Content-Length or chunked encoding."""
+    if head.headers.get("transfer-encoding", "").lower() == "chunked":
+        return await read_chunked(reader, max_body_size)
+    try:
+        length = int(head.headers.get("content-length", "0"))
+    except ValueError as exc:
+        raise HttpError(HTTPStatus.BAD_REQUEST) from exc
+    if length < 0:
+        raise HttpError(HTTPStatus.BAD_REQUEST)
+    if length > max_body_size:
+        raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    return await reader.readexactly(length)
+
+
+class PendingResponse(NamedTuple):
+    """A response waiting to be written. Responses are written in request order, even
+    though pipelined requests are dispatched concurrently.
+    """
+
+    response: "asyncio.Future[Tuple[HTTPStatus, bytes]]"
+    keep_alive: bool
+    content_type: str = "application/json"
+
+
+class Connection:
+    """A single client connection.
+
+    The read loop parses requests and starts dispatching each one straight away. The
+    write loop writes the responses back in order.
+
+    A request to upgrade to a WebSocket ends both loops, once the responses before it
+    have been written, and the connection is handed over to a WebSocket.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        server: "HttpServer",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self.server, self.reader, self.writer = server, reader, writer
+        self.pending: "asyncio.Queue[Optional[PendingResponse]]" = asyncio.Queue()
+        self.pipeline = asyncio.Semaphore(server.max_pipeline)
+        self.in_flight = 0
+        self.reading = True
+        self.waiting = False
+        self.read_task: Optional["asyncio.Task[None]"] = None
+        self.upgrade: Optional[bytes] = None
+        self.websocket: Optional[WebSocket] = None
+
+    @property
+    def idle(self) -> bool:
+        """True if waiting for a request, with no responses outstanding."""
+        return self.waiting and self.in_flight == 0
+
+    async def run(self) -> None:
+        """Handle the connection until it's closed."""
+        self.read_task = asyncio.current_task()
+        write_task = asyncio.ensure_future(self.write_loop())
+        try:
+            await self.read_loop()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.reading = False
+            self.pending.put_nowait(None)
+            await asyncio.shield(write_task)
+        if self.upgrade is not None and not self.writer.is_closing():
+            await self.run_websocket(self.upgrade)
+
+    async def run_websocket(self, handshake: bytes) -> None:
+        """Accept the upgrade, and handle the connection as a WebSocket."""
+        self.websocket = WebSocket(self.server, self.reader, self.writer)
+        try:
+            self.writer.write(handshake)
+            await self.websocket.run()
+        except ConnectionError:
+            pass
+        finally:
+            self.writer.close()
+
+    async def read_request(self) -> Optional[Tuple[RequestHead, bytes]]:
+        """Read the next request.
+
+        Returns: The head and body, or None if the client closed the connection.
+        """
+        self.waiting = True
+        try:
+            head = await read_head(self.reader)
+        finally:
+            self.waiting = False
+        if head is None:
+            return None
+        if head.headers.get("expect", "").lower() == "100-continue":
+            self.queue(HTTPStatus.CONTINUE, keep_alive=True)
+        return head, await read_body(self.reader, head, self.server.max_body_size)
+
+    async def read_loop(self) -> None:
+        """Read requests and start dispatching them."""
+        server = self.server
+        while not server.closing:
+            # Limit how many requests can be in flight on this connection.
+            await self.pipeline.acquire()
+            try:
+                request = await asyncio.wait_for(
+                    self.read_request(), server.idle_timeout
+                )
+            except asyncio.TimeoutError:
+                return
+            except HttpError as exc:
+                self.queue(exc.status, keep_alive=False)
+                return
+            if request is None:
+                return
+            head, body = request
+            keep_alive = wants_keep_alive(head)
+            if head.method == "GET" and is_upgrade(head.headers):
+                handshake = handshake_response(head.headers)
+                if handshake is None:
+                    self.queue(HTTPStatus.BAD_REQUEST, keep_alive=False)
+                else:
+                    self.upgrade = handshake
+                return
+            if head.method == "POST":
+                self.in_flight += 1
+                self.pending.put_nowait(
+                    PendingResponse(
+                        asyncio.ensure_future(server.dispatch(body)), keep_alive
+                    )
+                )
+            elif (
+                head.method == "GET"
+                and head.path == "/metrics"
+                and server.exporter is not None
+            ):
+                body = server.exporter.render()
+                self.queue(HTTPStatus.OK, keep_alive, body, CONTENT_TYPE)
+            else:
+                self.queue(HTTPStatus.METHOD_NOT_ALLOWED, keep_alive)
+            if not keep_alive:
+                return
+
+    def queue(
+        self,
+        status: HTTPStatus,
+        keep_alive: bool,
+        body: bytes = b"",
+        content_type: str = "application/json",
+    ) -> None:
+        """Queue a response that doesn't need dispatching."""
+        if status != HTTPStatus.CONTINUE:
+            self.in_flight += 1
+        future: "asyncio.Future[Tuple[HTTPStatus, bytes]]" = (
+            asyncio.get_running_loop().create_future()
+        )
+        future.set_result((status, body))
+        self.pending.put_nowait(PendingResponse(future, keep_alive, content_type))
+
+    async def write_loop(self) -> None:
+        """Write responses in the order the requests were received."""
+        upgrade = False
+        try:
+            while True:
+                pending = await self.pending.get()
+                if pending is None:
+                    # Leave the connection open to be upgraded, unless shutting down.
+                    upgrade = self.upgrade is not None and not self.server.closing
+                    break
+                try:
+                    status, body = await pending.response
+                except QueueFull:
+                    status, body = HTTPStatus.SERVICE_UNAVAILABLE, b""
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Error dispatching request")
+                    status, body = HTTPStatus.INTERNAL_SERVER_ERROR, b""
+                if status == HTTPStatus.CONTINUE:
+                    self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    continue
+                # If the server is shutting down, close once the responses already
+                # queued have been written.
+                keep_alive = pending.keep_alive and not (
+                    self.server.closing and self.pending.empty()
+                )
+                self.writer.write(
+                    http_response(status, body, keep_alive, pending.content_type)
+                )
+                await self.writer.drain()
+                self.in_flight -= 1
+                self.pipeline.release()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            if not upgrade:
+                self.close()
+
+    def close(self) -> None:
+        """Close the connection, cancelling any outstanding work."""
+        while not self.pending.empty():
+            pending = self.pending.get_nowait()
+            if pending is not None:
+                pending.response.cancel()
+        if self.reading and self.read_task is not None:
+            self.read_task.cancel()
+        self.writer.close()
+
+
+class HttpServer:
+    """An HTTP/1.1 JSON-RPC server.
+
+    Args:
+        methods: The methods to serve. Defaults to the global methods.
+        codec: The codec used to deserialize requests and serialize responses.
+        max_connections: Connections over this limit are refused with 503.
+        max_pipeline: How many pipelined requests a connection (or WebSocket) can have
+            in flight.
+        max_body_size: Bodies (or WebSocket messages) over this size (in bytes) are
+            refused with 413 (or close code 1009).
+        idle_timeout: Seconds a connection (or WebSocket) can wait for a request before
+            it's closed.
+        max_requests: Stop after dispatching this many requests (for recycling prefork
+            workers).
+        max_in_flight: The most JSON-RPC requests to dispatch at the same time, across
+            all connections.
+        metrics: Collect metrics, and serve them at /metrics.
+        metrics_dir: A directory shared by prefork workers, so each worker serves the
+            metrics of them all.
+        dispatch_options: Passed to dispatch_to_bytes, e.g. max_batch_size and
+            max_concurrency. A background queue passed this way is drained on shutdown.
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(
+        self,
+        methods: Optional[Methods] = None,
+        *,
+        codec: Codec = default_codec,
+        max_connections: int = 1000,
+        max_pipeline: int = 16,
+        max_body_size: int = 10 * 1024 * 1024,
+        idle_timeout: float = 60.0,
+        max_requests: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+        metrics: bool = False,
+        metrics_dir: Optional[str] = None,
+        **dispatch_options: Any,
+    ):
+        self.methods = global_methods if methods is None else methods
+        self.codec = codec
+        self.max_connections = max_connections
+        self.max_pipeline = max_pipeline
+        self.max_body_size = max_body_size
+        self.idle_timeout = idle_timeout
+        self.max_requests = max_requests
+        self.max_in_flight = max_in_flight
+        self.requests = 0
+        self.dispatch_options = dispatch_options
+        self.connections: Dict["asyncio.Task[None]", Connection] = {}
+        self.closing = False
+        self.server: Optional[asyncio.Server] = None
+        self.stop: Optional[asyncio.Event] = None
+        self.exporter = Exporter(metrics_dir) if metrics else None
+        self.flush_task: Optional["asyncio.Task[None]"] = None
+        if metrics:
+            install()
+
+    async def start(self, host: str = "", port: int = 5000, **kwargs: Any) -> None:
+        """Start listening. Extra arguments are passed to asyncio.start_server."""
+        # Set when the server should be shut down. Created here to be in the loop.
+        self.stop = asyncio.Event()
+        if self.max_in_flight is not None:
+            self.dispatch_options["in_flight"] = asyncio.Semaphore(self.max_in_flight)
+        self.server = await asyncio.start_server(
+            self.handle_connection, host or None, port, **kwargs
+        )
+        logger.info(" * Listening on port %s", self.port)
+        if self.exporter is not None and self.exporter.directory is not None:
+            self.flush_task = asyncio.ensure_future(self.flush_metrics(self.exporter))
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on (useful when started on port 0)."""
+        assert self.server is not None
+        return int(self.server.sockets[0].getsockname()[1])
+
+    async def dispatch(self, body: bytes) -> Tuple[HTTPStatus, bytes]:
+        """Dispatch a request body, giving the HTTP status and response body."""
+        self.requests += 1
+        if self.requests == self.max_requests and self.stop is not None:
+            self.stop.set()
+        response = await dispatch_to_bytes(
+            body, self.methods, codec=self.codec, **self.dispatch_options
+        )
+        # Notifications get no response body.
+        return (HTTPStatus.OK if response else HTTPStatus.NO_CONTENT), response
+
+    @staticmethod
+    async def flush_metrics(exporter: Exporter) -> None:
+        """Write this worker's metrics to the shared directory, regularly."""
+        while True:
+            await asyncio.sleep(exporter.interval)
+            exporter.flush()
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Called by asyncio for each new connection."""
+        if self.closing or len(self.connections) >= self.max_connections:
+            writer.write(http_response(HTTPStatus.SERVICE_UNAVAILABLE, b"", False))
+            writer.close()
+            return
+        await run_connection(self.connections, Connection(self, reader, writer))
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop accepting connections, close idle ones, and give requests in flight up
+        to timeout seconds to complete.
+        """
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for connection in self.connections.values():
+            if connection.websocket is not None:
+                connection.websocket.shutdown()
+            elif connection.idle:
+                connection.close()
+        await wait_for_connections(self.connections, timeout)
+        if self.server is not None:
+            await self.server.wait_closed()
+        background = self.dispatch_options.get("background")
+        if background is not None:
+            await background.shutdown(timeout=timeout)
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+        if self.exporter is not None:
+            self.exporter.flush(force=True)
+            uninstall()
+
+
+async def serve(
+    methods: Optional[Methods] = None,
+    host: str = "",
+    port: int = 5000,
+    *,
+    shutdown_timeout: float = 30.0,
+    reuse_port: bool = False,
+    **options: Any,
+) -> None:
+    """Serve until cancelled, until SIGINT/SIGTERM, or until max_requests have been
+    dispatched, then shut down gracefully.
+
+    Args:
+        shutdown_timeout: Seconds to wait for requests in flight when shutting down.
+        reuse_port: Share the port with other processes (SO_REUSEPORT).
+        options: Passed to HttpServer.
+    """
+    server = HttpServer(methods, **options)
+    await server.start(host, port, reuse_port=reuse_port)
+    await serve_until_stopped(server, shutdown_timeout)
+
+
+def run(
+    methods: Optional[Methods] = None,
+    host: str = "",
+    port: int = 5000,
+    *,
+    workers: int = 1,
+    pin_cpus: bool = False,
+    **options: Any,
+) -> None:
+    """Serve, blocking until SIGINT/SIGTERM.
+
+    With more than one worker (or max_requests, or pin_cpus), the server is run in
+    forked worker processes sharing the port, which are restarted if they die or reach
+    max_requests.
+
+    Args:
+        workers: The number of worker processes.
+        pin_cpus: Pin each worker to a CPU.
+        options: Passed to serve.
+    """
+    if workers > 1 or options.get("max_requests") is not None or pin_cpus:
+        if options.get("metrics"):
+            options["metrics_dir"] = tempfile.mkdtemp(prefix="jsonrpcserver-")
+        try:
+            prefork(
+                lambda _: asyncio.run(
+                    serve(methods, host, port, reuse_port=True, **options)
+                ),
+                workers,
+                pin_cpus=pin_cpus,
+            )
+        finally:
+            if options.get("metrics_dir"):
+                shutil.rmtree(options["metrics_dir"], ignore_errors=True)
+    else:
+        asyncio.run(serve(methods, host, port, **options))
@@ -0,0 +1,185 @@
+"""Running notifications in the background.
+
+A notification gets no response, so there's no need for the client to wait for it.
+Pass a background queue to dispatch, and notifications are handed to it, and the
+response (to the rest of a batch) is given straight away:
+
+    >>> background = BackgroundQueue(max_workers=4)
+    >>> dispatch(request, background=background)
+    ...
+    >>> background.shutdown()  # Wait for the notifications queued
+
+With the async dispatcher, notifications are run as tasks:
+
+    >>> background = AsyncBackgroundQueue()
+    >>> await async_dispatch(request, background=background)
+    ...
+    >>> await background.shutdown()
+
+The queue holds at most max_pending notifications (queued or running). When it's full,
+the overflow policy decides what happens to another:
+
+- "block": Wait for a notification to finish (the default).
+- "drop": Discard it, with a warning logged.
+- "reject": Raise QueueFull, from dispatch. (The async server responds 503.)
+
+A batch's notifications are handed to the queue before its other requests are
+dispatched, so if one is rejected, none of the other requests have been run.
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Optional, Set
+
+from .exceptions import QueueFull
+
+__all__ = ["AsyncBackgroundQueue", "BackgroundQueue", "QueueFull"]
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("block", "drop", "reject")
+
+
+def check_overflow(overflow: str) -> None:
+    """Raise ValueError for an unknown overflow policy."""
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+
+
+def run_logged(func: Callable[..., Any], *args: Any) -> None:
+    """Run a notification, logging any error (there's no one to respond to)."""
+    try:
+        func(*args)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Error running notification")
+
+
+async def run_logged_async(func: Callable[..., Awaitable[Any]], *args: Any) -> None:
+    """Run a notification, logging any error (there's no one to respond to)."""
+    try:
+        await func(*args)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception("Error running notification")
+
+
+class BackgroundQueue:
+    """Runs notifications on a pool of worker threads.
+
+    Args:
+        max_workers: The number of threads.
+        max_pending: The most notifications queued or running.
+        overflow: What to do with a notification when the queue is full.
+    """
+
+    def __init__(
+        self, max_workers: int = 4, max_pending: int = 1000, overflow: str = "block"
+    ):
+        check_overflow(overflow)
+        self.executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="jsonrpcserver-background"
+        )
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.overflow = overflow
+        self.futures: Set["Future[None]"] = set()
+        self.dropped = 0
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> None:
+        """Queue func(*args) to be run, according to the overflow policy."""
+        # Released when the notification is done, not on leaving a block.
+        # pylint: disable=consider-using-with
+        if not self.slots.acquire(blocking=self.overflow == "block"):
+            if self.overflow == "reject":
+                raise QueueFull
+            self.dropped += 1
+            logger.warning("Background queue full, dropped a notification")
+            return
+        try:
+            future = self.executor.submit(run_logged, func, *args)
+        except RuntimeError:  # Shut down
+            self.slots.release()
+            raise
+        self.futures.add(future)
+        future.add_done_callback(self.done)
+
+    def done(self, future: "Future[None]") -> None:
+        """Called when a notification has run (or was cancelled)."""
+        self.futures.discard(future)
+        self.slots.release()
+
+    @property
+    def pending(self) -> int:
+        """The number of notifications queued or running."""
+        return len(self.futures)
+
+    def shutdown(self, drain: bool = True) -> None:
+        """Stop accepting notifications, and wait for those queued to run. With
+        drain=False, only wait for those already running; the rest are discarded.
+        """
+        if not drain:
+            for future in list(self.futures):
+                future.cancel()
+        self.executor.shutdown(wait=True)
+
+
+class AsyncBackgroundQueue:
+    """Runs notifications as tasks, in the event loop of the first one submitted.
+
+    Args:
+        max_pending: The most notifications running at once.
+        overflow: What to do with a notification when the queue is full.
+    """
+
+    def __init__(self, max_pending: int = 1000, overflow: str = "block"):
+        check_overflow(overflow)
+        self.max_pending = max_pending
+        self.overflow = overflow
+        self.slots: Optional[asyncio.Semaphore] = None  # Created in the loop
+        self.tasks: Set["asyncio.Task[None]"] = set()
+        self.dropped = 0
+        self.closed = False
+
+    async def submit(self, func: Callable[..., Awaitable[Any]], *args: Any) -> None:
+        """Start a task running func(*args), according to the overflow policy."""
+        if self.closed:
+            raise RuntimeError("Cannot submit after shutdown")
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending)
+        if self.slots.locked():
+            if self.overflow == "reject":
+                raise QueueFull
+            if self.overflow == "drop":
+                self.dropped += 1
+                logger.warning("Background queue full, dropped a notification")
+                return
+        await self.slots.acquire()
+        task = asyncio.ensure_future(run_logged_async(func, *args))
+        self.tasks.add(task)
+        task.add_done_callback(self.done)
+
+    def done(self, task: "asyncio.Task[None]") -> None:
+        """Called when a notification has run (or was cancelled)."""
+        self.tasks.discard(task)
+        assert self.slots is not None
+        self.slots.release()
+
+    @property
+    def pending(self) -> int:
+        """The number of notifications running."""
+        return len(self.tasks)
+
+    async def shutdown(
+        self, drain: bool = True, timeout: Optional[float] = None
+    ) -> None:
+        """Stop accepting notifications, and wait up to timeout seconds for those
+        running to finish, cancelling any still running after that. With drain=False,
+        they're cancelled straight away.
+        """
+        self.closed = True
+        tasks = list(self.tasks)
+        if tasks and drain:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
@@ -0,0 +1,116 @@
+"""Argument binding plans.
+
+Checking that a method can be called with the request's params used to take an
+inspect.signature(func).bind(...) on every request. Instead, each method's signature
+is analyzed once (on first use) into a BindingPlan, after which a few set and length
+checks tell us whether the arguments will bind.
+
+When the checks fail, we still call Signature.bind, to give exactly the same error
+message as before.
+"""
+from functools import lru_cache
+from inspect import Parameter, Signature, signature
+from typing import Any, Callable, Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+POSITIONAL = (Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD)
+
+
+class KeywordRules(NamedTuple):
+    """What's allowed in the keyword arguments, given some number of leading positional
+    arguments (the context, if there is one).
+    """
+
+    accepted: FrozenSet[str]  # Names that can be passed by keyword
+    required: FrozenSet[str]  # Names that must be passed by keyword
+    forbidden: FrozenSet[str]  # Names already bound positionally, or positional-only
+    any_keyword: bool  # The function takes **kwargs
+
+
+class BindingPlan(NamedTuple):
+    """The result of analyzing a method's signature."""
+
+    signature: Signature
+    min_args: int  # Positional arguments required when no keywords are given
+    max_args: Optional[int]  # None if the function takes *args
+    required_keyword_only: bool
+    # Rules for keyword arguments, indexed by the number of positional arguments (0, or
+    # 1 when a context is passed).
+    keyword_rules: Tuple[KeywordRules, KeywordRules]
+
+
+def make_keyword_rules(sig: Signature, args_count: int) -> KeywordRules:
+    """Work out which keyword arguments are valid after args_count positional
+    arguments have been bound.
+    """
+    params = list(sig.parameters.values())
+    positional = [p for p in params if p.kind in POSITIONAL]
+    bound, unbound = positional[:args_count], positional[args_count:]
+    keyword_only = [p for p in params if p.kind == Parameter.KEYWORD_ONLY]
+    keywordable = [p for p in unbound if p.kind != Parameter.POSITIONAL_ONLY]
+    return KeywordRules(
+        accepted=frozenset(p.name for p in keywordable + keyword_only),
+        required=frozenset(
+            p.name for p in unbound + keyword_only if p.default is Parameter.empty
+        ),
+        forbidden=frozenset(
+            [p.name for p in bound if p.kind != Parameter.POSITIONAL_ONLY]
+            + [p.name for p in unbound if p.kind == Parameter.POSITIONAL_ONLY]
+        ),
+        any_keyword=any(p.kind == Parameter.VAR_KEYWORD for p in params),
+    )
+
+
+def make_binding_plan(func: Callable[..., Any]) -> BindingPlan:
+    """Analyze a function's signature into a BindingPlan."""
+    sig = signature(func)
+    params = list(sig.parameters.values())
+    positional = [p for p in params if p.kind in POSITIONAL]
+    required = [i for i, p in enumerate(positional) if p.default is Parameter.empty]
+    return BindingPlan(
+        signature=sig,
+        min_args=required[-1] + 1 if required else 0,
+        max_args=None
+        if any(p.kind == Parameter.VAR_POSITIONAL for p in params)
+        else len(positional),
+        required_keyword_only=any(
+            p.kind == Parameter.KEYWORD_ONLY and p.default is Parameter.empty
+            for p in params
+        ),
+        keyword_rules=(make_keyword_rules(sig, 0), make_keyword_rules(sig, 1)),
+    )
+
+
+@lru_cache(maxsize=1024)
+def get_cached_binding_plan(func: Callable[..., Any]) -> BindingPlan:
+    """Cached version of make_binding_plan."""
+    return make_binding_plan(func)
+
+
+def get_binding_plan(func: Callable[..., Any]) -> BindingPlan:
+    """Get the BindingPlan for a function, analyzing it only the first time."""
+    try:
+        return get_cached_binding_plan(func)
+    except TypeError:
+        # Unhashable callables can't be cached. (If func is not callable at all,
+        # make_binding_plan raises TypeError again.)
+        return make_binding_plan(func)
+
+
+def can_bind(plan: BindingPlan, args_count: int, kwargs: Dict[str, Any]) -> bool:
+    """True if the arguments will definitely bind to the function.
+
+    A False means they probably won't - use plan.signature.bind to find out why.
+    """
+    if plan.max_args is not None and args_count > plan.max_args:
+        return False
+    if not kwargs:
+        return args_count >= plan.min_args and not plan.required_keyword_only
+    if args_count > 1:
+        return False
+    rules = plan.keyword_rules[args_count]
+    keys = kwargs.keys()
+    return (
+        keys.isdisjoint(rules.forbidden)
+        and rules.required <= keys
+        and (rules.any_keyword or keys <= rules.accepted)
+    )
@@ -0,0 +1,290 @@
+"""Dispatch a file of JSON-RPC requests, one per line (JSONL), across a process pool.
+
+    $ python -m jsonrpcserver.bulk --methods mymodule requests.jsonl -o responses.jsonl
+
+Responses are written one per line, in the order of the requests. Notifications get no
+response, so to match responses to requests, pass --line-numbers to tag each response
+with its request's line number:
+
+    {"line": 1, "response": {"jsonrpc": "2.0", "result": "pong", "id": 1}}
+
+Tagged responses can also be written as they complete, with --unordered (which needs
+--line-numbers, since untagged responses out of order can't be matched to requests).
+
+The input is read and the output written in chunks of many lines, and each chunk is
+dispatched in a worker process, so there's one round trip to a worker per chunk rather
+than per request.
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor
+from concurrent.futures import wait
+from functools import partial
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    cast,
+)
+
+from .codec import Codec, default_codec
+from .dispatcher import dispatch_to_response_pure
+from .hooks import serialize
+from .main import default_validator
+from .methods import Methods, global_methods
+from .response import COMPACT_FRAGMENTS, FRAGMENTS, join_bytes, to_bytes
+from .sentinels import NOCONTEXT
+
+CHUNK_SIZE = 1024 * 1024  # Bytes of requests to send to a worker at a time
+
+
+class Chunk(NamedTuple):
+    """Lines of requests, and the line number of the first one."""
+
+    start: int
+    lines: List[bytes]
+
+
+class BulkStats(NamedTuple):
+    """What a bulk dispatch did, and how long it took."""
+
+    requests: int
+    seconds: float
+
+    @property
+    def rate(self) -> float:
+        """Requests per second."""
+        return self.requests / self.seconds if self.seconds else 0.0
+
+
+def import_modules(modules: Iterable[str]) -> None:
+    """Import the modules, so their @method functions are in global_methods."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+def read_chunks(file: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Chunk]:
+    """Read the file in chunks of lines, of about chunk_size bytes."""
+    start = 1
+    while lines := file.readlines(chunk_size):
+        yield Chunk(start, lines)
+        start += len(lines)
+
+
+def dispatch_chunk(
+    chunk: Chunk,
+    *,
+    methods: Optional[Methods] = None,
+    codec: Codec = default_codec,
+    line_numbers: bool = False,
+) -> Tuple[int, bytes]:
+    """Dispatch the requests in a chunk of lines. Blank lines are skipped.
+
+    Returns: The number of requests, and their responses as JSONL.
+    """
+    # As dispatch_to_bytes, with the options resolved once for the whole chunk.
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    dispatch = partial(
+        dispatch_to_response_pure,
+        deserializer=codec.loads,
+        validator=default_validator,
+        methods=global_methods if methods is None else methods,
+        context=NOCONTEXT,
+        post_process=partial(to_bytes, dumps=codec.dumps, fragments=fragments),
+    )
+    join = partial(join_bytes, fragments=fragments)
+    requests = 0
+    output = []
+    for number, line in enumerate(chunk.lines, chunk.start):
+        if not line.strip():
+            continue
+        requests += 1
+        response: bytes = serialize(join, dispatch(request=line))
+        if response and line_numbers:
+            output.append(b'{"line": %d, "response": %s}\n' % (number, response))
+        elif response:
+            output.append(response + b"\n")
+    return requests, b"".join(output)
+
+
+def map_bounded(
+    executor: Executor,
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    window: int,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """Like Executor.map, but submits at most window items at a time, so the input is
+    read only as fast as it's processed. With ordered=False, results are given as they
+    complete.
+    """
+    pending: Deque["Future[Any]"] = deque()
+
+    def take() -> Iterator[Any]:
+        if ordered:
+            yield pending.popleft().result()
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield future.result()
+
+    for item in items:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield from take()
+    while pending:
+        yield from take()
+
+
+def write_results(results: Iterable[Tuple[int, bytes]], file: BinaryIO) -> int:
+    """Write the responses from dispatch_chunk, giving the number of requests."""
+    requests = 0
+    for count, output in results:
+        requests += count
+        file.write(output)
+    return requests
+
+
+def bulk_dispatch(
+    input_file: BinaryIO,
+    output_file: BinaryIO,
+    methods: Optional[Methods] = None,
+    *,
+    modules: Iterable[str] = (),
+    workers: Optional[int] = None,
+    codec: Codec = default_codec,
+    ordered: bool = True,
+    line_numbers: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> BulkStats:
+    """Dispatch the JSONL requests in input_file, writing JSONL responses to
+    output_file.
+
+    Args:
+        methods: The methods to dispatch to. Defaults to global_methods (in the
+            workers, after importing modules). They're sent to the workers by pickling,
+            so must be module-level functions.
+        modules: Modules to import, in this process and each worker, for their @method
+            functions.
+        workers: Number of worker processes. Defaults to the number of CPUs. With 1,
+            requests are dispatched in this process.
+        ordered: Write responses in the order of the requests, rather than as each
+            chunk completes. Unordered requires line_numbers.
+        line_numbers: Tag each response with its request's line number.
+        chunk_size: Bytes of requests to send to a worker at a time.
+    """
+    if not ordered and not line_numbers:
+        raise ValueError("Unordered responses need line numbers")
+    modules = list(modules)
+    import_modules(modules)
+    workers = workers or os.cpu_count() or 1
+    dispatch = partial(
+        dispatch_chunk, methods=methods, codec=codec, line_numbers=line_numbers
+    )
+    chunks = read_chunks(input_file, chunk_size)
+    start = time.perf_counter()
+    if workers == 1:
+        requests = write_results(map(dispatch, chunks), output_file)
+    else:
+        with ProcessPoolExecutor(
+            workers, initializer=import_modules, initargs=(modules,)
+        ) as executor:
+            requests = write_results(
+                map_bounded(executor, dispatch, chunks, workers * 2, ordered),
+                output_file,
+            )
+    output_file.flush()
+    return BulkStats(requests, time.perf_counter() - start)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        prog="python -m jsonrpcserver.bulk",
+        description="Dispatch a file of JSON-RPC requests, one per line.",
+    )
+    parser.add_argument(
+        "input", nargs="?", default="-", help="Requests file (default: stdin)"
+    )
+    parser.add_argument(
+        "-o", "--output", default="-", help="Responses file (default: stdout)"
+    )
+    parser.add_argument(
+        "--methods",
+        metavar="MODULE",
+        action="append",
+        default=[],
+        help="Import @method functions from this module (can be repeated)",
+    )
+    parser.add_argument(
+        "--workers", type=int, help="Worker processes (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--line-numbers",
+        action="store_true",
+        help="Tag each response with its request's line number",
+    )
+    parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="Write responses as they complete, not in the order of the requests"
+        " (requires --line-numbers)",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=CHUNK_SIZE,
+        help=f"Bytes of requests to send to a worker at a time (default: {CHUNK_SIZE})",
+    )
+    args = parser.parse_args(argv)
+    if args.unordered and not args.line_numbers:
+        parser.error("--unordered requires --line-numbers")
+    return args
+
+
+def open_file(path: str, mode: str, default: BinaryIO) -> BinaryIO:
+    """Open a file, or "-" for stdin/stdout."""
+    # pylint: disable=consider-using-with,unspecified-encoding
+    return default if path == "-" else cast(BinaryIO, open(path, mode))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Dispatch the requests, and report the throughput on stderr."""
+    args = parse_args(argv)
+    input_file = open_file(args.input, "rb", sys.stdin.buffer)
+    output_file = open_file(args.output, "wb", sys.stdout.buffer)
+    try:
+        stats = bulk_dispatch(
+            input_file,
+            output_file,
+            modules=args.methods,
+            workers=args.workers,
+            ordered=not args.unordered,
+            line_numbers=args.line_numbers,
+            chunk_size=args.chunk_size,
+        )
+    finally:
+        for file in (input_file, output_file):
+            if file not in (sys.stdin.buffer, sys.stdout.buffer):
+                file.close()
+    print(
+        f"Dispatched {stats.requests} requests in {stats.seconds:.2f}s"
+        f" ({stats.rate:.0f}/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Caching the results of pure methods.
+
+    >>> prices = Cache(max_entries=1000, ttl=60.0)
+    >>> @method(cache=prices)
+    ... def price(symbol):
+    ...     return Success(lookup_price(symbol))
+
+A request to a cached method with the same params as an earlier one gets the earlier
+result, without calling the method. Only successful results are cached, so errors
+aren't repeated to later callers.
+
+Results are keyed by the request params, serialized canonically (so {"a": 1, "b": 2}
+and {"b": 2, "a": 1} are the same key), or by a custom key function given the params.
+The context argument isn't part of the key, so a method whose result depends on the
+context needs a key function, or no cache. Nor is the method name, so a cache belongs to
+one method; @method raises ValueError if it's given to another.
+
+    >>> prices.invalidate(["BTC"])  # Forget the result for these params
+    >>> prices.clear()  # Forget everything
+    >>> prices.stats()
+    CacheStats(hits=10, misses=2, size=0)
+
+The least recently used results are evicted once there are max_entries, and results
+expire after ttl seconds.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, NamedTuple, Optional, Tuple
+
+from .either import Right
+from .result import Result
+
+# An expiry time (or None), and the result.
+Entry = Tuple[Optional[float], Result]
+
+
+class CacheStats(NamedTuple):
+    """How well a cache is working."""
+
+    hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of lookups that were hits."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+def canonical_key(params: Any) -> str:
+    """The params serialized as JSON, with keys sorted and no whitespace."""
+    return json.dumps(params, sort_keys=True, separators=(",", ":"), default=repr)
+
+
+class Cache:
+    """A cache of results, shared by the threads and tasks dispatching to the method.
+
+    Args:
+        max_entries: The most results to keep.
+        ttl: Seconds a result is kept, or None to keep it until evicted.
+        key: Gives the key for a request's params (default: canonical_key).
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        key: Callable[[Any], Hashable] = canonical_key,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key = key
+        self.entries: "OrderedDict[Hashable, Entry]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.method: Optional[Callable[..., Any]] = None
+
+    def attach(self, method: Callable[..., Any]) -> None:
+        """Cache the results of this method, the only one the cache can be used for."""
+        with self.lock:
+            if self.method is not None and self.method is not method:
+                raise ValueError("A cache can't be shared by more than one method")
+            self.method = method
+
+    def get(self, key: Hashable) -> Optional[Result]:
+        """The cached result, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if (
+                entry is not None
+                and entry[0] is not None
+                and entry[0] < time.monotonic()
+            ):
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, result: Result) -> None:
+        """Cache a result, if it's a success."""
+        if not isinstance(result, Right):
+            return
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, params: Any) -> None:
+        """Forget the result for these params."""
+        with self.lock:
+            self.entries.pop(self.key(params), None)
+
+    def clear(self) -> None:
+        """Forget all the results."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> CacheStats:
+        """The hits and misses so far, and the number of results cached."""
+        with self.lock:
+            return CacheStats(self.hits, self.misses, len(self.entries))
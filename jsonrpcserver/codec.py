@@ -0,0 +1,119 @@
+"""Codecs - pairs of functions to deserialize requests and serialize responses.
+
+A codec's loads takes the raw request (str, bytes, bytearray or memoryview), and its
+dumps gives bytes, ready to write to a socket. The stdlib json codec is always
+available; orjson and ujson codecs are available if those libraries are installed.
+They're imported the first time their codec is looked up, so importing jsonrpcserver
+stays quick.
+
+    >>> dispatch_to_bytes(request, codec=codecs["orjson"])
+"""
+import json
+from typing import Any, Callable, Dict, Iterator, MutableMapping, NamedTuple, Union
+
+RequestData = Union[str, bytes, bytearray, memoryview]
+
+
+class Codec(NamedTuple):
+    """A deserializer and serializer pair."""
+
+    name: str
+    loads: Callable[[RequestData], Any]
+    dumps: Callable[[Any], bytes]
+    # True if dumps writes without whitespace after separators. Used to keep the
+    # response envelope consistent with the payload.
+    compact: bool = False
+
+
+def json_loads(data: RequestData) -> Any:
+    """json.loads doesn't accept a memoryview, so it has to be copied to bytes."""
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+def json_dumps(obj: Any) -> bytes:
+    """Serialize with json.dumps, the same as dispatch_to_json does, but to bytes."""
+    return json.dumps(obj).encode()
+
+
+json_codec = Codec("json", json_loads, json_dumps)
+
+# Gives a codec, importing its library.
+Loader = Callable[[], Codec]
+
+# pylint: disable=import-outside-toplevel,no-member,c-extension-no-member
+
+
+def load_orjson() -> Codec:
+    """The orjson codec. Raises ImportError if orjson isn't installed."""
+    import orjson
+
+    # orjson reads str, bytes, bytearray and memoryview without copying, and writes
+    # bytes.
+    return Codec("orjson", orjson.loads, orjson.dumps, compact=True)
+
+
+def load_ujson() -> Codec:
+    """The ujson codec. Raises ImportError if ujson isn't installed."""
+    import ujson
+
+    def ujson_loads(data: RequestData) -> Any:
+        """ujson.loads doesn't accept a memoryview."""
+        return ujson.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+    def ujson_dumps(obj: Any) -> bytes:
+        """ujson escapes forward slashes by default, unlike json and orjson."""
+        return ujson.dumps(obj, escape_forward_slashes=False).encode()
+
+    return Codec("ujson", ujson_loads, ujson_dumps, compact=True)
+
+
+class Codecs(MutableMapping[str, Codec]):
+    """The codecs, by name. The optional ones are loaded the first time they're looked
+    up (or iterated over), so their libraries aren't imported until they're needed. A
+    codec whose library isn't installed is missing.
+    """
+
+    def __init__(self, loaded: Dict[str, Codec], loaders: Dict[str, Loader]):
+        self.loaded = loaded
+        self.loaders = loaders
+
+    def __getitem__(self, name: str) -> Codec:
+        if name not in self.loaded:
+            loader = self.loaders.pop(name)  # KeyError if there's no such codec
+            try:
+                self.loaded[name] = loader()
+            except ImportError:
+                raise KeyError(name) from None
+        return self.loaded[name]
+
+    def __setitem__(self, name: str, codec: Codec) -> None:
+        self.loaders.pop(name, None)
+        self.loaded[name] = codec
+
+    def __delitem__(self, name: str) -> None:
+        loader = self.loaders.pop(name, None)
+        if self.loaded.pop(name, None) is None and loader is None:
+            raise KeyError(name)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([name for name in [*self.loaded, *self.loaders] if name in self])
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+
+codecs = Codecs({"json": json_codec}, {"orjson": load_orjson, "ujson": load_ujson})
+
+default_codec = json_codec
+
+# The fastest codec installed (see __getattr__).
+fastest_codec: Codec
+
+
+def __getattr__(name: str) -> Codec:
+    """fastest_codec is the fastest codec installed - found on first use, so the
+    optional libraries aren't imported with this module.
+    """
+    if name == "fastest_codec":
+        return codecs.get("orjson") or codecs.get("ujson") or json_codec
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -6,3 +6,7 @@ ERROR_METHOD_NOT_FOUND = -32601
 ERROR_INVALID_PARAMS = -32602
 ERROR_INTERNAL_ERROR = -32603
 ERROR_SERVER_ERROR = -32000
+
+# Implementation-defined server errors (-32000 to -32099).
+ERROR_TIMEOUT = -32001
+ERROR_RATE_LIMITED = -32002
@@ -4,15 +4,32 @@ requests, providing responses.
 
 # pylint: disable=protected-access
 import logging
+from concurrent.futures import Executor, as_completed
 from functools import partial
-from inspect import signature
 from itertools import starmap
-from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
-
-from oslash.either import Either, Left, Right  # type: ignore
+from time import perf_counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
-from .exceptions import JsonRpcError
-from .methods import Method, Methods
+from .binding import can_bind, get_binding_plan
+from .codec import RequestData
+from .either import Either, Left, Right
+from .exceptions import JsonRpcError, QueueFull
+from .hooks import describe, error_code, hooks, report
+from .methods import Method, Methods, get_options
+from .process_pool import submit
+from .rate_limit import RATE_LIMITED
 from .request import Request
 from .response import (
     ErrorResponse,
@@ -31,16 +48,17 @@ from .result import (
     SuccessResult,
 )
 from .sentinels import NOCONTEXT, NOID
-from .utils import compose, make_list
+from .utils import make_list
+
+if TYPE_CHECKING:
+    from .background import BackgroundQueue
 
 Deserialized = Union[Dict[str, Any], List[Dict[str, Any]]]
 
 logger = logging.getLogger(__name__)
 
 
-def extract_list(
-    is_batch: bool, responses: Iterable[Response]
-) -> Union[Response, List[Response], None]:
+def extract_list(is_batch: bool, responses: Iterable[Any]) -> Any:
     """This is the inverse of make_list. Here we extract a response back out of the list
     if it wasn't a batch request originally. Also applies a JSON-RPC rule: we do not
     respond to batches of notifications.
@@ -79,11 +97,10 @@ def to_response(request: Request, result: Result) -> Response:
     Returns: A Response.
     """
     assert request.id is not NOID
-    return (
-        Left(ErrorResponse(**result._error._asdict(), id=request.id))
-        if isinstance(result, Left)
-        else Right(SuccessResponse(**result._value._asdict(), id=request.id))
-    )
+    if isinstance(result, Left):
+        error = result._error
+        return Left(ErrorResponse(error.code, error.message, error.data, request.id))
+    return Right(SuccessResponse(result._value.result, request.id))
 
 
 def extract_args(request: Request, context: Any) -> List[Any]:
@@ -94,7 +111,7 @@ def extract_args(request: Request, context: Any) -> List[Any]:
     Returns: A list containing the positional arguments.
     """
     params = request.params if isinstance(request.params, list) else []
-    return [context] + params if context is not NOCONTEXT else params
+    return [context, *params] if context is not NOCONTEXT else params
 
 
 def extract_kwargs(request: Request) -> Dict[str, Any]:
@@ -121,11 +138,17 @@ def call(request: Request, context: Any, method: Method) -> Result:
     """Call the method.
 
     Handles any exceptions raised in the method, being sure to return an Error response.
+    That includes a worker process dying, for methods run in a process pool.
 
     Returns: A Result.
     """
     try:
-        result = method(*extract_args(request, context), **extract_kwargs(request))
+        args, kwargs = extract_args(request, context), extract_kwargs(request)
+        result: Result = (
+            submit(method, args, kwargs).result()
+            if get_options(method).executor == "process"
+            else method(*args, **kwargs)
+        )
         # validate_result raises AssertionError if the return value is not a valid
         # Result, which should respond with Internal Error because its a problem in the
         # method.
@@ -141,15 +164,37 @@ def call(request: Request, context: Any, method: Method) -> Result:
     return result
 
 
+def call_cached(request: Request, context: Any, method: Method) -> Result:
+    """Call the method, or give its cached result if it has a cache (see cache.py)."""
+    cache = get_options(method).cache
+    if cache is None:
+        return call(request, context, method)
+    key = cache.key(request.params)
+    result = cache.get(key)
+    if result is None:
+        result = call(request, context, method)
+        cache.put(key, result)
+    return result
+
+
 def validate_args(
     request: Request, context: Any, func: Method
 ) -> Either[ErrorResult, Method]:
     """Ensure the method can be called with the arguments given.
 
+    The method's signature is analyzed only once, into a binding plan. Only if the
+    plan's checks fail do we bind the arguments to the signature, to find out why.
+
     Returns: Either the function to be called, or an Invalid Params error result.
     """
     try:
-        signature(func).bind(*extract_args(request, context), **extract_kwargs(request))
+        plan = get_binding_plan(func)
+        kwargs = extract_kwargs(request)
+        args_count = (
+            len(request.params) if isinstance(request.params, list) else 0
+        ) + (context is not NOCONTEXT)
+        if not can_bind(plan, args_count, kwargs):
+            plan.signature.bind(*extract_args(request, context), **kwargs)
     except TypeError as exc:
         return Left(InvalidParamsResult(str(exc)))
     return Right(func)
@@ -166,21 +211,59 @@ def get_method(methods: Methods, method_name: str) -> Either[ErrorResult, Method
         return Left(MethodNotFoundResult(method_name))
 
 
+def check_rate_limit(
+    context: Any, method: Either[ErrorResult, Method]
+) -> Either[ErrorResult, Method]:
+    """Check the method's rate limit, if it has one (see rate_limit.py), taking a token
+    for the client.
+
+    Returns: The method, or a Rate limit exceeded error. If the rate limit's key
+        function raises, an Internal error, for this request only.
+    """
+    if not isinstance(method, Right):
+        return method
+    rate_limit = get_options(method._value).rate_limit
+    if rate_limit is None:
+        return method
+    try:
+        allowed = rate_limit.allow(context)
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception(exc)
+        return Left(InternalErrorResult(str(exc)))
+    return method if allowed else RATE_LIMITED
+
+
 def dispatch_request(
-    methods: Methods, context: Any, request: Request
+    methods: Methods,
+    context: Any,
+    request: Request,
+    *,
+    batch_size: Optional[int] = None,
 ) -> Tuple[Request, Result]:
     """Get the method, validates the arguments and calls the method.
 
+    batch_size is only to tag the timings given to hooks.
+
     Returns: A tuple containing the Result of the method, along with the original
         Request. We need the ids from the original request to remove notifications
         before responding, and  create a Response.
     """
-    return (
-        request,
-        get_method(methods, request.method)
-        .bind(partial(validate_args, request, context))
-        .bind(partial(call, request, context)),
-    )
+    start = perf_counter() if hooks else 0.0
+    method = check_rate_limit(context, get_method(methods, request.method))
+    if hooks:
+        start = report("lookup", start, request.method, batch_size, error_code(method))
+    if isinstance(method, Right):
+        method = validate_args(request, context, method._value)
+        if hooks:
+            start = report(
+                "bind", start, request.method, batch_size, error_code(method)
+            )
+        if isinstance(method, Right):
+            result = call_cached(request, context, method._value)
+            if hooks:
+                report("call", start, request.method, batch_size, error_code(result))
+            return (request, result)
+    return (request, method)
 
 
 def create_request(request: Dict[str, Any]) -> Request:
@@ -190,6 +273,38 @@ def create_request(request: Dict[str, Any]) -> Request:
     )
 
 
+def get_batch_size(deserialized: Deserialized) -> Optional[int]:
+    """The number of requests in a batch, or None if it's not a batch."""
+    return len(deserialized) if isinstance(deserialized, list) else None
+
+
+def respond(
+    post_process: Callable[[Response], Any],
+    batch_size: Optional[int],
+    request: Request,
+    result: Result,
+) -> Any:
+    """to_response then post_process, timed for the hooks."""
+    start = perf_counter()
+    response = post_process(to_response(request, result))
+    report("post_process", start, request.method, batch_size)
+    return response
+
+
+def to_responses(
+    post_process: Callable[[Response], Any],
+    batch_size: Optional[int],
+    results: Iterable[Tuple[Request, Result]],
+) -> Iterator[Any]:
+    """The Responses to the results (with post_process applied), skipping
+    notifications.
+    """
+    results = filter(not_notification, results)
+    if hooks:
+        return starmap(partial(respond, post_process, batch_size), results)
+    return map(post_process, starmap(to_response, results))
+
+
 def not_notification(request_result: Any) -> bool:
     """True if the request was not a notification.
 
@@ -198,25 +313,76 @@ def not_notification(request_result: Any) -> bool:
     return request_result[0].id is not NOID
 
 
+def submit_notifications(
+    background: "BackgroundQueue",
+    dispatch: Callable[[Request], Any],
+    requests: List[Request],
+) -> List[Request]:
+    """Hand the notifications to the background queue (see background.py).
+
+    Returns: The other requests, to be dispatched now.
+    """
+    for request in requests:
+        if request.id is NOID:
+            background.submit(dispatch, request)
+    return [request for request in requests if request.id is not NOID]
+
+
 def dispatch_deserialized(
     methods: Methods,
     context: Any,
-    post_process: Callable[[Response], Iterable[Any]],
+    post_process: Callable[[Response], Any],
     deserialized: Deserialized,
-) -> Union[Response, List[Response], None]:
+    *,
+    executor: Optional[Executor] = None,
+    background: Optional["BackgroundQueue"] = None,
+) -> Any:
     """This is simply continuing the pipeline from dispatch_to_response_pure. It exists
     only to be an abstraction, otherwise that function is doing too much. It continues
     on from the request string having been parsed and validated.
 
+    If an executor is given, the requests in a batch are dispatched on it concurrently.
+    Executor.map gives the results in the original order.
+
+    If a background queue is given, notifications are run on it instead, without
+    waiting for them.
+
     Returns: A Response, a list of Responses, or None. If post_process is passed, it's
         applied to the Response(s).
     """
-    results = map(
-        compose(partial(dispatch_request, methods, context), create_request),
-        make_list(deserialized),
+    parallel = executor is not None and isinstance(deserialized, list)
+    batch_size = get_batch_size(deserialized)
+    dispatch = partial(dispatch_request, methods, context, batch_size=batch_size)
+    requests: Iterable[Request] = map(create_request, make_list(deserialized))
+    if background is not None:
+        requests = submit_notifications(background, dispatch, list(requests))
+    results = (executor.map if parallel else map)(dispatch, requests)  # type: ignore
+    return extract_list(
+        isinstance(deserialized, list), to_responses(post_process, batch_size, results)
     )
-    responses = starmap(to_response, filter(not_notification, results))
-    return extract_list(isinstance(deserialized, list), map(post_process, responses))
+
+
+def validate_batch_size(
+    max_batch_size: Optional[int], request: Deserialized
+) -> Either[ErrorResponse, Deserialized]:
+    """Reject a batch with more requests than allowed.
+
+    This is checked straight after deserializing, so an oversized batch costs no more
+    than a len().
+
+    Returns: Either the same request passed in or an Invalid request response.
+    """
+    if (
+        max_batch_size is not None
+        and isinstance(request, list)
+        and len(request) > max_batch_size
+    ):
+        return Left(
+            InvalidRequestResponse(
+                f"The batch exceeds the maximum of {max_batch_size} requests"
+            )
+        )
+    return Right(request)
 
 
 def validate_request(
@@ -228,57 +394,224 @@ def validate_request(
 
     Returns: Either the same request passed in or an Invalid request response.
     """
+    start = perf_counter() if hooks else 0.0
+    result: Either[ErrorResponse, Deserialized]
     try:
         validator(request)
+        result = Right(request)
     # Since the validator is unknown, the specific exception that will be raised is also
     # unknown. Any exception raised we assume the request is invalid and  return an
     # "invalid request" response.
     except Exception:  # pylint: disable=broad-except
-        return Left(InvalidRequestResponse("The request failed schema validation"))
-    return Right(request)
+        result = Left(InvalidRequestResponse("The request failed schema validation"))
+    if hooks:
+        report("validate", start, *describe(request), error_code(result))
+    return result
 
 
 def deserialize_request(
-    deserializer: Callable[[str], Deserialized], request: str
+    deserializer: Callable[[Any], Deserialized], request: RequestData
 ) -> Either[ErrorResponse, Deserialized]:
     """Parse the JSON request string.
 
     Returns: Either the deserialized request or a "Parse Error" response.
     """
+    start = perf_counter() if hooks else 0.0
+    result: Either[ErrorResponse, Deserialized]
     try:
-        return Right(deserializer(request))
+        result = Right(deserializer(request))
     # Since the deserializer is unknown, the specific exception that will be raised is
     # also unknown. Any exception raised we assume the request is invalid, return a
     # parse error response.
     except Exception as exc:  # pylint: disable=broad-except
-        return Left(ParseErrorResponse(str(exc)))
+        result = Left(ParseErrorResponse(str(exc)))
+    if hooks:
+        report(
+            "deserialize",
+            start,
+            *describe(result._value if isinstance(result, Right) else None),
+            error_code(result),
+            len(request),
+        )
+    return result
 
 
 def dispatch_to_response_pure(
     *,
-    deserializer: Callable[[str], Deserialized],
+    deserializer: Callable[[Any], Deserialized],
     validator: Callable[[Deserialized], Deserialized],
     methods: Methods,
     context: Any,
-    post_process: Callable[[Response], Iterable[Any]],
-    request: str,
-) -> Union[Response, List[Response], None]:
+    post_process: Callable[[Response], Any],
+    request: RequestData,
+    executor: Optional[Executor] = None,
+    background: Optional["BackgroundQueue"] = None,
+) -> Any:
     """A function from JSON-RPC request string to Response namedtuple(s), (yet to be
     serialized to json).
 
+    Raises: QueueFull if a notification is rejected by the background queue.
+
     Returns: A single Response, a list of Responses, or None. None is given for
         notifications or batches of notifications, to indicate that we should not
         respond.
     """
     try:
-        result = deserialize_request(deserializer, request).bind(
-            partial(validate_request, validator)
-        )
+        result = deserialize_request(deserializer, request)
+        if isinstance(result, Right):
+            result = validate_request(validator, result._value)
         return (
             post_process(result)
             if isinstance(result, Left)
-            else dispatch_deserialized(methods, context, post_process, result._value)
+            else dispatch_deserialized(
+                methods,
+                context,
+                post_process,
+                result._value,
+                executor=executor,
+                background=background,
+            )
+        )
+    except QueueFull:
+        raise
+    except Exception as exc:  # pylint: disable=broad-except
+        # There was an error with the jsonrpcserver library.
+        logger.exception(exc)
+        return post_process(Left(ServerErrorResponse(str(exc), None)))
+
+
+def dispatch_deserialized_stream(
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    deserialized: Deserialized,
+    *,
+    executor: Optional[Executor] = None,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """Like dispatch_deserialized, but lazily yields the responses one at a time.
+
+    Without an executor, each request is dispatched as the previous response is
+    consumed. With an executor, the whole batch is started at once, and responses are
+    yielded in the order of the requests (ordered=True), or as they complete.
+
+    Returns: An iterator of Responses (with post_process applied). Notifications give
+        no response.
+    """
+    requests = map(create_request, make_list(deserialized))
+    batch_size = get_batch_size(deserialized)
+    dispatch = partial(dispatch_request, methods, context, batch_size=batch_size)
+    results: Iterable[Tuple[Request, Result]]
+    if executor is None or not isinstance(deserialized, list):
+        results = map(dispatch, requests)
+    elif ordered:
+        results = executor.map(dispatch, requests)
+    else:
+        futures = [executor.submit(dispatch, request) for request in requests]
+        results = (future.result() for future in as_completed(futures))
+    return to_responses(post_process, batch_size, results)
+
+
+def dispatch_to_response_stream_pure(
+    *,
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    request: RequestData,
+    executor: Optional[Executor] = None,
+    ordered: bool = True,
+) -> Tuple[bool, Iterator[Any]]:
+    """The streaming version of dispatch_to_response_pure. The request is deserialized
+    and validated straight away, and the requests are dispatched as the responses are
+    consumed.
+
+    Returns: A tuple of whether the request was a batch, and an iterator of Responses.
+    """
+    try:
+        result = deserialize_request(deserializer, request)
+        if isinstance(result, Right):
+            result = validate_request(validator, result._value)
+        if isinstance(result, Left):
+            return (False, iter([post_process(result)]))
+        return (
+            isinstance(result._value, list),
+            dispatch_deserialized_stream(
+                methods,
+                context,
+                post_process,
+                result._value,
+                executor=executor,
+                ordered=ordered,
+            ),
+        )
+    except Exception as exc:  # pylint: disable=broad-except
+        # There was an error with the jsonrpcserver library.
+        logger.exception(exc)
+        return (False, iter([post_process(Left(ServerErrorResponse(str(exc), None)))]))
+
+
+def validate_batch_item(
+    validator: Callable[[Deserialized], Deserialized], request: Deserialized
+) -> Either[ErrorResponse, Deserialized]:
+    """Validate one request from a batch. A validator accepts a batch too, but a batch
+    can't be nested in a batch.
+
+    Returns: Either the same request passed in or an Invalid request response.
+    """
+    if isinstance(request, list):
+        return Left(InvalidRequestResponse("The request failed schema validation"))
+    return validate_request(validator, request)
+
+
+def deserialize_batch_item(
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    request: Union[RequestData, ValueError],
+) -> Either[ErrorResponse, Deserialized]:
+    """Deserialize and validate one request from a batch that's been split up (see
+    incremental.py). A ValueError is the error that stopped the batch being split.
+
+    Returns: Either the deserialized request or an error response.
+    """
+    if isinstance(request, ValueError):
+        return Left(ParseErrorResponse(str(request)))
+    result = deserialize_request(deserializer, request)
+    if isinstance(result, Right):
+        result = validate_batch_item(validator, result._value)
+    return result
+
+
+def dispatch_batch_item(
+    *,
+    deserializer: Callable[[Any], Deserialized],
+    validator: Callable[[Deserialized], Deserialized],
+    methods: Methods,
+    context: Any,
+    post_process: Callable[[Response], Any],
+    request: Union[RequestData, ValueError],
+) -> Any:
+    """Dispatch one request from a batch that's been split up, without the rest of the
+    batch having been deserialized.
+
+    Unlike a whole batch, which is rejected if any of it is invalid, each request gets
+    its own Parse error or Invalid request response.
+
+    Returns: A Response (with post_process applied), or None for a notification.
+    """
+    try:
+        result = deserialize_batch_item(deserializer, validator, request)
+        if isinstance(result, Left):
+            return post_process(result)
+        request_, method_result = dispatch_request(
+            methods, context, create_request(cast(Dict[str, Any], result._value))
         )
+        if request_.id is NOID:
+            return None
+        if hooks:
+            return respond(post_process, None, request_, method_result)
+        return post_process(to_response(request_, method_result))
     except Exception as exc:  # pylint: disable=broad-except
         # There was an error with the jsonrpcserver library.
         logger.exception(exc)
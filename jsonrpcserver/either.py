@@ -0,0 +1,66 @@
+"""A minimal Either type - Left for errors, Right for successes.
+
+This replaces oslash's Either, which was heavier than needed in the dispatch hot path
+(each instance is a full Monad with abc-based isinstance checks). These are plain
+slotted classes, with the same attributes (_error and _value), equality and bind/map
+behaviour as oslash's, so Results and Responses work as before.
+"""
+from typing import Any, Callable, Generic, TypeVar, Union
+
+# pylint: disable=invalid-name
+
+L = TypeVar("L")
+R = TypeVar("R")
+
+
+class Left(Generic[L]):
+    """Represents an error."""
+
+    __slots__ = ("_error",)
+
+    def __init__(self, error: L) -> None:
+        self._error = error
+
+    def bind(self, _: Callable[[Any], Any]) -> "Left[L]":
+        """A Left short-circuits, the function is not applied."""
+        return self
+
+    def map(self, _: Callable[[Any], Any]) -> "Left[L]":
+        """A Left short-circuits, the function is not applied."""
+        return self
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Left) and self._error == other._error
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"Left({self._error!r})"
+
+
+class Right(Generic[R]):
+    """Represents a success."""
+
+    __slots__ = ("_value",)
+
+    def __init__(self, value: R) -> None:
+        self._value = value
+
+    def bind(self, func: Callable[[R], Any]) -> Any:
+        """Apply a function that returns an Either."""
+        return func(self._value)
+
+    def map(self, func: Callable[[R], Any]) -> "Right[Any]":
+        """Apply a function to the value, wrapping the result in a Right."""
+        return Right(func(self._value))
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Right) and self._value == other._value
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"Right({self._value!r})"
+
+
+Either = Union[Left[L], Right[R]]
@@ -12,3 +12,9 @@ class JsonRpcError(Exception):
 
     def __init__(self, code: int, message: str, data: Any = NODATA):
         self.code, self.message, self.data = (code, message, data)
+
+
+class QueueFull(Exception):
+    """A notification was rejected, because the background queue is full (see
+    background.py).
+    """
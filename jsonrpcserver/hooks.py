@@ -0,0 +1,119 @@
+"""Timing hooks, to see where the time goes in dispatching.
+
+    >>> def print_timing(timing: Timing) -> None:
+    ...     print(timing.stage, timing.method, f"{timing.seconds * 1e6:.1f}us")
+    >>> add_hook(print_timing)
+    >>> dispatch('{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    deserialize ping 2.1us
+    validate ping 1.0us
+    lookup ping 0.2us
+    bind ping 0.9us
+    call ping 0.8us
+    post_process ping 1.6us
+    serialize None 3.0us
+
+A hook is called after each stage of the pipeline, the same for the sync and async
+dispatchers:
+
+- deserialize: Parsing the request string (once for a whole batch).
+- validate: Checking it's valid JSON-RPC (once for a whole batch).
+- lookup: Finding the method, and checking its rate limit, per request.
+- bind: Checking the params fit the method's signature, per request.
+- call: Calling the method, per request. (With the async dispatcher, this is the time
+  until the call completes, including any time waiting on other tasks.)
+- post_process: Making the response, and applying post_process to it, per response.
+  With dispatch_to_bytes, this includes serializing each response.
+- serialize: Serializing the whole response (with dispatch_to_json or
+  dispatch_to_bytes).
+
+Each Timing is tagged with the method name (where there is one), and the batch size (or
+None if the request isn't a batch). If a stage failed, error is the JSON-RPC error code
+(e.g. a lookup giving Method not found). The deserialize and serialize timings also give
+the size of the request and response.
+
+With the async dispatcher, a call that doesn't complete (it's cancelled, or an exception
+escapes it) is reported as a "cancelled" stage instead of "call".
+
+When no hook is installed, each stage costs only a check of the hooks list. Hooks are
+called synchronously, so should be quick, and shouldn't raise.
+"""
+from time import perf_counter
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple, TypeVar
+
+from .either import Left
+
+T = TypeVar("T")
+
+
+class Timing(NamedTuple):
+    """How long a stage of dispatching took."""
+
+    stage: str
+    seconds: float
+    method: Optional[str] = None
+    batch_size: Optional[int] = None
+    error: Optional[int] = None
+    size: Optional[int] = None
+
+
+Hook = Callable[[Timing], None]
+
+# The installed hooks. Dispatching checks this is empty before timing anything.
+hooks: List[Hook] = []
+
+
+def add_hook(hook: Hook) -> None:
+    """Install a hook, to be called with a Timing after each stage of dispatching."""
+    hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    """Uninstall a hook."""
+    hooks.remove(hook)
+
+
+def report(  # pylint: disable=too-many-arguments
+    stage: str,
+    start: float,
+    method: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    error: Optional[int] = None,
+    size: Optional[int] = None,
+) -> float:
+    """Call the hooks with the time since start.
+
+    Returns: The time now, to start timing the next stage.
+    """
+    now = perf_counter()
+    timing = Timing(stage, now - start, method, batch_size, error, size)
+    for hook in hooks:
+        hook(timing)
+    return now
+
+
+def describe(request: Any) -> Tuple[Optional[str], Optional[int]]:
+    """The method name and batch size, to tag the timing of a deserialized request."""
+    if isinstance(request, list):
+        return (None, len(request))
+    if isinstance(request, dict) and isinstance(request.get("method"), str):
+        return (request["method"], None)
+    return (None, None)
+
+
+def error_code(result: Any) -> Optional[int]:
+    """The error code, if a stage's result is an error (an ErrorResult or
+    ErrorResponse).
+    """
+    if isinstance(result, Left):
+        return int(result._error.code)  # pylint: disable=protected-access
+    return None
+
+
+def serialize(serializer: Callable[[Any], T], response: Any) -> T:
+    """Serialize the whole response, timed for the hooks."""
+    if not hooks:
+        return serializer(response)
+    start = perf_counter()
+    serialized = serializer(response)
+    report("serialize", start, size=len(serialized))  # type: ignore
+    return serialized
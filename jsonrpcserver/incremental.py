@@ -0,0 +1,192 @@
+"""Incremental parsing of batch requests.
+
+A batch is usually deserialized all at once, so a huge batch is held in memory as one
+giant list of dicts before anything is dispatched. Instead, the batch's JSON array can
+be split into its elements as the bytes arrive, and each element deserialized and
+dispatched on its own, so memory is bounded by the largest single request.
+
+    >>> splitter = ArraySplitter()
+    >>> list(splitter.feed(b'[{"id": 1}, {"i'))
+    [b'{"id": 1}']
+    >>> list(splitter.feed(b'd": 2}]'))
+    [b' {"id": 2}']
+
+Elements are not parsed here, only found - it's enough to track strings and nesting.
+"""
+import re
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Iterable,
+    Iterator,
+    Optional,
+    Union,
+)
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = b" \t\n\r"
+
+# A complete string (skipped in one go), an incomplete string (the rest hasn't arrived
+# yet), or a structural character.
+TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|"|[\[\]{},]', re.DOTALL)
+# The inside of a string, up to its closing quote, or up to the end of the buffer (or
+# a backslash at the end, whose escaped character hasn't arrived yet).
+STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+QUOTE, COMMA = ord('"'), ord(",")
+OPENING, CLOSING = frozenset(b"[{"), frozenset(b"]}")
+
+# Either a request's bytes, or the error that stopped the batch being split.
+Element = Union[bytes, ValueError]
+
+
+class ArraySplitter:
+    """Splits a JSON array, fed in chunks of bytes, into the bytes of its elements.
+
+    If the document isn't an array (is_batch is False), it's given whole on close().
+
+    Raises:
+        ValueError: If the array is malformed (e.g. an empty element, or data after the
+            array). The elements before the error are still given.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+        self.pos = 0  # Where to continue scanning
+        self.start = 0  # Where the current element started
+        self.depth = 0
+        self.in_string = False  # Scanning stopped inside an incomplete string
+        self.count = 0  # Elements found
+        self.is_batch: Optional[bool] = None
+        self.done = False
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        """Add a chunk, giving the elements it completes."""
+        self.buffer += chunk
+        if self.is_batch is None:
+            stripped = self.buffer.lstrip(WHITESPACE)
+            if not stripped:
+                return
+            self.is_batch = stripped[:1] == b"["
+        if self.is_batch:
+            yield from self.scan()
+            # Discard what's been consumed, so memory is bounded by the largest element.
+            del self.buffer[: self.start]
+            self.pos -= self.start
+            self.start = 0
+
+    def close(self) -> Iterator[bytes]:
+        """No more chunks. Gives the whole document if it wasn't an array."""
+        if not self.is_batch:
+            yield bytes(self.buffer)
+        elif not self.done:
+            raise ValueError("Unterminated batch")
+
+    def scan(self) -> Iterator[bytes]:
+        """Scan the buffer from where we left off."""
+        buffer = self.buffer
+        if self.done:
+            if buffer[self.pos :].strip(WHITESPACE):
+                raise ValueError("Extra data after the batch")
+            return
+        if self.in_string and not self.skip_string():
+            return
+        for match in TOKEN.finditer(buffer, self.pos):
+            char = buffer[match.start()]
+            self.pos = match.end()
+            if char == QUOTE:
+                if self.pos - match.start() == 1:  # The string is incomplete
+                    # Carry on from the end of what's arrived next time, rather than
+                    # scanning the whole string again.
+                    self.in_string = True
+                    self.skip_string()
+                    return
+            elif char in OPENING:
+                self.depth += 1
+                if self.depth == 1:
+                    self.start = self.pos
+            elif char in CLOSING:
+                self.depth -= 1
+                if self.depth == 0:
+                    yield from self.element(buffer[self.start : match.start()], True)
+                    self.start = self.pos
+                    self.done = True
+                    if buffer[self.pos :].strip(WHITESPACE):
+                        raise ValueError("Extra data after the batch")
+                    return
+            elif char == COMMA and self.depth == 1:
+                yield from self.element(buffer[self.start : match.start()], False)
+                self.start = self.pos
+        self.pos = len(buffer)
+
+    def skip_string(self) -> bool:
+        """Skip the rest of the string we're in, as far as it's arrived.
+
+        Returns: True if the string is complete.
+        """
+        match = STRING_REST.match(self.buffer, self.pos)
+        assert match is not None  # It matches the empty string
+        self.pos = match.end()
+        if self.pos < len(self.buffer) and self.buffer[self.pos] == QUOTE:
+            self.pos += 1
+            self.in_string = False
+        return not self.in_string
+
+    def element(self, element: bytearray, last: bool) -> Iterator[bytes]:
+        """Give an element, unless it's empty (which is only allowed in [])."""
+        if element.strip(WHITESPACE):
+            self.count += 1
+            yield bytes(element)
+        elif not last or self.count:
+            raise ValueError("Expecting a value in the batch")
+
+
+def read_chunks(source: Any, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Chunks from a binary file-like object (anything with a read method), or an
+    iterable of bytes.
+    """
+    if hasattr(source, "read"):
+        while chunk := source.read(chunk_size):
+            yield chunk
+    else:
+        yield from source
+
+
+async def read_chunks_async(
+    source: Any, chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Chunks from an object with an async read method (like asyncio.StreamReader), or
+    an async iterable of bytes.
+    """
+    if hasattr(source, "read"):
+        while chunk := await source.read(chunk_size):
+            yield chunk
+    else:
+        async for chunk in source:
+            yield chunk
+
+
+def split(splitter: ArraySplitter, chunks: Iterable[bytes]) -> Iterator[Element]:
+    """The elements from the chunks. A malformed array ends with the ValueError."""
+    try:
+        for chunk in chunks:
+            yield from splitter.feed(chunk)
+        yield from splitter.close()
+    except ValueError as exc:
+        yield exc
+
+
+async def split_async(
+    splitter: ArraySplitter, chunks: AsyncIterable[bytes]
+) -> AsyncIterator[Element]:
+    """The async version of split."""
+    try:
+        async for chunk in chunks:
+            for element in splitter.feed(chunk):
+                yield element
+        for element in splitter.close():
+            yield element
+    except ValueError as exc:
+        yield exc
@@ -1,6 +1,6 @@
 """The public functions.
 
-These three public functions all perform the same function of dispatching a JSON-RPC
+These public functions all perform the same function of dispatching a JSON-RPC
 request, but they each give a different return value.
 
 - dispatch_to_responses: Returns Response(s) (or None for notifications).
@@ -8,37 +8,123 @@ request, but they each give a different return value.
   notifications).
 - dispatch_to_json/dispatch: Returns a JSON-RPC response string (or an empty string for
   notifications).
+- dispatch_to_bytes: Takes the request as bytes (or str, bytearray, memoryview) and
+  returns a JSON-RPC response as bytes (or empty bytes for notifications), using a
+  codec to deserialize and serialize.
+
+And streaming versions, which give the responses of a batch one at a time, as they're
+available, so they can be written out without waiting for the whole batch:
+
+- dispatch_to_response_stream: Yields Responses.
+- dispatch_to_bytes_stream: Yields the JSON-RPC response in pieces of bytes.
+
+For very large batches, dispatch_incremental reads the request from a file-like object
+(or chunks of bytes), dispatching each request in a batch as soon as it's been read,
+without deserializing the whole batch first.
 """
 import json
-from importlib.resources import read_text
-from typing import Any, Callable, Dict, List, Optional, Union, cast
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from itertools import chain
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Union,
+    cast,
+)
 
-from jsonschema.validators import validator_for  # type: ignore
-
-from .dispatcher import Deserialized, dispatch_to_response_pure
+from .codec import Codec, RequestData, default_codec
+from .dispatcher import (
+    Deserialized,
+    dispatch_batch_item,
+    dispatch_to_response_pure,
+    dispatch_to_response_stream_pure,
+)
+from .either import Left
+from .hooks import serialize
+from .incremental import CHUNK_SIZE, ArraySplitter, read_chunks, split
 from .methods import Methods, global_methods
-from .response import Response, to_dict
+from .response import (
+    COMPACT_FRAGMENTS,
+    FRAGMENTS,
+    InvalidRequestResponse,
+    Response,
+    join_bytes,
+    join_bytes_stream,
+    to_bytes,
+    to_dict,
+)
 from .sentinels import NOCONTEXT
 from .utils import identity
+from .validator import validate
+
+if TYPE_CHECKING:
+    from .background import BackgroundQueue
 
 default_deserializer = json.loads
 
-# Prepare the jsonschema validator. This is global so it loads only once, not every
-# time dispatch is called.
-schema = json.loads(read_text(__package__, "request-schema.json"))
-klass = validator_for(schema)
-klass.check_schema(schema)
-default_validator = klass(schema).validate
+
+@lru_cache(maxsize=None)
+def load_jsonschema_validator() -> Callable[[Deserialized], None]:
+    """Load the schema and prepare the jsonschema validator. This is done once, on first
+    use, so importing jsonrpcserver doesn't import jsonschema.
+    """
+    # pylint: disable=import-outside-toplevel
+    from importlib.resources import read_text
+
+    from jsonschema.validators import validator_for  # type: ignore
+
+    schema = json.loads(read_text(__package__, "request-schema.json"))
+    klass = validator_for(schema)
+    klass.check_schema(schema)
+    return cast(Callable[[Deserialized], None], klass(schema).validate)
+
+
+def jsonschema_validator(request: Deserialized) -> None:
+    """Validate the request against the JSON-RPC request schema, with jsonschema. It's
+    no longer the default, but can be passed with validator=jsonschema_validator.
+    """
+    load_jsonschema_validator()(request)
+
+
+# The default validator is a specialized, much faster equivalent of
+# jsonschema_validator.
+default_validator = validate
+
+
+@lru_cache(maxsize=None)
+def get_thread_pool(max_workers: int) -> ThreadPoolExecutor:
+    """A thread pool shared by dispatches with the same max_workers, so one isn't
+    started for every request.
+    """
+    return ThreadPoolExecutor(max_workers, thread_name_prefix="jsonrpcserver")
+
+
+def get_executor(
+    executor: Optional[Executor], max_workers: Optional[int]
+) -> Optional[Executor]:
+    """The executor passed, or if max_workers is passed, a shared thread pool."""
+    if executor is None and max_workers is not None:
+        return get_thread_pool(max_workers)
+    return executor
 
 
 def dispatch_to_response(
-    request: str,
+    request: RequestData,
     methods: Optional[Methods] = None,
     *,
     context: Any = NOCONTEXT,
-    deserializer: Callable[[str], Deserialized] = json.loads,
+    deserializer: Callable[[Any], Deserialized] = json.loads,
     validator: Callable[[Deserialized], Deserialized] = default_validator,
     post_process: Callable[[Response], Any] = identity,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    background: Optional["BackgroundQueue"] = None,
 ) -> Union[Response, List[Response], None]:
     """Takes a JSON-RPC request string and dispatches it to method(s), giving Response
     namedtuple(s) or None.
@@ -54,9 +140,19 @@ def dispatch_to_response(
         context: If given, will be passed as the first argument to methods.
         deserializer: Function that deserializes the request string.
         validator: Function that validates the JSON-RPC request. The function should
-            raise an exception if the request is invalid. To disable validation, pass
-            lambda _: None.
+            raise an exception if the request is invalid. Defaults to a fast built-in
+            validator; to validate against the JSON schema instead, pass
+            jsonschema_validator. To disable validation, pass lambda _: None.
         post_process: Function that will be applied to Responses.
+        executor: If given, the requests in a batch are dispatched concurrently on this
+            executor (e.g. a ThreadPoolExecutor). Useful when methods are I/O-bound.
+            Responses are still given in the order of the requests.
+        max_workers: Dispatch batches on a shared thread pool of this size, instead of
+            passing an executor.
+        background: Run notifications on this BackgroundQueue, rather than waiting for
+            them (see background.py).
+
+    Raises: QueueFull if a notification is rejected by the background queue.
 
     Returns:
         A Response, list of Responses or None.
@@ -65,13 +161,18 @@ def dispatch_to_response(
        >>> dispatch('{"jsonrpc": "2.0", "method": "ping", "id": 1}')
        '{"jsonrpc": "2.0", "result": "pong", "id": 1}'
     """
-    return dispatch_to_response_pure(
-        deserializer=deserializer,
-        validator=validator,
-        post_process=post_process,
-        context=context,
-        methods=global_methods if methods is None else methods,
-        request=request,
+    return cast(
+        Union[Response, List[Response], None],
+        dispatch_to_response_pure(
+            deserializer=deserializer,
+            validator=validator,
+            post_process=post_process,
+            context=context,
+            methods=global_methods if methods is None else methods,
+            request=request,
+            executor=get_executor(executor, max_workers),
+            background=background,
+        ),
     )
 
 
@@ -107,8 +208,167 @@ def dispatch_to_json(
     response = dispatch_to_serializable(*args, **kwargs)
     # Better to respond with the empty string instead of json "null", because "null" is
     # an invalid JSON-RPC response.
-    return "" if response is None else serializer(response)
+    return "" if response is None else serialize(serializer, response)
 
 
 # "dispatch" aliases dispatch_to_json.
 dispatch = dispatch_to_json
+
+
+def dispatch_to_bytes(
+    request: RequestData,
+    *args: Any,
+    codec: Codec = default_codec,
+    **kwargs: Any,
+) -> bytes:
+    """Takes a JSON-RPC request as bytes and dispatches it to method(s), giving a
+    JSON-RPC response as bytes.
+
+    This avoids decoding the request to str and encoding the response from str, when
+    the transport deals in bytes anyway. Responses are written straight to bytes,
+    without building intermediate dicts, and batches are joined as bytes.
+
+    Args:
+        request: The JSON-RPC request, as bytes, bytearray, memoryview or str.
+        codec: The Codec used to deserialize the request and serialize the response.
+        The rest: Passed through to dispatch_to_response.
+    """
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    options: Dict[str, Any] = {
+        "deserializer": codec.loads,
+        "post_process": partial(to_bytes, dumps=codec.dumps, fragments=fragments),
+        **kwargs,
+    }
+    response = dispatch_to_response(request, *args, **options)
+    return serialize(
+        partial(join_bytes, fragments=fragments),
+        cast(Union[bytes, List[bytes], None], response),
+    )
+
+
+def dispatch_to_response_stream(
+    request: RequestData,
+    methods: Optional[Methods] = None,
+    *,
+    context: Any = NOCONTEXT,
+    deserializer: Callable[[Any], Deserialized] = json.loads,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    post_process: Callable[[Response], Any] = identity,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    ordered: bool = True,
+) -> Iterator[Any]:
+    """Like dispatch_to_response, but yields the responses one at a time.
+
+    Without an executor, each request in a batch is dispatched when the previous
+    response has been consumed. With an executor (or max_workers), the batch is
+    dispatched concurrently, and the responses are yielded in the order of the requests,
+    or with ordered=False, in the order they complete.
+
+    Args:
+        ordered: Yield responses in the order of the requests, rather than as they
+            complete.
+        The rest: As for dispatch_to_response.
+    """
+    _, responses = dispatch_to_response_stream_pure(
+        deserializer=deserializer,
+        validator=validator,
+        post_process=post_process,
+        context=context,
+        methods=global_methods if methods is None else methods,
+        request=request,
+        executor=get_executor(executor, max_workers),
+        ordered=ordered,
+    )
+    return responses
+
+
+def dispatch_to_bytes_stream(
+    request: RequestData,
+    methods: Optional[Methods] = None,
+    *,
+    codec: Codec = default_codec,
+    context: Any = NOCONTEXT,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    executor: Optional[Executor] = None,
+    max_workers: Optional[int] = None,
+    ordered: bool = True,
+) -> Iterator[bytes]:
+    """Like dispatch_to_bytes, but yields the response in pieces, so a batch response
+    can be written out as each response is available. Joined, the pieces are the same
+    as the dispatch_to_bytes response (apart from the order, with ordered=False).
+
+    Args:
+        codec: The Codec used to deserialize the request and serialize the response.
+        The rest: As for dispatch_to_response_stream.
+    """
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    is_batch, responses = dispatch_to_response_stream_pure(
+        deserializer=codec.loads,
+        validator=validator,
+        post_process=partial(to_bytes, dumps=codec.dumps, fragments=fragments),
+        context=context,
+        methods=global_methods if methods is None else methods,
+        request=request,
+        executor=get_executor(executor, max_workers),
+        ordered=ordered,
+    )
+    return join_bytes_stream(is_batch, responses, fragments)
+
+
+def dispatch_incremental(
+    source: Any,
+    methods: Optional[Methods] = None,
+    *,
+    codec: Codec = default_codec,
+    context: Any = NOCONTEXT,
+    validator: Callable[[Deserialized], Deserialized] = default_validator,
+    chunk_size: int = CHUNK_SIZE,
+) -> Iterator[bytes]:
+    """Like dispatch_to_bytes_stream, but reads the request incrementally. A batch is
+    split into its requests as it's read, and each is dispatched as soon as it's
+    complete, so memory use is bounded by the largest single request rather than the
+    size of the batch.
+
+    An invalid request in the batch gets its own Parse error or Invalid request
+    response, rather than the whole batch being rejected. If the batch itself is
+    malformed, its last response is a Parse error.
+
+    Args:
+        source: A binary file-like object (anything with a read method), or an
+            iterable of bytes.
+        chunk_size: Bytes to read from a file-like object at a time.
+        The rest: As for dispatch_to_bytes_stream.
+    """
+    methods = global_methods if methods is None else methods
+    splitter = ArraySplitter()
+    elements = split(splitter, read_chunks(source, chunk_size))
+    first = next(elements, None)
+    if not splitter.is_batch:  # The whole request
+        response = dispatch_to_bytes(
+            cast(bytes, first),
+            methods,
+            codec=codec,
+            context=context,
+            validator=validator,
+        )
+        if response:
+            yield response
+        return
+    fragments = COMPACT_FRAGMENTS if codec.compact else FRAGMENTS
+    post_process = partial(to_bytes, dumps=codec.dumps, fragments=fragments)
+    if first is None:  # An empty batch
+        yield post_process(
+            Left(InvalidRequestResponse("The request failed schema validation"))
+        )
+        return
+    dispatch_item = partial(
+        dispatch_batch_item,
+        deserializer=codec.loads,
+        validator=validator,
+        methods=methods,
+        context=context,
+        post_process=post_process,
+    )
+    responses = (dispatch_item(request=element) for element in chain([first], elements))
+    yield from join_bytes_stream(True, filter(None, responses), fragments)
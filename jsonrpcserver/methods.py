@@ -10,20 +10,118 @@ Alternatively pass your own dictionary of methods to `dispatch` with the methods
 
 Methods can take either positional or named arguments, but not both. This is a
 limitation of JSON-RPC.
+
+Options can be given to @method, to be read by the dispatcher. The function is wrapped
+in a RegisteredMethod, which keeps the options (the function itself is left alone), and
+is what @method returns:
+
+    >>> @method(timeout=2.0)  # The async dispatcher cancels the call after 2 seconds
+    ... async def slow():
+    ...     ...
+
+    >>> @method(cache=Cache(ttl=60.0))  # Results are cached for a minute (see cache.py)
+    ... def price(symbol):
+    ...     ...
+
+    >>> @method(rate_limit=RateLimit(10))  # At most 10 calls a second (see rate_limit.py)
+    ... def search(query):
+    ...     ...
+
+    >>> @method(executor="process")  # Run in a worker process (see process_pool.py)
+    ... def digest(data):
+    ...     ...
 """
-from typing import Any, Callable, Dict, Optional, cast
+import importlib
+import inspect
+from functools import reduce, update_wrapper
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple, cast
 
-from .result import Result
+from .cache import Cache
+from .rate_limit import RateLimit
 
-Method = Callable[..., Result]
+# A method returns a Result. With the async dispatcher, a method can also be a coroutine
+# function; plain functions are run in an executor.
+Method = Callable[..., Any]
 Methods = Dict[str, Method]
 
 global_methods = {}
 
 
+class MethodOptions(NamedTuple):
+    """Options for how the dispatcher handles a method.
+
+    timeout: Seconds the async dispatcher allows the method to run, before cancelling
+        it and responding with a Timeout error.
+    cache: Cache results, skipping the call when the same params are requested again.
+    single_flight: With the async dispatcher, concurrent requests with the same params
+        share one call (see single_flight.py).
+    rate_limit: Limit how often the method can be called, in total or per client (see
+        rate_limit.py).
+    executor: "process" to call the method in a worker process, for CPU-bound methods
+        (see process_pool.py).
+    """
+
+    timeout: Optional[float] = None
+    cache: Optional[Cache] = None
+    single_flight: bool = False
+    rate_limit: Optional[RateLimit] = None
+    executor: Optional[str] = None
+
+
+DEFAULT_OPTIONS = MethodOptions()
+
+
+def find(module: str, qualname: str) -> Any:
+    """Find an object by its module and qualified name."""
+    return reduce(getattr, qualname.split("."), importlib.import_module(module))
+
+
+class RegisteredMethod:
+    """A method registered with options. Calling it calls the function.
+
+    Each registration has its own options, so the same function can be registered
+    under two names with different options, and bound methods can have options too.
+    """
+
+    def __init__(self, func: Method, options: MethodOptions):
+        self.func = func
+        self.options = options
+        # Gives the function's name and signature.
+        update_wrapper(self, func)
+
+    def __call__(self, *args: Any, **kwargs: Any) -> Any:
+        return self.func(*args, **kwargs)
+
+    def __get__(self, obj: Any, objtype: Any = None) -> "RegisteredMethod":
+        """Decorating a function in a class body gives a method with the options."""
+        if obj is None:
+            return self
+        return RegisteredMethod(self.func.__get__(obj, objtype), self.options)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        """Sent to a worker process (with executor="process") without its options,
+        which can't always be pickled. A module-level function is found by name, as
+        the name is now this wrapper rather than the function.
+        """
+        if inspect.isfunction(self.func):
+            return (find, (self.func.__module__, self.func.__qualname__))
+        return (RegisteredMethod, (self.func, DEFAULT_OPTIONS))
+
+
+def get_options(func: Method) -> MethodOptions:
+    """The options given to @method for a function (or the defaults)."""
+    return func.options if isinstance(func, RegisteredMethod) else DEFAULT_OPTIONS
+
+
+def unwrap(func: Method) -> Method:
+    """The function, if it's a RegisteredMethod."""
+    return func.func if isinstance(func, RegisteredMethod) else func
+
+
 def method(
     f: Optional[Method] = None,  # pylint: disable=invalid-name
     name: Optional[str] = None,
+    **options: Any,
 ) -> Callable[..., Any]:
     """A decorator to add a function into jsonrpcserver's internal global_methods dict.
     The global_methods dict will be used by default unless a methods argument is passed
@@ -34,10 +132,22 @@ def method(
         @method(name=bar)
         def foo():
             ...
+
+    Any other arguments are MethodOptions. With options, the function is wrapped in a
+    RegisteredMethod, which is registered and returned.
     """
+    method_options = MethodOptions(**options)
+    if method_options.executor not in (None, "process"):
+        raise ValueError(f"Unknown executor {method_options.executor!r}")
 
     def decorator(func: Method) -> Method:
         nonlocal name
+        if method_options.executor and inspect.iscoroutinefunction(unwrap(func)):
+            raise ValueError("A coroutine function can't run in another executor")
+        if method_options.cache is not None:
+            method_options.cache.attach(unwrap(func))
+        if method_options != DEFAULT_OPTIONS:
+            func = RegisteredMethod(unwrap(func), method_options)
         global_methods[name or func.__name__] = func
         return func
 
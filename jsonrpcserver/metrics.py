@@ -0,0 +1,363 @@
+"""Metrics collected by the dispatcher, in Prometheus text format.
+
+    >>> install()  # Start collecting
+    >>> dispatch('{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    >>> registry.get("jsonrpc_calls_total", method="ping")
+    1.0
+    >>> print(render(registry.snapshot()).decode())
+    # HELP jsonrpc_calls_total Requests dispatched to a method.
+    # TYPE jsonrpc_calls_total counter
+    jsonrpc_calls_total{method="ping"} 1.0
+    ...
+
+Metrics are labelled by method only for the methods that were found. Anything else
+(an unknown method, or a request without a valid method) is labelled "unknown", so a
+client can't create new series just by sending made-up method names.
+
+The servers serve them at /metrics (with serve(metrics=True) or the --metrics option).
+
+Metrics are collected with a timing hook (see hooks.py), so cost nothing until
+installed. Each thread counts into its own shard, so its lock is never contended;
+reading the metrics adds up the shards. When a thread finishes, its shard is folded
+into a total kept for finished threads, so a thread-per-request server doesn't
+accumulate shards.
+
+Forked worker processes each have their own registry. To serve the metrics of all the
+workers from any of them, each worker writes a snapshot of its metrics to a shared
+directory, every second or so (see Exporter). Counts from workers that have exited are
+kept, so counters don't go backwards; gauges only include live workers.
+"""
+import json
+import os
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .codes import ERROR_METHOD_NOT_FOUND
+from .hooks import Timing, add_hook, hooks, remove_hook
+
+Labels = Tuple[Tuple[str, str], ...]
+Key = Tuple[str, Labels]
+# A counter or gauge is a float. A histogram is a list of the count in each bucket, then
+# the sum and count of the observations.
+Value = Union[float, List[float]]
+Snapshot = Dict[Key, Value]
+
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Metric(NamedTuple):
+    """A metric's description, for the exposition."""
+
+    kind: str  # counter, gauge or histogram
+    help: str
+    buckets: Tuple[float, ...] = ()
+
+
+METRICS = {
+    "jsonrpc_calls_total": Metric("counter", "Requests dispatched to a method."),
+    "jsonrpc_successes_total": Metric("counter", "Method calls that succeeded."),
+    "jsonrpc_errors_total": Metric("counter", "Error responses, by error code."),
+    "jsonrpc_in_flight": Metric("gauge", "Method calls in progress."),
+    "jsonrpc_call_duration_seconds": Metric(
+        "histogram", "Time taken by method calls.", LATENCY_BUCKETS
+    ),
+    "jsonrpc_batch_size": Metric("histogram", "Requests per batch.", BATCH_BUCKETS),
+    "jsonrpc_request_bytes": Metric("histogram", "Request sizes.", SIZE_BUCKETS),
+    "jsonrpc_response_bytes": Metric("histogram", "Response sizes.", SIZE_BUCKETS),
+}
+
+
+class Histogram(NamedTuple):
+    """A histogram's value. buckets are cumulative counts, keyed by upper bound, and
+    samples is the number of observations.
+    """
+
+    buckets: Dict[float, float]
+    sum: float
+    samples: float
+
+
+class Shard:  # pylint: disable=too-few-public-methods
+    """One thread's metrics. The lock is taken by the thread to update them, and by
+    readers to copy them (so a histogram is never read half-updated).
+    """
+
+    def __init__(self) -> None:
+        self.values: Snapshot = {}
+        self.lock = threading.Lock()
+
+    def copy(self) -> Snapshot:
+        """A copy of the metrics."""
+        with self.lock:
+            return merge([self.values])
+
+
+class ThreadToken:  # pylint: disable=too-few-public-methods
+    """Kept in a thread-local, so it's dropped when the thread finishes."""
+
+
+class Registry:
+    """Counters, gauges and histograms, sharded by thread."""
+
+    def __init__(self) -> None:
+        self.local = threading.local()
+        self.shards: Dict[int, Shard] = {}  # The live threads' shards, by id
+        self.finished: Snapshot = {}  # The total of the finished threads' shards
+        self.lock = threading.Lock()  # For adding and removing shards
+
+    def shard(self) -> Shard:
+        """This thread's shard."""
+        try:
+            return self.local.shard  # type: ignore
+        except AttributeError:
+            shard = Shard()
+            with self.lock:
+                self.shards[id(shard)] = shard
+            self.local.shard = shard
+            self.local.token = token = ThreadToken()
+            weakref.finalize(token, self.fold, id(shard))
+            return shard
+
+    def fold(self, shard_id: int) -> None:
+        """Fold a finished thread's shard into the total."""
+        with self.lock:
+            shard = self.shards.pop(shard_id)
+            self.finished = merge([self.finished, shard.values])
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0) -> None:
+        """Add to a counter or gauge."""
+        shard = self.shard()
+        key = (name, labels)
+        with shard.lock:
+            shard.values[key] = shard.values.get(key, 0.0) + value  # type: ignore
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        """Add an observation to a histogram."""
+        shard = self.shard()
+        buckets = METRICS[name].buckets
+        with shard.lock:
+            counts = shard.values.get((name, labels))
+            if counts is None:
+                counts = shard.values[(name, labels)] = [0.0] * (len(buckets) + 2)
+            assert isinstance(counts, list)
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self) -> Snapshot:
+        """All the metrics, adding up the shards."""
+        # Taken together, so a shard folded in meanwhile isn't counted twice.
+        with self.lock:
+            shards = list(self.shards.values())
+            finished = self.finished
+        return merge([finished, *(shard.copy() for shard in shards)])
+
+    def get(self, name: str, **labels: str) -> Union[float, Histogram, None]:
+        """A metric's value, or None if it hasn't been recorded."""
+        value = self.snapshot().get((name, tuple(sorted(labels.items()))))
+        if isinstance(value, list):
+            return to_histogram(METRICS[name].buckets, value)
+        return value
+
+    def clear(self) -> None:
+        """Reset all the metrics."""
+        with self.lock:
+            self.finished = {}
+            for shard in self.shards.values():
+                with shard.lock:
+                    shard.values.clear()
+
+
+def merge(snapshots: Any) -> Snapshot:
+    """Add up snapshots (from shards, or processes)."""
+    merged: Snapshot = {}
+    for snapshot in snapshots:
+        for key, value in snapshot.items():
+            total = merged.get(key)
+            if total is None:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(total, list):
+                merged[key] = [a + b for a, b in zip(total, value)]
+            else:
+                merged[key] = total + value
+    return merged
+
+
+def to_histogram(buckets: Tuple[float, ...], counts: List[float]) -> Histogram:
+    """A histogram from its value in a snapshot."""
+    cumulative: Dict[float, float] = {}
+    running = 0.0
+    for bound, count in zip(buckets, counts):
+        running += count
+        cumulative[bound] = running
+    cumulative[float("inf")] = counts[-1]
+    return Histogram(cumulative, counts[-2], counts[-1])
+
+
+registry = Registry()
+
+
+# The method label for anything but a method that was found.
+UNKNOWN_METHOD = "unknown"
+
+# The stages that are only reached once the method has been found.
+FOUND_STAGES = frozenset(("bind", "call", "cancelled"))
+
+
+def method_label(timing: Timing) -> str:
+    """The method label: the method's name, if it was found."""
+    found = timing.stage in FOUND_STAGES or (
+        timing.stage == "lookup" and timing.error != ERROR_METHOD_NOT_FOUND
+    )
+    return (timing.method or UNKNOWN_METHOD) if found else UNKNOWN_METHOD
+
+
+def collect(timing: Timing) -> None:
+    """The hook that records metrics from the dispatcher's timings."""
+    labels: Labels = (("method", method_label(timing)),)
+    if timing.error is not None:
+        # Labels are kept sorted by name, so they can be looked up by Registry.get.
+        registry.inc("jsonrpc_errors_total", (("code", str(timing.error)), *labels))
+    stage = timing.stage
+    if stage == "lookup":
+        registry.inc("jsonrpc_calls_total", labels)
+    elif stage == "bind" and timing.error is None:
+        registry.inc("jsonrpc_in_flight", labels)
+    elif stage in ("call", "cancelled"):
+        registry.inc("jsonrpc_in_flight", labels, -1.0)
+        registry.observe("jsonrpc_call_duration_seconds", labels, timing.seconds)
+        if stage == "call" and timing.error is None:
+            registry.inc("jsonrpc_successes_total", labels)
+    elif stage == "deserialize":
+        if timing.size is not None:
+            registry.observe("jsonrpc_request_bytes", (), timing.size)
+        if timing.batch_size is not None:
+            registry.observe("jsonrpc_batch_size", (), timing.batch_size)
+    elif stage == "serialize" and timing.size is not None:
+        registry.observe("jsonrpc_response_bytes", (), timing.size)
+
+
+def install() -> None:
+    """Start collecting metrics."""
+    if collect not in hooks:
+        add_hook(collect)
+
+
+def uninstall() -> None:
+    """Stop collecting metrics."""
+    if collect in hooks:
+        remove_hook(collect)
+
+
+def escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: Labels) -> str:
+    """Labels as {name="value",...}."""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def render(snapshot: Snapshot) -> bytes:
+    """The metrics in Prometheus text format (version 0.0.4)."""
+    lines: List[str] = []
+    for name, metric in METRICS.items():
+        keys = sorted(key for key in snapshot if key[0] == name)
+        if not keys:
+            continue
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for _, labels in keys:
+            value = snapshot[(name, labels)]
+            if not isinstance(value, list):
+                lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+            histogram = to_histogram(metric.buckets, value)
+            for bound, count in histogram.buckets.items():
+                bound_label = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = format_labels(labels + (("le", bound_label),))
+                lines.append(f"{name}_bucket{bucket_labels} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{name}_count{format_labels(labels)} {histogram.samples}")
+    return ("\n".join(lines) + "\n").encode() if lines else b""
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def is_alive(pid: int) -> bool:
+    """Whether a process is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Exporter:
+    """Gives the metrics in Prometheus text format.
+
+    With a directory, shared by forked workers, the metrics of all the workers are
+    given: each worker writes a snapshot of its metrics there (call flush regularly),
+    and they're added up.
+    """
+
+    def __init__(self, directory: Optional[str] = None, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self.flushed = 0.0
+
+    def flush(self, force: bool = False) -> None:
+        """Write this process's snapshot, if it's been interval seconds since the last
+        time (or force).
+        """
+        now = time.monotonic()
+        if self.directory is None or (not force and now - self.flushed < self.interval):
+            return
+        self.flushed = now
+        snapshot = [
+            [name, labels, value]
+            for (name, labels), value in registry.snapshot().items()
+        ]
+        path = Path(self.directory, f"{os.getpid()}.json")
+        temp = path.with_suffix(".tmp")
+        temp.write_text(json.dumps(snapshot), encoding="utf-8")
+        os.replace(temp, path)  # So a partial snapshot is never read
+
+    def collect(self) -> Snapshot:
+        """The metrics of this process, or all the workers."""
+        if self.directory is None:
+            return registry.snapshot()
+        self.flush(force=True)
+        snapshots = []
+        for path in Path(self.directory).glob("*.json"):
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue  # Being replaced
+            alive = is_alive(int(path.stem))
+            snapshots.append(
+                {
+                    (name, tuple(map(tuple, labels))): value
+                    for name, labels, value in data
+                    if alive or METRICS[name].kind != "gauge"
+                }
+            )
+        return merge(snapshots)
+
+    def render(self) -> bytes:
+        """The metrics in Prometheus text format."""
+        return render(self.collect())
@@ -0,0 +1,205 @@
+"""Prefork - run a server in several worker processes, to use every core on a host.
+
+The parent process (which has already imported the methods) forks the workers and
+supervises them, restarting any that die - after a delay, doubling each time the
+worker dies again, so a worker that can't start doesn't spin. Each worker binds its
+own listening socket to the same port with SO_REUSEPORT, and the kernel balances
+connections between them.
+
+Before forking, gc.freeze() moves everything imported so far into a permanent
+generation, so the garbage collector doesn't touch (and copy) those pages in the
+workers.
+"""
+import gc
+import logging
+import os
+import select
+import signal
+import socket
+import time
+from types import FrameType
+from typing import Callable, Dict, Optional
+
+SIGNALS = {signal.SIGINT, signal.SIGTERM}
+
+logger = logging.getLogger(__name__)
+
+# Pause before restarting a worker that failed, so a worker that can't start doesn't
+# spin. The pause doubles each time the worker fails again, up to MAX_RESTART_DELAY,
+# and is reset once a worker has run for MAX_RESTART_DELAY.
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+
+
+def pin_to_cpu(index: int) -> None:
+    """Pin the current process to one of the CPUs available to it."""
+    try:
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[index % len(cpus)]})
+    except (AttributeError, OSError) as exc:  # Not supported on this platform
+        logger.warning("Unable to pin worker %s to a CPU: %s", index, exc)
+
+
+def run_worker(target: Callable[[int], None], index: int, pin_cpus: bool) -> None:
+    """Run in the forked child. Never returns."""
+    exit_code = 0
+    try:
+        # Don't inherit the parent's signal handlers.
+        signal.set_wakeup_fd(-1)
+        for signum in (*SIGNALS, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+        if pin_cpus:
+            pin_to_cpu(index)
+        target(index)
+    except BaseException:  # pylint: disable=broad-except
+        logger.exception("Worker %s failed", index)
+        exit_code = 1
+    finally:
+        # Skip the parent's atexit handlers and buffers.
+        os._exit(exit_code)  # pylint: disable=protected-access
+
+
+def restart_delay(failures: int) -> float:
+    """Seconds to wait before restarting a worker that's failed this many times in a
+    row.
+    """
+    return float(min(RESTART_DELAY * 2 ** (failures - 1), MAX_RESTART_DELAY))
+
+
+def drain(pipe: int) -> None:
+    """Read everything written to a non-blocking pipe."""
+    try:
+        while os.read(pipe, 512):
+            pass
+    except BlockingIOError:
+        pass
+
+
+class Supervisor:
+    """Forks the workers, and restarts them as they exit, until stopped."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(self, target: Callable[[int], None], pin_cpus: bool):
+        self.target = target
+        self.pin_cpus = pin_cpus
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.started: Dict[int, float] = {}  # worker index -> when it was started
+        self.failures: Dict[int, int] = {}  # worker index -> failures in a row
+        self.restarts: Dict[int, float] = {}  # worker index -> when to restart it
+        self.stopping = False
+        # Signals are written here (by signal.set_wakeup_fd), so the supervisor can
+        # wait for a signal or the next restart, whichever comes first.
+        self.wake_read, self.wake_write = os.pipe()
+        for pipe in (self.wake_read, self.wake_write):
+            os.set_blocking(pipe, False)
+
+    def spawn(self, index: int) -> None:
+        """Fork a worker."""
+        # Block the stop signals until the worker is recorded, so it can't be missed.
+        signal.pthread_sigmask(signal.SIG_BLOCK, SIGNALS)
+        try:
+            if self.stopping:
+                return
+            pid = os.fork()
+            if pid == 0:
+                run_worker(self.target, index, self.pin_cpus)
+            self.children[pid] = index
+            self.started[index] = time.monotonic()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, SIGNALS)
+
+    def stop(self, signum: int, _: Optional[FrameType]) -> None:
+        """The stop signal handler. Passes the signal on to the workers."""
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM if signum == signal.SIGINT else signum)
+            except ProcessLookupError:
+                pass
+
+    def reap(self) -> None:
+        """Collect the workers that have exited, and schedule their restarts."""
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:  # Not a worker, or not to be restarted
+                continue
+            now = time.monotonic()
+            if status == 0 or now - self.started[index] >= MAX_RESTART_DELAY:
+                self.failures.pop(index, None)
+            if status == 0:
+                self.restarts[index] = now
+                continue
+            failures = self.failures[index] = self.failures.get(index, 0) + 1
+            delay = restart_delay(failures)
+            logger.warning(
+                "Worker %s (pid %s) died, restarting in %ss", index, pid, delay
+            )
+            self.restarts[index] = now + delay
+
+    def restart_due(self) -> None:
+        """Restart the workers whose restart delay is up."""
+        if self.stopping:
+            self.restarts.clear()
+        now = time.monotonic()
+        for index, when in sorted(self.restarts.items()):
+            if when <= now:
+                del self.restarts[index]
+                self.spawn(index)
+
+    def run(self, workers: int) -> None:
+        """Fork the workers, and keep them running until stopped."""
+        for index in range(workers):
+            self.spawn(index)
+        while True:
+            self.reap()
+            self.restart_due()
+            if not self.children and not self.restarts:
+                return
+            # Wait for a signal (a worker exiting, or a stop signal), or the next
+            # restart.
+            timeout = None
+            if self.restarts:
+                timeout = max(min(self.restarts.values()) - time.monotonic(), 0)
+            select.select([self.wake_read], [], [], timeout)
+            drain(self.wake_read)
+
+
+def prefork(
+    target: Callable[[int], None], workers: int, *, pin_cpus: bool = False
+) -> None:
+    """Fork worker processes, each calling target with its worker index, and keep
+    them running until SIGINT or SIGTERM.
+
+    A worker that exits (for example after serving its maximum number of requests) is
+    replaced straight away; one that dies is replaced after a delay, which grows if it
+    keeps dying. When the parent receives SIGINT or SIGTERM, the workers are sent
+    SIGTERM, and the parent returns once they've all exited - without waiting out any
+    restart delay.
+
+    Args:
+        target: Runs the server in a worker. Takes the worker index.
+        workers: The number of worker processes.
+        pin_cpus: Pin each worker to a CPU.
+    """
+    if not hasattr(socket, "SO_REUSEPORT"):
+        raise RuntimeError("Prefork needs SO_REUSEPORT, which this platform lacks")
+    supervisor = Supervisor(target, pin_cpus)
+    gc.freeze()
+    wakeup_fd = signal.set_wakeup_fd(supervisor.wake_write)
+    handlers = {signum: signal.signal(signum, supervisor.stop) for signum in SIGNALS}
+    # A handler is needed for SIGCHLD to wake the supervisor.
+    handlers[signal.SIGCHLD] = signal.signal(signal.SIGCHLD, lambda *_: None)
+    try:
+        supervisor.run(workers)
+    finally:
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        signal.set_wakeup_fd(wakeup_fd)
+        os.close(supervisor.wake_read)
+        os.close(supervisor.wake_write)
+        gc.unfreeze()
@@ -0,0 +1,99 @@
+"""Running CPU-bound methods in worker processes.
+
+A method doing CPU-bound work (hashing, compression, numeric work) holds the GIL while
+it runs, stalling the rest of the server. Run it in a worker process instead:
+
+    >>> @method(executor="process")
+    ... def digest(data):
+    ...     return Success(hashlib.sha256(data.encode()).hexdigest())
+
+This works with both the sync and async dispatchers. The pool of workers is started on
+first use, with os.cpu_count() workers, or configure it first:
+
+    >>> process_pool.configure(max_workers=4)
+
+Only the method and its arguments are sent to a worker, and only the result comes back,
+all pickled. So the method must be a module-level function (workers find it by name),
+and its arguments, including the context if one's passed, must be picklable.
+
+If a worker dies (killed by the OOM killer, or a crash in an extension), the call gets
+an Internal error, and the pool is replaced for the next call. With the async
+dispatcher, a call that times out is cancelled if it hasn't started yet; one that's
+running can't be stopped, but isn't waited for.
+"""
+import threading
+from concurrent.futures import Executor, Future
+from typing import Any, Dict, List, Optional
+
+# The multiprocessing modules are only imported when a pool is started, so importing
+# jsonrpcserver stays quick.
+
+lock = threading.Lock()
+pool_size: Optional[int] = None
+pool_context: Any = None
+pool: Optional[Executor] = None
+
+
+def configure(max_workers: Optional[int] = None, mp_context: Any = None) -> None:
+    """Set the number of worker processes (default: os.cpu_count()), and optionally
+    the multiprocessing context to start them with. A running pool is shut down
+    (waiting for its calls), and a new one started on the next call.
+    """
+    global pool_size, pool_context  # pylint: disable=global-statement
+    with lock:
+        pool_size, pool_context = max_workers, mp_context
+    shutdown()
+
+
+def get_pool() -> Executor:
+    """The pool, started if it isn't running."""
+    # pylint: disable=global-statement,import-outside-toplevel
+    global pool
+    with lock:
+        if pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(pool_size, pool_context)
+        return pool
+
+
+def discard(executor: Executor) -> None:
+    """Stop using a broken pool, so the next call starts a new one."""
+    global pool  # pylint: disable=global-statement
+    with lock:
+        if pool is executor:
+            pool = None
+    executor.shutdown(wait=False)
+
+
+def shutdown(wait: bool = True) -> None:
+    """Shut down the pool, if it's running."""
+    global pool  # pylint: disable=global-statement
+    with lock:
+        executor, pool = pool, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def submit(method: Any, args: List[Any], kwargs: Dict[str, Any]) -> "Future[Any]":
+    """Call the method in a worker process.
+
+    Returns: A future of the method's return value. If the worker died, the future
+        raises BrokenProcessPool.
+    """
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures.process import BrokenProcessPool
+
+    executor = get_pool()
+
+    def discard_if_broken(future: "Future[Any]") -> None:
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            discard(executor)
+
+    try:
+        future = executor.submit(method, *args, **kwargs)
+    except BrokenProcessPool:
+        discard(executor)
+        raise
+    future.add_done_callback(discard_if_broken)
+    return future
@@ -0,0 +1,79 @@
+"""Rate limiting methods, with token buckets.
+
+    >>> @method(rate_limit=RateLimit(10, burst=20))  # 10 calls a second, in total
+    ... def search(query):
+    ...     ...
+
+    >>> @method(rate_limit=RateLimit(1, key=lambda context: context.user))  # Per user
+    ... def send_email(context, to):
+    ...     ...
+
+A rate limit is checked after the method is found, before the arguments are bound or
+the method is called. A request over the limit gets a "Rate limit exceeded" error
+(code -32002).
+
+With a key function, each client (identified by the key the function gives for the
+dispatch's context) has its own bucket. Only the max_clients most recently seen clients
+are remembered, so memory stays bounded with many clients. A forgotten client starts
+again with a full bucket.
+If the key function raises (say the context is missing), that request gets an
+Internal error; the rest of a batch is unaffected.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional
+
+from .either import Left
+from .result import RateLimitedResult
+
+# The same error for every rejected request, so rejecting costs no allocation.
+RATE_LIMITED = Left(RateLimitedResult())
+
+
+class RateLimit:  # pylint: disable=too-few-public-methods
+    """A token bucket per client: each call takes a token, and tokens are added at
+    rate per second, up to burst.
+
+    Args:
+        rate: Calls allowed per second, on average.
+        burst: Calls allowed at once, after being idle (default: rate, or at least 1).
+        key: Gives the client key from the context. Without it, all clients share one
+            bucket.
+        max_clients: The most client buckets to keep.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: Optional[float] = None,
+        key: Optional[Callable[[Any], Hashable]] = None,
+        max_clients: int = 10_000,
+    ):
+        self.rate = rate
+        self.burst = max(rate, 1.0) if burst is None else burst
+        self.key = key
+        self.max_clients = max_clients
+        # Each bucket is [tokens, last updated]. Kept in order of use, to evict the
+        # least recently used.
+        self.buckets: "OrderedDict[Hashable, List[float]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, context: Any) -> bool:
+        """Take a token for the client, if there is one."""
+        client = None if self.key is None else self.key(context)
+        now = time.monotonic()
+        with self.lock:
+            bucket = self.buckets.get(client)
+            if bucket is None:
+                bucket = self.buckets[client] = [self.burst, now]
+                if len(self.buckets) > self.max_clients:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                return False
+            bucket[0] -= 1
+            return True
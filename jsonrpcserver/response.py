@@ -2,9 +2,19 @@
 
 https://www.jsonrpc.org/specification#response_object
 """
-from typing import Any, Dict, List, NamedTuple, Type, Union
-
-from oslash.either import Either, Left  # type: ignore
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Type,
+    Union,
+)
 
 from .codes import (
     ERROR_INVALID_REQUEST,
@@ -12,6 +22,7 @@ from .codes import (
     ERROR_PARSE_ERROR,
     ERROR_SERVER_ERROR,
 )
+from .either import Either, Left
 from .sentinels import NODATA
 
 Deserialized = Union[Dict[str, Any], List[Dict[str, Any]]]
@@ -75,16 +86,11 @@ def ServerErrorResponse(data: Any, id: Any) -> ErrorResponse:
 
 def to_error_dict(response: ErrorResponse) -> Dict[str, Any]:
     """From ErrorResponse object to dict"""
-    return {
-        "jsonrpc": "2.0",
-        "error": {
-            "code": response.code,
-            "message": response.message,
-            # "data" may be omitted.
-            **({"data": response.data} if response.data is not NODATA else {}),
-        },
-        "id": response.id,
-    }
+    error = {"code": response.code, "message": response.message}
+    # "data" may be omitted.
+    if response.data is not NODATA:
+        error["data"] = response.data
+    return {"jsonrpc": "2.0", "error": error, "id": response.id}
 
 
 def to_success_dict(response: SuccessResponse) -> Dict[str, Any]:
@@ -92,18 +98,16 @@ def to_success_dict(response: SuccessResponse) -> Dict[str, Any]:
     return {"jsonrpc": "2.0", "result": response.result, "id": response.id}
 
 
-def to_dict(response: ResponseType) -> Dict[str, Any]:
+def to_dict(response: Response) -> Dict[str, Any]:
     """Serialize either an error or success response object to dict"""
     # pylint: disable=protected-access
-    return (
-        to_error_dict(response._error)
-        if isinstance(response, Left)
-        else to_success_dict(response._value)
-    )
+    if isinstance(response, Left):
+        return to_error_dict(response._error)
+    return to_success_dict(response._value)
 
 
 def to_serializable(
-    response: Union[ResponseType, List[ResponseType], None]
+    response: Union[Response, List[Response], None]
 ) -> Union[Deserialized, None]:
     """Serialize a response object (or list of them), to a dict, or list of them."""
     if response is None:
@@ -111,3 +115,122 @@ def to_serializable(
     if isinstance(response, List):
         return [to_dict(r) for r in response]
     return to_dict(response)
+
+
+class Fragments(NamedTuple):
+    """The constant parts of a serialized response, so they don't need to be built and
+    serialized for every response.
+    """
+
+    success: bytes
+    error: bytes
+    id: bytes
+    end: bytes
+    separator: bytes
+
+
+# Matches the output of json.dumps with default separators.
+FRAGMENTS = Fragments(
+    b'{"jsonrpc": "2.0", "result": ',
+    b'{"jsonrpc": "2.0", "error": ',
+    b', "id": ',
+    b"}",
+    b", ",
+)
+COMPACT_FRAGMENTS = Fragments(
+    b'{"jsonrpc":"2.0","result":', b'{"jsonrpc":"2.0","error":', b',"id":', b"}", b","
+)
+
+
+def id_to_bytes(id: Any, dumps: Callable[[Any], bytes]) -> bytes:
+    """Serialize a response id. Integer ids are by far the most common."""
+    # pylint: disable=invalid-name,redefined-builtin,unidiomatic-typecheck
+    if type(id) is int:
+        return b"%d" % id
+    return b"null" if id is None else dumps(id)
+
+
+def to_bytes(
+    response: Response,
+    dumps: Callable[[Any], bytes],
+    fragments: Fragments = FRAGMENTS,
+) -> bytes:
+    """Serialize either an error or success response object straight to bytes, without
+    building an intermediate dict. Only the result (or error) and id are serialized with
+    dumps; the rest of the envelope is pre-built.
+    """
+    # pylint: disable=protected-access
+    if isinstance(response, Left):
+        error = response._error
+        error_dict = {"code": error.code, "message": error.message}
+        # "data" may be omitted.
+        if error.data is not NODATA:
+            error_dict["data"] = error.data
+        return b"".join(
+            (
+                fragments.error,
+                dumps(error_dict),
+                fragments.id,
+                id_to_bytes(error.id, dumps),
+                fragments.end,
+            )
+        )
+    success = response._value
+    return b"".join(
+        (
+            fragments.success,
+            dumps(success.result),
+            fragments.id,
+            id_to_bytes(success.id, dumps),
+            fragments.end,
+        )
+    )
+
+
+def join_bytes(
+    response: Union[bytes, List[bytes], None], fragments: Fragments = FRAGMENTS
+) -> bytes:
+    """Join a batch of serialized responses into a JSON array. A single response is
+    returned as is, and None (no response) gives empty bytes.
+    """
+    if response is None:
+        return b""
+    if isinstance(response, list):
+        return b"[" + fragments.separator.join(response) + b"]"
+    return response
+
+
+def join_bytes_stream(
+    is_batch: bool, responses: Iterable[bytes], fragments: Fragments = FRAGMENTS
+) -> Iterator[bytes]:
+    """The streaming version of join_bytes. Gives the JSON array of a batch in pieces,
+    each one as soon as its response is available.
+
+    A batch with no responses (only notifications) gives nothing, as does a single
+    notification.
+    """
+    if not is_batch:
+        yield from responses
+        return
+    prefix = b"["
+    for response in responses:
+        yield prefix + response
+        prefix = fragments.separator
+    if prefix != b"[":
+        yield b"]"
+
+
+async def join_bytes_stream_async(
+    is_batch: bool, responses: AsyncIterable[bytes], fragments: Fragments = FRAGMENTS
+) -> AsyncIterator[bytes]:
+    """join_bytes_stream, for responses from an async iterator."""
+    if not is_batch:
+        async for response in responses:
+            yield response
+        return
+    prefix = b"["
+    async for response in responses:
+        yield prefix + response
+        prefix = fragments.separator
+    if prefix != b"[":
+        yield b"]"
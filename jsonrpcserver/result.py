@@ -8,9 +8,14 @@ The public functions are Success, Error and InvalidParams.
 """
 from typing import Any, NamedTuple
 
-from oslash.either import Either, Left, Right  # type: ignore
-
-from .codes import ERROR_INTERNAL_ERROR, ERROR_INVALID_PARAMS, ERROR_METHOD_NOT_FOUND
+from .codes import (
+    ERROR_INTERNAL_ERROR,
+    ERROR_INVALID_PARAMS,
+    ERROR_METHOD_NOT_FOUND,
+    ERROR_RATE_LIMITED,
+    ERROR_TIMEOUT,
+)
+from .either import Either, Left, Right
 from .sentinels import NODATA
 
 # pylint: disable=missing-class-docstring,missing-function-docstring,invalid-name
@@ -51,6 +56,14 @@ def InvalidParamsResult(data: Any = NODATA) -> ErrorResult:
     return ErrorResult(ERROR_INVALID_PARAMS, "Invalid params", data)
 
 
+def TimeoutResult(data: Any = NODATA) -> ErrorResult:
+    return ErrorResult(ERROR_TIMEOUT, "Timeout", data)
+
+
+def RateLimitedResult(data: Any = NODATA) -> ErrorResult:
+    return ErrorResult(ERROR_RATE_LIMITED, "Rate limit exceeded", data)
+
+
 # Helpers (the public functions)
 
 
@@ -1,10 +1,20 @@
 """A simple development server for serving JSON-RPC requests using Python's builtin
 http.server module.
+
+With serve(metrics=True), metrics are collected and served at /metrics (see
+metrics.py).
 """
 import logging
+import shutil
+import signal
+import socket
+import tempfile
 from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, List, Optional, cast
 
-from .main import dispatch
+from .main import dispatch_to_bytes
+from .metrics import CONTENT_TYPE, Exporter, install, uninstall
+from .prefork import prefork
 
 
 class RequestHandler(BaseHTTPRequestHandler):
@@ -12,17 +22,117 @@ class RequestHandler(BaseHTTPRequestHandler):
 
     def do_POST(self) -> None:  # pylint: disable=invalid-name
         """Handle POST request"""
-        response = dispatch(
-            self.rfile.read(int(str(self.headers["Content-Length"]))).decode()
+        response = dispatch_to_bytes(
+            self.rfile.read(int(str(self.headers["Content-Length"])))
         )
-        if response is not None:
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            self.wfile.write(str(response).encode())
+        self.send_response(200)
+        self.send_header("Content-type", "application/json")
+        self.end_headers()
+        self.wfile.write(response)
+
+    def do_GET(self) -> None:  # pylint: disable=invalid-name
+        """Handle GET request, for the metrics"""
+        exporter = cast(JsonRpcHTTPServer, self.server).exporter
+        if self.path != "/metrics" or exporter is None:
+            self.send_error(404)
+            return
+        body = exporter.render()
+        self.send_response(200)
+        self.send_header("Content-type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class JsonRpcHTTPServer(HTTPServer):
+    """An HTTPServer, with an Exporter if metrics are served."""
+
+    exporter: Optional[Exporter] = None
+
+
+class WorkerHTTPServer(JsonRpcHTTPServer):
+    """An HTTPServer for a prefork worker. Shares its port with the other workers, and
+    counts the requests it has handled.
+    """
+
+    requests = 0
+
+    def server_bind(self) -> None:
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def finish_request(self, request: Any, client_address: Any) -> None:
+        super().finish_request(request, client_address)
+        self.requests += 1
+
+
+def serve_worker(
+    name: str,
+    port: int,
+    max_requests: Optional[int] = None,
+    metrics_dir: Optional[str] = None,
+) -> None:
+    """Serve in a prefork worker, until max_requests have been handled or SIGINT/SIGTERM
+    is received. The request being handled is finished first.
+
+    With metrics_dir, the worker's metrics are written there regularly, so any worker
+    can serve the metrics of them all.
+    """
+    stopping: List[bool] = []
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.append(True))
+    server = WorkerHTTPServer((name, port), RequestHandler)
+    server.timeout = 0.5  # Check for stop signals this often
+    if metrics_dir is not None:
+        server.exporter = Exporter(metrics_dir)
+    try:
+        while not stopping and (max_requests is None or server.requests < max_requests):
+            server.handle_request()
+            if server.exporter is not None:
+                server.exporter.flush()
+    finally:
+        if server.exporter is not None:
+            server.exporter.flush(force=True)
+        server.server_close()
+
 
+def serve(
+    name: str = "",
+    port: int = 5000,
+    *,
+    workers: int = 1,
+    max_requests: Optional[int] = None,
+    pin_cpus: bool = False,
+    metrics: bool = False,
+) -> None:
+    """A simple function to serve HTTP requests
 
-def serve(name: str = "", port: int = 5000) -> None:
-    """A simple function to serve HTTP requests"""
+    Args:
+        workers: Serve from this many forked processes, sharing the port.
+        max_requests: Replace a worker after it handles this many requests.
+        pin_cpus: Pin each worker to a CPU.
+        metrics: Collect metrics, and serve them at /metrics.
+    """
     logging.info(" * Listening on port %s", port)
-    HTTPServer((name, port), RequestHandler).serve_forever()
+    if metrics:
+        install()
+    metrics_dir: Optional[str] = None
+    try:
+        if workers > 1 or max_requests is not None or pin_cpus:
+            if metrics:
+                metrics_dir = tempfile.mkdtemp(prefix="jsonrpcserver-")
+            prefork(
+                lambda _: serve_worker(name, port, max_requests, metrics_dir),
+                workers,
+                pin_cpus=pin_cpus,
+            )
+        else:
+            server = JsonRpcHTTPServer((name, port), RequestHandler)
+            if metrics:
+                server.exporter = Exporter()
+            server.serve_forever()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+        if metrics:
+            uninstall()
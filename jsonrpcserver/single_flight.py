@@ -0,0 +1,66 @@
+"""Coalescing identical calls that are in flight at the same time.
+
+    >>> @method(single_flight=True)
+    ... async def report(day):
+    ...     ...
+
+With the async dispatcher, concurrent requests to the method with the same params share
+one call: the first starts it, and the others wait for its result. Each still gets its
+own response, with its own id. Like a cache (see cache.py), calls are keyed by their
+params, ignoring the context, so it's for methods whose result depends only on the
+params.
+
+The shared call runs without any caller's deadline (the method's own timeout still
+applies). Each caller waits for it until its own deadline; a caller that times out, or
+is cancelled (its client went away), just stops waiting, and the call carries on for
+the others. The call is only cancelled once all its callers have given up.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# The calls in flight, with the number of callers waiting on each.
+flights: Dict[Hashable, Tuple["asyncio.Future[Any]", int]] = {}
+
+
+def forget(key: Hashable, task: "asyncio.Future[Any]") -> None:
+    """Remove a completed call, unless it's already been replaced."""
+    if key in flights and flights[key][0] is task:
+        del flights[key]
+
+
+async def coalesce(
+    key: Hashable,
+    start: Callable[[], Awaitable[Any]],
+    timeout: Optional[float] = None,
+) -> Any:
+    """Await the call in flight with this key, or start one.
+
+    Args:
+        key: Identifies the call (e.g. the method and its params).
+        start: Starts the call, if there isn't one in flight.
+        timeout: Seconds this caller waits for the call.
+
+    Raises: asyncio.TimeoutError if the call doesn't complete within timeout.
+    """
+    key = (asyncio.get_running_loop(), key)
+    task, waiters = flights.get(key, (None, 0))
+    if task is None:
+        task = asyncio.ensure_future(start())
+        task.add_done_callback(lambda done: forget(key, done))
+    flights[key] = (task, waiters + 1)
+    try:
+        # Unlike wait_for, wait doesn't cancel the call when this caller gives up.
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+        if not done:
+            raise asyncio.TimeoutError
+        return task.result()
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # Cancel the call if no one else is waiting on it. It's forgotten straight away,
+        # so a new caller starts a new call rather than waiting on a cancelled one.
+        if key in flights and flights[key] == (task, 1):
+            task.cancel()
+            del flights[key]
+        raise
+    finally:
+        if key in flights and flights[key][0] is task:
+            flights[key] = (task, flights[key][1] - 1)
@@ -0,0 +1,356 @@
+"""A low-overhead JSON-RPC transport over TCP or Unix domain sockets, without HTTP.
+
+For service-to-service calls (especially on the same host), each message is just a
+JSON-RPC request or response, framed one of two ways:
+
+- "length": A 4-byte big-endian length, then that many bytes of JSON (the default).
+- "newline": One JSON document per line, as in JSON Lines.
+
+    >>> asyncio.run(serve(port=6000))  # TCP
+    >>> asyncio.run(serve(path="/run/myservice.sock"))  # Unix domain socket
+    >>> asyncio.run(serve(port=6000, framing="newline"))
+
+Requests are dispatched as soon as they're read, with the async dispatcher, so a
+client can pipeline many requests on one connection, and they run concurrently.
+Responses are sent as they complete - possibly out of order, so clients match
+responses to requests by id. Responses that are ready at the same time are written
+together, in one write to the socket.
+
+Requests are dispatched as bytes, and responses serialized to bytes, so they're never
+decoded to str here (use an orjson codec to avoid it entirely). Notifications get no
+response.
+
+Backpressure: a connection has at most max_pipeline requests in flight. Once it has
+that many, no more are read from the socket, until responses have been written - and
+writing waits for the client to read.
+"""
+import asyncio
+import logging
+import os
+import struct
+from typing import Any, Dict, List, Optional, Set
+
+from .async_main import dispatch_to_bytes
+from .codec import Codec, default_codec
+from .exceptions import QueueFull
+from .methods import Methods, global_methods
+from .transport import (
+    read_unless_idle,
+    run_connection,
+    serve_until_stopped,
+    wait_for_connections,
+)
+
+logger = logging.getLogger(__name__)
+
+# The connections work like WebSockets' (see websocket.py), with different framing.
+# pylint: disable=duplicate-code
+
+FRAMINGS = ("length", "newline")
+
+LENGTH = struct.Struct("!I")
+
+
+class FramingError(Exception):
+    """The client sent a message that can't be read. The connection is closed, since
+    there's no way to find the start of the next message.
+    """
+
+
+async def read_message(
+    reader: asyncio.StreamReader, framing: str, max_size: int
+) -> Optional[bytes]:
+    """Read the next message.
+
+    Returns: The message, or None if the client closed the connection cleanly.
+    """
+    if framing == "newline":
+        while True:
+            try:
+                line = await reader.readuntil(b"\n")
+            except asyncio.IncompleteReadError as exc:
+                if exc.partial.strip():
+                    raise FramingError("Incomplete message") from exc
+                return None
+            except asyncio.LimitOverrunError as exc:
+                raise FramingError("Message too big") from exc
+            if line.strip():  # Skip blank lines
+                return line
+    try:
+        header = await reader.readexactly(LENGTH.size)
+    except asyncio.IncompleteReadError as exc:
+        if exc.partial:
+            raise FramingError("Incomplete message") from exc
+        return None
+    (length,) = LENGTH.unpack(header)
+    if length > max_size:
+        raise FramingError("Message too big")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError as exc:
+        raise FramingError("Incomplete message") from exc
+
+
+def frame(message: bytes, framing: str) -> bytes:
+    """Frame a message to be sent."""
+    if framing == "newline":
+        return message + b"\n"
+    return LENGTH.pack(len(message)) + message
+
+
+class StreamConnection:
+    """A single client connection.
+
+    The read loop reads requests and starts dispatching each one straight away. As
+    they complete, the responses are queued, and the write loop writes whatever's
+    queued in one go.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        server: "StreamServer",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self.server, self.reader, self.writer = server, reader, writer
+        self.in_flight = asyncio.Semaphore(server.max_pipeline)
+        self.tasks: "Set[asyncio.Task[None]]" = set()
+        self.outgoing: List[bytes] = []
+        self.ready = asyncio.Event()
+        self.finished = False
+        self.read_task: Optional["asyncio.Task[None]"] = None
+
+    async def run(self) -> None:
+        """Handle the connection until it's closed, and the requests in flight have
+        been responded to.
+        """
+        self.read_task = asyncio.ensure_future(self.read_loop())
+        write_task = asyncio.ensure_future(self.write_loop())
+        try:
+            await asyncio.wait({self.read_task})
+            if not self.read_task.cancelled():
+                self.read_task.result()
+        except FramingError as exc:
+            logger.warning("Closing connection: %s", exc)
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            for task in (*self.tasks, write_task):
+                task.cancel()
+            raise
+        finally:
+            self.read_task.cancel()
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+        self.finished = True
+        self.ready.set()
+        await write_task
+
+    async def read_loop(self) -> None:
+        """Read requests and start dispatching them."""
+        server = self.server
+        while True:
+            # Limit how many requests can be in flight on this connection.
+            await self.in_flight.acquire()
+            if server.closing:
+                return
+            try:
+                message = await read_unless_idle(
+                    read_message(self.reader, server.framing, server.max_message_size),
+                    server.idle_timeout,
+                    lambda: bool(self.tasks),
+                )
+            except asyncio.TimeoutError:
+                return
+            if message is None:
+                return
+            task = asyncio.ensure_future(self.respond(message))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def respond(self, message: bytes) -> None:
+        """Dispatch a request, and queue the response to be written."""
+        try:
+            response = await self.server.dispatch(message)
+        except QueueFull:
+            logger.warning("Closing connection: Background queue full")
+            self.stop_reading()
+            response = b""
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error dispatching request")
+            response = b""
+        if response:
+            # The slot is released once the response is written.
+            self.outgoing.append(frame(response, self.server.framing))
+            self.ready.set()
+        else:
+            self.in_flight.release()
+
+    async def write_loop(self) -> None:
+        """Write the queued responses, coalescing those ready at the same time."""
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                if self.outgoing:
+                    count = len(self.outgoing)
+                    self.writer.write(b"".join(self.outgoing))
+                    self.outgoing.clear()
+                    await self.writer.drain()
+                    for _ in range(count):
+                        self.in_flight.release()
+                if self.finished and not self.outgoing:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.stop_reading()
+            self.writer.close()
+
+    def stop_reading(self) -> None:
+        """Stop reading requests. Those in flight are still responded to."""
+        if self.read_task is not None:
+            self.read_task.cancel()
+
+
+class StreamServer:
+    """A JSON-RPC server over TCP or Unix domain sockets, with framed messages.
+
+    Args:
+        methods: The methods to serve. Defaults to the global methods.
+        framing: "length" (a 4-byte big-endian length before each message) or
+            "newline" (a newline after each message).
+        codec: The codec used to deserialize requests and serialize responses.
+        max_connections: Connections over this limit are closed straight away.
+        max_pipeline: How many requests a connection can have in flight.
+        max_message_size: Connections sending messages over this size (in bytes) are
+            closed.
+        idle_timeout: Seconds a connection can wait for a request before it's closed.
+        max_in_flight: The most JSON-RPC requests to dispatch at the same time, across
+            all connections.
+        dispatch_options: Passed to dispatch_to_bytes, e.g. max_batch_size and timeout.
+            A background queue passed this way is drained on shutdown.
+    """
+
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+
+    def __init__(
+        self,
+        methods: Optional[Methods] = None,
+        *,
+        framing: str = "length",
+        codec: Codec = default_codec,
+        max_connections: int = 1000,
+        max_pipeline: int = 64,
+        max_message_size: int = 10 * 1024 * 1024,
+        idle_timeout: float = 60.0,
+        max_in_flight: Optional[int] = None,
+        **dispatch_options: Any,
+    ):
+        if framing not in FRAMINGS:
+            raise ValueError(f"framing must be one of {', '.join(FRAMINGS)}")
+        self.methods = global_methods if methods is None else methods
+        self.framing = framing
+        self.codec = codec
+        self.max_connections = max_connections
+        self.max_pipeline = max_pipeline
+        self.max_message_size = max_message_size
+        self.idle_timeout = idle_timeout
+        self.max_in_flight = max_in_flight
+        self.dispatch_options = dispatch_options
+        self.connections: Dict["asyncio.Task[None]", StreamConnection] = {}
+        self.closing = False
+        self.server: Optional[asyncio.Server] = None
+        self.path: Optional[str] = None
+        self.stop: Optional[asyncio.Event] = None
+
+    def prepare(self) -> Dict[str, Any]:
+        """Prepare to start listening, giving the options for starting the server."""
+        # Set when the server should be shut down. Created here to be in the loop.
+        self.stop = asyncio.Event()
+        if self.max_in_flight is not None:
+            self.dispatch_options["in_flight"] = asyncio.Semaphore(self.max_in_flight)
+        # A newline-framed message has to fit in the reader's buffer.
+        return {"limit": self.max_message_size + 1}
+
+    async def start(self, host: str = "", port: int = 6000, **kwargs: Any) -> None:
+        """Listen on a TCP port. Extra arguments are passed to asyncio.start_server."""
+        self.server = await asyncio.start_server(
+            self.handle_connection, host or None, port, **self.prepare(), **kwargs
+        )
+        logger.info(" * Listening on port %s", self.port)
+
+    async def start_unix(self, path: str, **kwargs: Any) -> None:
+        """Listen on a Unix domain socket. Extra arguments are passed to
+        asyncio.start_unix_server.
+        """
+        self.server = await asyncio.start_unix_server(
+            self.handle_connection, path, **self.prepare(), **kwargs
+        )
+        self.path = path
+        logger.info(" * Listening on %s", path)
+
+    @property
+    def port(self) -> int:
+        """The port the server is listening on (useful when started on port 0)."""
+        assert self.server is not None
+        return int(self.server.sockets[0].getsockname()[1])
+
+    async def dispatch(self, message: bytes) -> bytes:
+        """Dispatch a request message, giving the response message."""
+        return await dispatch_to_bytes(
+            message, self.methods, codec=self.codec, **self.dispatch_options
+        )
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """Called by asyncio for each new connection."""
+        if self.closing or len(self.connections) >= self.max_connections:
+            writer.close()
+            return
+        await run_connection(self.connections, StreamConnection(self, reader, writer))
+
+    async def shutdown(self, timeout: float = 30.0) -> None:
+        """Stop accepting connections, stop reading requests, and give requests in
+        flight up to timeout seconds to complete.
+        """
+        self.closing = True
+        if self.server is not None:
+            self.server.close()
+        for connection in self.connections.values():
+            connection.stop_reading()
+        await wait_for_connections(self.connections, timeout)
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        background = self.dispatch_options.get("background")
+        if background is not None:
+            await background.shutdown(timeout=timeout)
+
+
+async def serve(
+    methods: Optional[Methods] = None,
+    host: str = "",
+    port: int = 6000,
+    *,
+    path: Optional[str] = None,
+    shutdown_timeout: float = 30.0,
+    **options: Any,
+) -> None:
+    """Serve until cancelled, or until SIGINT/SIGTERM, then shut down gracefully.
+
+    Args:
+        path: Listen on this Unix domain socket, instead of a TCP port.
+        shutdown_timeout: Seconds to wait for requests in flight when shutting down.
+        options: Passed to StreamServer.
+    """
+    server = StreamServer(methods, **options)
+    if path is None:
+        await server.start(host, port)
+    else:
+        await server.start_unix(path)
+    await serve_until_stopped(server, shutdown_timeout)
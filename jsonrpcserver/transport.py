@@ -0,0 +1,75 @@
+"""Connection handling shared by the async servers: HTTP (async_server.py), WebSocket
+(websocket.py) and framed streams (stream_server.py).
+"""
+import asyncio
+import signal
+from typing import Any, Awaitable, Callable, Dict, Iterable, TypeVar
+
+T = TypeVar("T")
+
+
+async def read_unless_idle(
+    read: Awaitable[T], timeout: float, busy: Callable[[], bool]
+) -> T:
+    """Await a read from a connection, raising asyncio.TimeoutError if nothing is read
+    for timeout seconds - unless the connection is busy (with requests in flight), in
+    which case the wait goes on. The read isn't interrupted while waiting.
+    """
+    task = asyncio.ensure_future(read)
+    try:
+        while not (await asyncio.wait({task}, timeout=timeout))[0]:
+            if not busy():
+                raise asyncio.TimeoutError
+        return task.result()
+    finally:
+        task.cancel()
+
+
+async def run_connection(
+    connections: Dict["asyncio.Task[None]", Any], connection: Any
+) -> None:
+    """Run a connection until it's closed, keeping it in connections (by its task) until
+    then, so it can be waited for on shutdown.
+    """
+    task: "asyncio.Task[None]" = asyncio.current_task()  # type: ignore
+    connections[task] = connection
+    try:
+        await connection.run()
+    finally:
+        del connections[task]
+
+
+async def wait_for_connections(
+    connections: Iterable["asyncio.Task[None]"], timeout: float
+) -> None:
+    """Give the connections up to timeout seconds to close, then cancel them."""
+    tasks = list(connections)
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+async def serve_until_stopped(server: Any, shutdown_timeout: float) -> None:
+    """Wait until the started server's stop event is set, or until SIGINT/SIGTERM, then
+    shut it down gracefully.
+    """
+    stop = server.stop
+    assert stop is not None
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, stop.set)
+        except (NotImplementedError, RuntimeError):  # pragma: no cover
+            pass  # Not supported on this platform, or not in the main thread.
+    try:
+        await stop.wait()
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.remove_signal_handler(signum)
+            except (NotImplementedError, RuntimeError):  # pragma: no cover
+                pass
+        await server.shutdown(shutdown_timeout)
@@ -0,0 +1,62 @@
+"""A fast, hand-written validator for the JSON-RPC 2.0 request envelope.
+
+This gives exactly the same accept/reject behaviour as validating against
+request-schema.json with jsonschema, but without the overhead of a generic schema
+walk (oneOf, $ref, additionalProperties) on every request.
+"""
+from numbers import Number
+from typing import Any, Dict, List, Union
+
+Deserialized = Union[Dict[str, Any], List[Dict[str, Any]]]
+
+REQUEST_KEYS = frozenset(("jsonrpc", "method", "id", "params"))
+
+
+def is_valid_id(value: Any) -> bool:
+    """The schema's "id" type is ["string", "number", "null"]. Like jsonschema, a bool
+    is not considered a number.
+    """
+    # Check the common types first; the Number abc catches the rest (e.g. Decimal).
+    if value is None or type(value) in (str, int, float) or isinstance(value, str):
+        return True
+    return isinstance(value, Number) and not isinstance(value, bool)
+
+
+def is_valid_request(request: Any) -> bool:
+    """Validate a single (non-batch) request object."""
+    # pylint: disable=too-many-return-statements
+    if not isinstance(request, dict):
+        return False
+    # additionalProperties: false
+    if not request.keys() <= REQUEST_KEYS:
+        return False
+    # required: ["jsonrpc", "method"]
+    try:
+        jsonrpc, method = request["jsonrpc"], request["method"]
+    except KeyError:
+        return False
+    if not isinstance(jsonrpc, str) or jsonrpc != "2.0":
+        return False
+    if not isinstance(method, str):
+        return False
+    if "id" in request and not is_valid_id(request["id"]):
+        return False
+    if "params" in request and not isinstance(request["params"], (list, dict)):
+        return False
+    return True
+
+
+def validate(request: Deserialized) -> Deserialized:
+    """Validate a deserialized JSON-RPC request (or batch of requests).
+
+    Raises: ValueError if the request is invalid.
+
+    Returns: The same request passed in.
+    """
+    if isinstance(request, list):
+        # "minItems": 1
+        if request and all(map(is_valid_request, request)):
+            return request
+    elif is_valid_request(request):
+        return request
+    raise ValueError("The request failed schema validation")
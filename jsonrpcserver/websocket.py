@@ -0,0 +1,283 @@
+"""WebSocket (RFC 6455) support for the async server, using only the standard library.
+
+A client upgrades a connection to the HTTP server (async_server.py) with a WebSocket
+handshake, then sends JSON-RPC requests as messages, without an HTTP round trip each:
+
+    >>> ws = await websockets.connect("ws://localhost:5000")  # Any WebSocket client
+    >>> await ws.send('{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    >>> await ws.recv()
+    '{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+
+Each message is dispatched as soon as it arrives, so many requests on one socket run
+concurrently, and each response is sent when it's ready - possibly out of order, so
+clients match responses to requests by id. A response is sent in the same kind of
+message (text or binary) as its request; notifications get no response.
+
+Backpressure: a connection has at most max_pipeline requests in flight. Once it has
+that many, no more messages are read from the socket (so the client's writes back
+up), until a response has been written - and writing waits for the client to read.
+"""
+import asyncio
+import hashlib
+import logging
+import struct
+from base64 import b64encode
+from typing import TYPE_CHECKING, Dict, NamedTuple, Optional, Set
+
+from .exceptions import QueueFull
+from .transport import read_unless_idle
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .async_server import HttpServer
+
+logger = logging.getLogger(__name__)
+
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Opcodes
+CONTINUATION = 0x0
+TEXT = 0x1
+BINARY = 0x2
+CLOSE = 0x8
+PING = 0x9
+PONG = 0xA
+
+# Close codes
+NORMAL_CLOSURE = 1000
+GOING_AWAY = 1001
+PROTOCOL_ERROR = 1002
+MESSAGE_TOO_BIG = 1009
+INTERNAL_ERROR = 1011
+TRY_AGAIN_LATER = 1013
+
+# The subprotocol agreed if the client offers it.
+SUBPROTOCOL = "jsonrpc"
+
+
+class WebSocketError(Exception):
+    """The client broke the protocol. The connection is closed with the code."""
+
+    def __init__(self, code: int, reason: str):
+        super().__init__(reason)
+        self.code = code
+
+
+class Frame(NamedTuple):
+    """A WebSocket frame, unmasked."""
+
+    fin: bool
+    opcode: int
+    payload: bytes
+    masked: bool
+
+
+def is_upgrade(headers: Dict[str, str]) -> bool:
+    """True if the request headers ask to upgrade to a WebSocket."""
+    return headers.get("upgrade", "").lower() == "websocket" and "upgrade" in {
+        token.strip().lower() for token in headers.get("connection", "").split(",")
+    }
+
+
+def accept_key(key: str) -> str:
+    """The Sec-WebSocket-Accept value for the client's Sec-WebSocket-Key."""
+    return b64encode(hashlib.sha1(key.encode() + GUID).digest()).decode()
+
+
+def handshake_response(headers: Dict[str, str]) -> Optional[bytes]:
+    """The response accepting the upgrade, or None if the handshake is invalid."""
+    key = headers.get("sec-websocket-key")
+    if not key or headers.get("sec-websocket-version") != "13":
+        return None
+    offered = {
+        protocol.strip()
+        for protocol in headers.get("sec-websocket-protocol", "").split(",")
+    }
+    return b"".join(
+        (
+            b"HTTP/1.1 101 Switching Protocols\r\n",
+            b"Upgrade: websocket\r\nConnection: Upgrade\r\n",
+            b"Sec-WebSocket-Accept: %s\r\n" % accept_key(key).encode(),
+            b"Sec-WebSocket-Protocol: %s\r\n" % SUBPROTOCOL.encode()
+            if SUBPROTOCOL in offered
+            else b"",
+            b"\r\n",
+        )
+    )
+
+
+def unmask(payload: bytes, mask: bytes) -> bytes:
+    """XOR the payload with the repeated mask, as one big integer operation."""
+    length = len(payload)
+    if not length:
+        return payload
+    repeated = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(repeated, "big")).to_bytes(
+        length, "big"
+    )
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bytes = b"") -> bytes:
+    """Encode a single (final) frame. Clients mask their frames, servers don't."""
+    length = len(payload)
+    mask_bit = 0x80 if mask else 0
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, mask_bit | length)
+    elif length < 1 << 16:
+        header = struct.pack("!BBH", 0x80 | opcode, mask_bit | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, mask_bit | 127, length)
+    return header + mask + unmask(payload, mask) if mask else header + payload
+
+
+def close_payload(code: int, reason: str = "") -> bytes:
+    """The payload of a close frame."""
+    return struct.pack("!H", code) + reason.encode()
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int) -> Frame:
+    """Read a frame, raising WebSocketError if its payload is over max_size bytes."""
+    first, second = await reader.readexactly(2)
+    if first & 0x70:
+        raise WebSocketError(PROTOCOL_ERROR, "Reserved bits set")
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    if length > max_size:
+        raise WebSocketError(MESSAGE_TOO_BIG, "Message too big")
+    masked = bool(second & 0x80)
+    mask = await reader.readexactly(4) if masked else b""
+    payload = await reader.readexactly(length)
+    return Frame(bool(first & 0x80), first & 0x0F, unmask(payload, mask), masked)
+
+
+class WebSocket:
+    """A WebSocket connection, dispatching each message it receives."""
+
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+        self,
+        server: "HttpServer",
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ):
+        self.server, self.reader, self.writer = server, reader, writer
+        self.in_flight = asyncio.Semaphore(server.max_pipeline)
+        self.write_lock = asyncio.Lock()
+        self.tasks: "Set[asyncio.Task[None]]" = set()
+        self.closed = False
+        self.close_code, self.close_reason = NORMAL_CLOSURE, ""
+        self.read_task: Optional["asyncio.Task[None]"] = None
+
+    async def run(self) -> None:
+        """Read and dispatch messages until the connection is closed, then let the
+        requests in flight finish, and send a close frame.
+        """
+        self.read_task = asyncio.ensure_future(self.read_loop())
+        try:
+            await asyncio.wait({self.read_task})
+            if not self.read_task.cancelled():
+                self.read_task.result()
+        except WebSocketError as exc:
+            self.close_code, self.close_reason = exc.code, str(exc)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.closed = True
+        except asyncio.CancelledError:
+            for task in self.tasks:
+                task.cancel()
+            raise
+        finally:
+            self.read_task.cancel()
+        if self.tasks:
+            await asyncio.wait(self.tasks)
+        await self.close(self.close_code, self.close_reason)
+
+    def shutdown(self) -> None:
+        """Stop reading messages. The requests in flight are finished, then the
+        connection is closed.
+        """
+        self.close_code = GOING_AWAY
+        if self.read_task is not None:
+            self.read_task.cancel()
+
+    async def read_message(self) -> Optional[Frame]:
+        """Read frames until a complete message, replying to any control frames.
+
+        Returns: The message, as a frame with the whole payload, or None if the client
+            closed the connection.
+        """
+        message: Optional[Frame] = None
+        size = 0
+        while True:
+            frame = await read_frame(self.reader, self.server.max_body_size - size)
+            if not frame.masked:
+                raise WebSocketError(PROTOCOL_ERROR, "Frame not masked")
+            if frame.opcode == CLOSE:
+                return None
+            if frame.opcode == PING:
+                await self.write(encode_frame(PONG, frame.payload))
+            elif frame.opcode in (TEXT, BINARY) and message is None:
+                message = frame
+            elif frame.opcode == CONTINUATION and message is not None:
+                message = message._replace(payload=message.payload + frame.payload)
+            elif frame.opcode != PONG:
+                raise WebSocketError(PROTOCOL_ERROR, "Unexpected frame")
+            if frame.opcode in (TEXT, BINARY, CONTINUATION):
+                size += len(frame.payload)
+                if frame.fin:
+                    return message
+
+    async def read_loop(self) -> None:
+        """Read messages and start dispatching them."""
+        server = self.server
+        while not server.closing:
+            # Limit how many requests can be in flight on this connection.
+            await self.in_flight.acquire()
+            try:
+                message = await read_unless_idle(
+                    self.read_message(), server.idle_timeout, lambda: bool(self.tasks)
+                )
+            except asyncio.TimeoutError:
+                raise WebSocketError(GOING_AWAY, "Idle timeout") from None
+            if message is None:
+                return
+            task = asyncio.ensure_future(self.respond(message))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def respond(self, message: Frame) -> None:
+        """Dispatch a message, and send the response."""
+        try:
+            _, response = await self.server.dispatch(message.payload)
+            if response:
+                await self.write(encode_frame(message.opcode, response))
+        except QueueFull:
+            await self.close(TRY_AGAIN_LATER, "Server busy")
+        except ConnectionError:
+            self.closed = True
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error dispatching request")
+            await self.close(INTERNAL_ERROR)
+        finally:
+            self.in_flight.release()
+
+    async def write(self, data: bytes) -> None:
+        """Write to the client, waiting for it to read if it's behind."""
+        async with self.write_lock:
+            if not self.closed:
+                self.writer.write(data)
+                await self.writer.drain()
+
+    async def close(self, code: int = NORMAL_CLOSURE, reason: str = "") -> None:
+        """Send a close frame (once), and stop reading."""
+        if self.closed:
+            return
+        try:
+            await self.write(encode_frame(CLOSE, close_payload(code, reason)))
+        except ConnectionError:
+            pass
+        self.closed = True
+        if self.read_task is not None:
+            self.read_task.cancel()
@@ -25,14 +25,17 @@ setup(
             "websockets",
             "werkzeug",
         ],
+        "orjson": ["orjson"],
         "test": [
             "pytest",
+            "pytest-asyncio",
             "pytest-cov",
             "tox",
         ],
+        "ujson": ["ujson"],
     },
     include_package_data=True,
-    install_requires=["jsonschema<5", "oslash<1"],
+    install_requires=["jsonschema<5"],
     license="MIT",
     long_description=README,
     long_description_content_type="text/markdown",
@@ -1,18 +1,35 @@
 """Test async_dispatcher.py"""
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, AsyncIterator, Dict, List
 from unittest.mock import Mock, patch
 
 import pytest
-from oslash.either import Left, Right  # type: ignore
 
 from jsonrpcserver.async_dispatcher import (
     call,
     dispatch_deserialized,
     dispatch_request,
     dispatch_to_response_pure,
+    gather_limited,
+    is_async,
+    iterate_incremental,
 )
-from jsonrpcserver.codes import ERROR_INTERNAL_ERROR, ERROR_SERVER_ERROR
+from jsonrpcserver.codes import (
+    ERROR_INTERNAL_ERROR,
+    ERROR_INVALID_REQUEST,
+    ERROR_SERVER_ERROR,
+    ERROR_TIMEOUT,
+)
+from jsonrpcserver.either import Left, Right
 from jsonrpcserver.exceptions import JsonRpcError
 from jsonrpcserver.main import default_deserializer, default_validator
+from jsonrpcserver.methods import method as register
 from jsonrpcserver.request import Request
 from jsonrpcserver.response import ErrorResponse, SuccessResponse
 from jsonrpcserver.result import ErrorResult, Result, Success, SuccessResult
@@ -53,6 +70,177 @@ async def test_call_raising_exception() -> None:
     )
 
 
+@pytest.mark.asyncio
+async def test_call_sync_method_runs_in_executor() -> None:
+    def method() -> Result:
+        return Success(threading.current_thread().name)
+
+    with ThreadPoolExecutor(thread_name_prefix="test-pool") as executor:
+        result = await call(Request("x", [], 1), NOCONTEXT, method, executor=executor)
+    assert isinstance(result, Right)
+    name = result._value.result  # pylint: disable=protected-access
+    assert name.startswith("test-pool")
+
+
+@pytest.mark.asyncio
+async def test_call_sync_method_doesnt_block_loop() -> None:
+    def method() -> Result:
+        time.sleep(0.1)
+        return Success()
+
+    ticks = 0
+
+    async def tick() -> None:
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(tick())
+    await call(Request("x", [], 1), NOCONTEXT, method)
+    task.cancel()
+    assert ticks > 5
+
+
+@pytest.mark.asyncio
+async def test_call_sync_method_copies_context() -> None:
+    var: ContextVar[str] = ContextVar("var")
+    var.set("foo")
+    assert await call(
+        Request("x", [], 1), NOCONTEXT, lambda: Success(var.get())
+    ) == Right(SuccessResult("foo"))
+
+
+@pytest.mark.asyncio
+async def test_call_sync_method_returning_awaitable() -> None:
+    def method() -> Any:
+        return ping()
+
+    assert await call(Request("x", [], 1), NOCONTEXT, method) == Right(
+        SuccessResult("pong")
+    )
+
+
+def test_is_async() -> None:
+    class AsyncCallable:  # pylint: disable=too-few-public-methods
+        """An object with an async __call__."""
+
+        async def __call__(self) -> Result:
+            return Success()
+
+    assert is_async(ping) is True
+    assert is_async(AsyncCallable()) is True
+    assert is_async(lambda: None) is False
+    assert is_async(partial(ping)) is True
+
+
+def test_is_async_unhashable() -> None:
+    class Unhashable:  # pylint: disable=too-few-public-methods
+        """Can't be cached."""
+
+        __hash__ = None  # type: ignore
+
+        async def __call__(self) -> Result:
+            return Success()
+
+    assert is_async(Unhashable()) is True
+
+
+@pytest.mark.asyncio
+async def test_call_method_timeout() -> None:
+    cancelled = asyncio.Event()
+
+    @register(name="slow", timeout=0.01)
+    async def slow() -> Result:
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return Success()
+
+    assert await call(Request("slow", [], 1), NOCONTEXT, slow) == Left(
+        ErrorResult(ERROR_TIMEOUT, "Timeout")
+    )
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_call_deadline() -> None:
+    deadline = asyncio.get_running_loop().time() + 0.01
+    assert await call(
+        Request("sleep", [1], 1), NOCONTEXT, asyncio.sleep, deadline=deadline
+    ) == Left(ErrorResult(ERROR_TIMEOUT, "Timeout"))
+
+
+@pytest.mark.asyncio
+async def test_call_within_timeout() -> None:
+    @register(name="quick", timeout=1)
+    async def quick() -> Result:
+        return Success("done")
+
+    assert await call(Request("quick", [], 1), NOCONTEXT, quick) == Right(
+        SuccessResult("done")
+    )
+
+
+@pytest.mark.asyncio
+async def test_call_timeout_error_in_method() -> None:
+    @register(name="raises", timeout=1)
+    async def raises() -> Result:
+        raise asyncio.TimeoutError("foo")
+
+    assert await call(Request("raises", [], 1), NOCONTEXT, raises) == Left(
+        ErrorResult(ERROR_INTERNAL_ERROR, "Internal error", "foo")
+    )
+
+
+@pytest.mark.asyncio
+async def test_call_cancelled_cancels_method() -> None:
+    cancelled = asyncio.Event()
+
+    @register(name="forever", timeout=10)
+    async def forever() -> Result:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return Success()
+
+    task = asyncio.create_task(call(Request("forever", [], 1), NOCONTEXT, forever))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert cancelled.is_set()
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_pure_timeout() -> None:
+    async def sleep(seconds: float) -> Result:
+        await asyncio.sleep(seconds)
+        return Success(seconds)
+
+    assert await dispatch_to_response_pure(
+        deserializer=default_deserializer,
+        validator=default_validator,
+        post_process=identity,
+        context=NOCONTEXT,
+        methods={"sleep": sleep},
+        request=json.dumps(
+            [
+                {"jsonrpc": "2.0", "method": "sleep", "params": [0], "id": 1},
+                {"jsonrpc": "2.0", "method": "sleep", "params": [1], "id": 2},
+            ]
+        ),
+        timeout=0.05,
+    ) == [
+        Right(SuccessResponse(0, 1)),
+        Left(ErrorResponse(ERROR_TIMEOUT, "Timeout", NODATA, 2)),
+    ]
+
+
 @pytest.mark.asyncio
 async def test_dispatch_request() -> None:
     request = Request("ping", [], 1)
@@ -72,6 +260,88 @@ async def test_dispatch_deserialized() -> None:
     ) == Right(SuccessResponse("pong", 1))
 
 
+class Tracker:  # pylint: disable=too-few-public-methods
+    """A method that records how many calls are running at once."""
+
+    def __init__(self) -> None:
+        self.running = 0
+        self.most = 0
+
+    async def __call__(self, value: int) -> Result:
+        self.running += 1
+        self.most = max(self.most, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return Success(value)
+
+
+def batch(count: int) -> List[Dict[str, Any]]:
+    return [
+        {"jsonrpc": "2.0", "method": "track", "params": [i], "id": i}
+        for i in range(count)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_deserialized_max_concurrency() -> None:
+    track = Tracker()
+    assert await dispatch_deserialized(
+        {"track": track}, NOCONTEXT, identity, batch(10), max_concurrency=3
+    ) == [Right(SuccessResponse(i, i)) for i in range(10)]
+    assert track.most == 3
+
+
+@pytest.mark.asyncio
+async def test_dispatch_deserialized_in_flight() -> None:
+    track = Tracker()
+    in_flight = asyncio.Semaphore(4)
+    await asyncio.gather(
+        *(
+            dispatch_deserialized(
+                {"track": track}, NOCONTEXT, identity, batch(5), in_flight=in_flight
+            )
+            for _ in range(3)
+        )
+    )
+    assert track.most == 4
+
+
+@pytest.mark.asyncio
+async def test_gather_limited_starts_only_max_concurrency() -> None:
+    tasks = []
+
+    async def dispatch(request: Request) -> Any:
+        tasks.append(len(asyncio.all_tasks()))
+        await asyncio.sleep(0)
+        return (request, Right(SuccessResult(None)))
+
+    requests = [Request("x", [], i) for i in range(5)]
+    assert [r for r, _ in await gather_limited(dispatch, requests, 2)] == requests
+    assert max(tasks) == 3  # This test, plus two workers
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_pure_max_batch_size() -> None:
+    with patch("jsonrpcserver.async_dispatcher.create_request") as create_request:
+        assert await dispatch_to_response_pure(
+            deserializer=default_deserializer,
+            validator=default_validator,
+            post_process=identity,
+            context=NOCONTEXT,
+            methods={"track": Tracker()},
+            request=json.dumps(batch(3)),
+            max_batch_size=2,
+        ) == Left(
+            ErrorResponse(
+                ERROR_INVALID_REQUEST,
+                "Invalid request",
+                "The batch exceeds the maximum of 2 requests",
+                None,
+            )
+        )
+    create_request.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_dispatch_to_response_pure_success() -> None:
     assert await dispatch_to_response_pure(
@@ -98,3 +368,53 @@ async def test_dispatch_to_response_pure_server_error(*_: Mock) -> None:
         methods={"hello": hello},
         request='{"jsonrpc": "2.0", "method": "hello", "id": 1}',
     ) == Left(ErrorResponse(ERROR_SERVER_ERROR, "Server error", "hello", None))
+
+
+@pytest.mark.asyncio
+async def test_iterate_incremental_bounds_memory() -> None:
+    read = 0
+
+    async def items() -> AsyncIterator[int]:
+        nonlocal read
+        for i in range(10):
+            read += 1
+            yield i
+
+    async def dispatch(item: int) -> int:
+        await asyncio.sleep(0.01 if item == 0 else 0)
+        return item
+
+    results = iterate_incremental(dispatch, items(), 3, True)
+    assert await results.__anext__() == 0
+    assert read <= 4  # The three dispatched, and one waiting for a slot
+    assert [r async for r in results] == list(range(1, 10))
+
+
+@pytest.mark.asyncio
+async def test_iterate_incremental_unordered() -> None:
+    async def items() -> AsyncIterator[float]:
+        for seconds in [0.02, 0]:
+            yield seconds
+
+    async def dispatch(seconds: float) -> float:
+        await asyncio.sleep(seconds)
+        return seconds
+
+    assert [r async for r in iterate_incremental(dispatch, items(), None, False)] == [
+        0,
+        0.02,
+    ]
+
+
+@pytest.mark.asyncio
+async def test_iterate_incremental_read_error() -> None:
+    async def items() -> AsyncIterator[int]:
+        yield 1
+        raise OSError("foo")
+
+    async def dispatch(item: int) -> int:
+        return item
+
+    with pytest.raises(OSError):
+        async for _ in iterate_incremental(dispatch, items(), None, True):
+            pass
@@ -1,12 +1,20 @@
 """Test async_main.py"""
+import asyncio
+import json
+from typing import AsyncIterator
+
 import pytest
-from oslash.either import Right  # type: ignore
 
 from jsonrpcserver.async_main import (
+    dispatch_incremental,
+    dispatch_to_bytes,
+    dispatch_to_bytes_stream,
     dispatch_to_json,
     dispatch_to_response,
+    dispatch_to_response_stream,
     dispatch_to_serializable,
 )
+from jsonrpcserver.either import Right
 from jsonrpcserver.response import SuccessResponse
 from jsonrpcserver.result import Result, Success
 
@@ -24,6 +32,18 @@ async def test_dispatch_to_response() -> None:
     ) == Right(SuccessResponse("pong", 1))
 
 
+@pytest.mark.asyncio
+async def test_dispatch_to_response_sync_method() -> None:
+    def sync_ping() -> Result:
+        return Success("pong")
+
+    assert await dispatch_to_response(
+        '{"jsonrpc": "2.0", "method": "ping", "id": 1}',
+        {"ping": sync_ping},
+        max_workers=2,
+    ) == Right(SuccessResponse("pong", 1))
+
+
 @pytest.mark.asyncio
 async def test_dispatch_to_serializable() -> None:
     assert await dispatch_to_serializable(
@@ -47,3 +67,138 @@ async def test_dispatch_to_json_notification() -> None:
         await dispatch_to_json('{"jsonrpc": "2.0", "method": "ping"}', {"ping": ping})
         == ""
     )
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_bytes() -> None:
+    assert (
+        await dispatch_to_bytes(
+            b'{"jsonrpc": "2.0", "method": "ping", "id": 1}', {"ping": ping}
+        )
+        == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    )
+
+
+async def sleep(seconds: float) -> Result:
+    await asyncio.sleep(seconds)
+    return Success(seconds)
+
+
+SLEEPS = json.dumps(
+    [
+        {"jsonrpc": "2.0", "method": "sleep", "params": [0.05], "id": 1},
+        {"jsonrpc": "2.0", "method": "sleep", "params": [0]},
+        {"jsonrpc": "2.0", "method": "sleep", "params": [0], "id": 3},
+    ]
+)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_stream() -> None:
+    assert [r async for r in dispatch_to_response_stream(SLEEPS, {"sleep": sleep})] == [
+        Right(SuccessResponse(0.05, 1)),
+        Right(SuccessResponse(0, 3)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_stream_unordered() -> None:
+    assert [
+        r
+        async for r in dispatch_to_response_stream(
+            SLEEPS, {"sleep": sleep}, ordered=False
+        )
+    ] == [Right(SuccessResponse(0, 3)), Right(SuccessResponse(0.05, 1))]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_stream_limited() -> None:
+    assert [
+        r
+        async for r in dispatch_to_response_stream(
+            SLEEPS, {"sleep": sleep}, ordered=False, max_concurrency=1
+        )
+    ] == [Right(SuccessResponse(0.05, 1)), Right(SuccessResponse(0, 3))]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_response_stream_close_cancels() -> None:
+    cancelled = asyncio.Event()
+
+    async def forever() -> Result:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return Success()
+
+    responses = dispatch_to_response_stream(
+        '[{"jsonrpc": "2.0", "method": "ping", "id": 1},'
+        ' {"jsonrpc": "2.0", "method": "forever", "id": 2}]',
+        {"ping": ping, "forever": forever},
+        ordered=False,
+    )
+    assert await responses.__anext__() == Right(SuccessResponse("pong", 1))
+    await responses.aclose()
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_bytes_stream() -> None:
+    chunks = [c async for c in dispatch_to_bytes_stream(SLEEPS, {"sleep": sleep})]
+    assert len(chunks) == 3
+    assert b"".join(chunks) == await dispatch_to_bytes(SLEEPS, {"sleep": sleep})
+
+
+@pytest.mark.asyncio
+async def test_dispatch_to_bytes_stream_single() -> None:
+    request = b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+    assert [c async for c in dispatch_to_bytes_stream(request, {"ping": ping})] == [
+        await dispatch_to_bytes(request, {"ping": ping})
+    ]
+
+
+async def chunked(data: bytes, size: int = 7) -> AsyncIterator[bytes]:
+    for i in range(0, len(data), size):
+        yield data[i : i + size]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_incremental() -> None:
+    request = SLEEPS.encode()
+    assert b"".join(
+        [c async for c in dispatch_incremental(chunked(request), {"sleep": sleep})]
+    ) == await dispatch_to_bytes(request, {"sleep": sleep})
+
+
+@pytest.mark.asyncio
+async def test_dispatch_incremental_unordered() -> None:
+    response = b"".join(
+        [
+            c
+            async for c in dispatch_incremental(
+                chunked(SLEEPS.encode()), {"sleep": sleep}, ordered=False
+            )
+        ]
+    )
+    assert [r["id"] for r in json.loads(response)] == [3, 1]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_incremental_stream_reader() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(b'[{"jsonrpc": "2.0", "method": "ping", "id": 1}]')
+    reader.feed_eof()
+    assert [c async for c in dispatch_incremental(reader, {"ping": ping})] == [
+        b'[{"jsonrpc": "2.0", "result": "pong", "id": 1}',
+        b"]",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_incremental_not_a_batch() -> None:
+    for request in [b'{"jsonrpc": "2.0", "method": "ping", "id": 1}', b"[]", b"{", b""]:
+        assert b"".join(
+            [c async for c in dispatch_incremental(chunked(request), {"ping": ping})]
+        ) == await dispatch_to_bytes(request, {"ping": ping})
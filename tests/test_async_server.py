@@ -0,0 +1,341 @@
+"""Test async_server.py"""
+import asyncio
+from http import HTTPStatus
+from pathlib import Path
+from typing import AsyncIterator, Tuple
+from unittest.mock import Mock, patch
+
+import pytest
+import pytest_asyncio
+
+from jsonrpcserver import metrics
+from jsonrpcserver.__main__ import main, parse_args
+from jsonrpcserver.async_server import HttpServer, run
+from jsonrpcserver.background import AsyncBackgroundQueue
+from jsonrpcserver.hooks import hooks
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+PING = b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+
+
+async def ping() -> Result:
+    return Success("pong")
+
+
+async def sleep(seconds: float) -> Result:
+    await asyncio.sleep(seconds)
+    return Success(seconds)
+
+
+def post(body: bytes, headers: bytes = b"") -> bytes:
+    return b"POST / HTTP/1.1\r\nContent-Length: %d\r\n%s\r\n%s" % (
+        len(body),
+        headers,
+        body,
+    )
+
+
+async def read_response(reader: asyncio.StreamReader) -> Tuple[bytes, bytes]:
+    """Returns the status line (with headers) and body."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+    return head, await reader.readexactly(length)
+
+
+@pytest_asyncio.fixture
+async def server() -> AsyncIterator[HttpServer]:
+    server = HttpServer({"ping": ping, "sleep": sleep}, idle_timeout=1)
+    await server.start("127.0.0.1", 0)
+    yield server
+    await server.shutdown(timeout=1)
+
+
+async def connect(server: HttpServer) -> Streams:
+    return await asyncio.open_connection("127.0.0.1", server.port)
+
+
+@pytest.mark.asyncio
+async def test_request(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(post(PING))
+    head, body = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert b"Connection: keep-alive" in head
+    assert body == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_keep_alive(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    for _ in range(3):
+        writer.write(post(PING))
+        _, body = await read_response(reader)
+        assert body == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_pipelining_keeps_order(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    slow = b'{"jsonrpc": "2.0", "method": "sleep", "params": [0.1], "id": 1}'
+    fast = b'{"jsonrpc": "2.0", "method": "sleep", "params": [0], "id": 2}'
+    writer.write(post(slow) + post(fast))
+    assert b'"id": 1' in (await read_response(reader))[1]
+    assert b'"id": 2' in (await read_response(reader))[1]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_connection_close(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(post(PING, b"Connection: close\r\n"))
+    head, _ = await read_response(reader)
+    assert b"Connection: close" in head
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_http_1_0_closes(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(b"POST / HTTP/1.0\r\nContent-Length: %d\r\n\r\n%s" % (len(PING), PING))
+    head, _ = await read_response(reader)
+    assert b"Connection: close" in head
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_notification(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(post(b'{"jsonrpc": "2.0", "method": "ping"}'))
+    head, body = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 204 No Content\r\n")
+    assert body == b""
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_chunked(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(
+        b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n"
+        b"%x\r\n%s\r\n%x\r\n%s\r\n0\r\n\r\n"
+        % (10, PING[:10], len(PING) - 10, PING[10:])
+    )
+    _, body = await read_response(reader)
+    assert body == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_expect_continue(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(
+        b"POST / HTTP/1.1\r\nContent-Length: %d\r\nExpect: 100-continue\r\n\r\n"
+        % len(PING)
+    )
+    assert await reader.readuntil(b"\r\n\r\n") == b"HTTP/1.1 100 Continue\r\n\r\n"
+    writer.write(PING)
+    _, body = await read_response(reader)
+    assert body == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_method_not_allowed(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(b"GET / HTTP/1.1\r\n\r\n")
+    head, _ = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 405 Method Not Allowed\r\n")
+    assert b"Allow: POST" in head
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_metrics() -> None:
+    server = HttpServer({"ping": ping}, metrics=True)
+    metrics.registry.clear()
+    await server.start("127.0.0.1", 0)
+    try:
+        reader, writer = await connect(server)
+        writer.write(post(PING) + b"GET /metrics HTTP/1.1\r\n\r\n")
+        await read_response(reader)
+        head, body = await read_response(reader)
+        assert head.startswith(b"HTTP/1.1 200 OK\r\n")
+        assert b"Content-Type: " + metrics.CONTENT_TYPE.encode() in head
+        assert b'jsonrpc_calls_total{method="ping"} 1.0' in body
+        writer.close()
+    finally:
+        await server.shutdown()
+    assert metrics.collect not in hooks
+
+
+@pytest.mark.asyncio
+async def test_metrics_flushed(tmp_path: Path) -> None:
+    server = HttpServer({"ping": ping}, metrics=True, metrics_dir=str(tmp_path))
+    await server.start("127.0.0.1", 0)
+    try:
+        assert server.flush_task is not None
+    finally:
+        await server.shutdown()
+    assert [path.suffix for path in tmp_path.iterdir()] == [".json"]
+
+
+@pytest.mark.asyncio
+async def test_bad_request(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(b"nonsense\r\n\r\n")
+    head, _ = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_body_too_large() -> None:
+    server = HttpServer({"ping": ping}, max_body_size=10)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writer.write(post(PING))
+    head, _ = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 413 ")
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_max_connections() -> None:
+    server = HttpServer({"ping": ping}, max_connections=1)
+    await server.start("127.0.0.1", 0)
+    _, writer1 = await connect(server)
+    await asyncio.sleep(0.01)
+    reader2, writer2 = await connect(server)
+    head, _ = await read_response(reader2)
+    assert head.startswith(b"HTTP/1.1 503 Service Unavailable\r\n")
+    writer1.close()
+    writer2.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout() -> None:
+    server = HttpServer({"ping": ping}, idle_timeout=0.05)
+    await server.start("127.0.0.1", 0)
+    reader, _ = await connect(server)
+    assert await asyncio.wait_for(reader.read(), 1) == b""
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_requests_in_flight(server: HttpServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(
+        post(b'{"jsonrpc": "2.0", "method": "sleep", "params": [0.1], "id": 1}')
+    )
+    await asyncio.sleep(0.01)
+    await server.shutdown(timeout=1)
+    head, body = await read_response(reader)
+    assert b"Connection: close" in head
+    assert body == b'{"jsonrpc": "2.0", "result": 0.1, "id": 1}'
+
+
+@pytest.mark.asyncio
+async def test_shutdown_closes_idle_connections(server: HttpServer) -> None:
+    reader, _ = await connect(server)
+    await asyncio.sleep(0.01)
+    await asyncio.wait_for(server.shutdown(timeout=5), 1)
+    assert await reader.read() == b""
+
+
+def test_parse_args() -> None:
+    args = parse_args(["--port", "8000", "--methods", "foo", "--methods", "bar"])
+    assert args.port == 8000
+    assert args.methods == ["foo", "bar"]
+
+
+@pytest.mark.asyncio
+async def test_max_requests() -> None:
+    server = HttpServer({"ping": ping}, max_requests=2)
+    await server.start("127.0.0.1", 0)
+    assert server.stop is not None
+    await server.dispatch(PING)
+    assert not server.stop.is_set()
+    await server.dispatch(PING)
+    assert server.stop.is_set()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_max_in_flight() -> None:
+    server = HttpServer({"ping": ping}, max_in_flight=2)
+    await server.start("127.0.0.1", 0)
+    assert isinstance(server.dispatch_options["in_flight"], asyncio.Semaphore)
+    assert await server.dispatch(PING) == (
+        HTTPStatus.OK,
+        b'{"jsonrpc": "2.0", "result": "pong", "id": 1}',
+    )
+    await server.shutdown()
+
+
+def test_parse_args_workers() -> None:
+    args = parse_args(["--workers", "4", "--max-requests", "1000", "--pin-cpus"])
+    assert args.workers == 4
+    assert args.max_requests == 1000
+    assert args.pin_cpus is True
+
+
+@patch("jsonrpcserver.__main__.run")
+def test_main(run_: Mock) -> None:
+    main(["--methods", "json", "--workers", "2"])
+    run_.assert_called_once()
+    assert run_.call_args.kwargs["workers"] == 2
+
+
+@patch("jsonrpcserver.async_server.prefork")
+@patch("jsonrpcserver.async_server.asyncio.run")
+def test_run(asyncio_run: Mock, prefork_: Mock) -> None:
+    run({"ping": ping}, port=0)
+    asyncio_run.assert_called_once()
+    prefork_.assert_not_called()
+    asyncio_run.call_args.args[0].close()  # The un-awaited serve coroutine
+
+
+@patch("jsonrpcserver.async_server.prefork")
+def test_run_workers(prefork_: Mock) -> None:
+    run({"ping": ping}, port=0, workers=4, pin_cpus=True)
+    prefork_.assert_called_once()
+    assert prefork_.call_args.args[1] == 4
+    assert prefork_.call_args.kwargs == {"pin_cpus": True}
+
+
+@patch("jsonrpcserver.async_server.prefork")
+def test_run_workers_metrics(prefork_: Mock) -> None:
+    run({"ping": ping}, port=0, workers=2, metrics=True)
+    prefork_.assert_called_once()
+
+
+def test_parse_args_metrics() -> None:
+    assert parse_args(["--metrics"]).metrics is True
+
+
+@pytest.mark.asyncio
+async def test_background_queue_full() -> None:
+    async def notify() -> Result:
+        await asyncio.sleep(10)
+        return Success()
+
+    background = AsyncBackgroundQueue(max_pending=1, overflow="reject")
+    server = HttpServer({"notify": notify}, background=background)
+    await server.start("127.0.0.1", 0)
+    notification = b'{"jsonrpc": "2.0", "method": "notify"}'
+    assert (await server.dispatch(notification))[0] == HTTPStatus.NO_CONTENT
+    reader, writer = await connect(server)
+    writer.write(post(notification))
+    head, _ = await read_response(reader)
+    assert head.startswith(b"HTTP/1.1 503 Service Unavailable\r\n")
+    writer.close()
+    await server.shutdown(timeout=0.01)  # Cancels the notification still running
+    assert background.pending == 0
@@ -0,0 +1,207 @@
+"""Test background.py"""
+import asyncio
+import threading
+from typing import List
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.background import AsyncBackgroundQueue, BackgroundQueue, QueueFull
+from jsonrpcserver.main import dispatch
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring
+
+BATCH = (
+    '[{"jsonrpc": "2.0", "method": "notify", "params": [1]},'
+    ' {"jsonrpc": "2.0", "method": "ping", "id": 1}]'
+)
+NOTIFICATION = '{"jsonrpc": "2.0", "method": "notify", "params": [1]}'
+
+
+def ping() -> Result:
+    return Success("pong")
+
+
+async def async_ping() -> Result:
+    return Success("pong")
+
+
+def test_overflow_policy() -> None:
+    with pytest.raises(ValueError):
+        BackgroundQueue(overflow="explode")
+
+
+def test_dispatch() -> None:
+    release = threading.Event()
+    notified: List[int] = []
+
+    def notify(number: int) -> Result:
+        release.wait(5)
+        notified.append(number)
+        return Success()
+
+    background = BackgroundQueue()
+    response = dispatch(BATCH, {"notify": notify, "ping": ping}, background=background)
+    # The response is given without waiting for the notification.
+    assert response == '[{"jsonrpc": "2.0", "result": "pong", "id": 1}]'
+    assert not notified
+    release.set()
+    background.shutdown()
+    assert notified == [1]
+    assert background.pending == 0
+
+
+def test_single_notification() -> None:
+    notified: List[int] = []
+
+    def notify(number: int) -> Result:
+        notified.append(number)
+        return Success()
+
+    background = BackgroundQueue()
+    assert dispatch(NOTIFICATION, {"notify": notify}, background=background) == ""
+    background.shutdown()
+    assert notified == [1]
+
+
+def test_drop() -> None:
+    release = threading.Event()
+
+    def notify(_: int) -> Result:
+        release.wait(5)
+        return Success()
+
+    background = BackgroundQueue(max_workers=1, max_pending=1, overflow="drop")
+    dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    assert background.dropped == 1
+    release.set()
+    background.shutdown()
+
+
+def test_reject() -> None:
+    release = threading.Event()
+
+    def notify(_: int) -> Result:
+        release.wait(5)
+        return Success()
+
+    methods = {"notify": notify, "ping": ping}
+    background = BackgroundQueue(max_workers=1, max_pending=1, overflow="reject")
+    dispatch(NOTIFICATION, methods, background=background)
+    with pytest.raises(QueueFull):
+        dispatch(BATCH, methods, background=background)
+    release.set()
+    background.shutdown()
+
+
+def test_block() -> None:
+    notified: List[int] = []
+
+    def notify(number: int) -> Result:
+        notified.append(number)
+        return Success()
+
+    background = BackgroundQueue(max_workers=1, max_pending=1)
+    for _ in range(3):
+        dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    background.shutdown()
+    assert notified == [1, 1, 1]
+
+
+def test_shutdown_without_drain() -> None:
+    release = threading.Event()
+    notified: List[int] = []
+
+    def notify(number: int) -> Result:
+        release.wait(5)
+        notified.append(number)
+        return Success()
+
+    background = BackgroundQueue(max_workers=1)
+    for _ in range(3):
+        dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    threading.Timer(0.05, release.set).start()
+    background.shutdown(drain=False)
+    assert notified == [1]  # Only the one that was running
+
+
+def test_error_logged(caplog: pytest.LogCaptureFixture) -> None:
+    background = BackgroundQueue()
+    background.submit(lambda: 1 / 0)
+    background.shutdown()
+    assert "Error running notification" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch() -> None:
+    release = asyncio.Event()
+    notified: List[int] = []
+
+    async def notify(number: int) -> Result:
+        await release.wait()
+        notified.append(number)
+        return Success()
+
+    background = AsyncBackgroundQueue()
+    response = await async_dispatch(
+        BATCH, {"notify": notify, "ping": async_ping}, background=background
+    )
+    assert response == '[{"jsonrpc": "2.0", "result": "pong", "id": 1}]'
+    assert background.pending == 1
+    release.set()
+    await background.shutdown()
+    assert notified == [1]
+
+
+@pytest.mark.asyncio
+async def test_async_overflow() -> None:
+    async def notify(_: int) -> Result:
+        await asyncio.sleep(10)
+        return Success()
+
+    methods = {"notify": notify}
+    dropping = AsyncBackgroundQueue(max_pending=1, overflow="drop")
+    await async_dispatch(NOTIFICATION, methods, background=dropping)
+    await async_dispatch(NOTIFICATION, methods, background=dropping)
+    assert (dropping.pending, dropping.dropped) == (1, 1)
+    rejecting = AsyncBackgroundQueue(max_pending=1, overflow="reject")
+    await async_dispatch(NOTIFICATION, methods, background=rejecting)
+    with pytest.raises(QueueFull):
+        await async_dispatch(NOTIFICATION, methods, background=rejecting)
+    await dropping.shutdown(drain=False)
+    await rejecting.shutdown(drain=False)
+    assert dropping.pending == rejecting.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_async_block() -> None:
+    notified: List[int] = []
+
+    async def notify(number: int) -> Result:
+        await asyncio.sleep(0.01)
+        notified.append(number)
+        return Success()
+
+    background = AsyncBackgroundQueue(max_pending=1)
+    await async_dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    # Waits for the first notification to finish
+    await async_dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    assert notified == [1]
+    await background.shutdown()
+    assert notified == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_async_shutdown_timeout() -> None:
+    async def notify(_: int) -> Result:
+        await asyncio.sleep(10)
+        return Success()
+
+    background = AsyncBackgroundQueue()
+    await async_dispatch(NOTIFICATION, {"notify": notify}, background=background)
+    await background.shutdown(timeout=0.01)
+    assert background.pending == 0
+    with pytest.raises(RuntimeError):
+        await background.submit(notify, 1)
@@ -0,0 +1,116 @@
+"""Test binding.py
+
+A binding plan must never accept arguments that Signature.bind rejects. These tests
+check can_bind against Signature.bind for a range of signatures and arguments.
+"""
+from inspect import signature
+from itertools import product
+from typing import Any, Callable, Dict, List
+
+import pytest
+
+from jsonrpcserver.binding import can_bind, get_binding_plan, make_binding_plan
+
+# pylint: disable=missing-function-docstring,missing-class-docstring,too-few-public-methods,unused-argument,invalid-name
+
+
+def no_args() -> None:
+    pass
+
+
+def one_arg(a: Any) -> None:
+    pass
+
+
+def default_arg(a: Any, b: Any = None) -> None:
+    pass
+
+
+def var_args(a: Any, *args: Any) -> None:
+    pass
+
+
+def var_kwargs(a: Any, **kwargs: Any) -> None:
+    pass
+
+
+def keyword_only(a: Any, *, b: Any, c: Any = None) -> None:
+    pass
+
+
+def positional_only(a: Any, /, b: Any = None) -> None:
+    pass
+
+
+def positional_only_var_kwargs(a: Any, /, **kwargs: Any) -> None:
+    pass
+
+
+def everything(a: Any, /, b: Any, *args: Any, c: Any, d: Any = None, **kw: Any) -> None:
+    pass
+
+
+FUNCS: List[Callable[..., Any]] = [
+    no_args,
+    one_arg,
+    default_arg,
+    var_args,
+    var_kwargs,
+    keyword_only,
+    positional_only,
+    positional_only_var_kwargs,
+    everything,
+    lambda *args, **kwargs: None,
+]
+
+ARGS: List[List[Any]] = [[], [1], [1, 2], [1, 2, 3]]
+
+KWARGS: List[Dict[str, Any]] = [
+    {},
+    {"a": 1},
+    {"b": 1},
+    {"a": 1, "b": 2},
+    {"b": 1, "c": 2},
+    {"a": 1, "b": 2, "c": 3},
+    {"x": 1},
+    {"a": 1, "x": 1},
+]
+
+
+def binds(func: Callable[..., Any], args: List[Any], kwargs: Dict[str, Any]) -> bool:
+    try:
+        signature(func).bind(*args, **kwargs)
+    except TypeError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("func", FUNCS)
+def test_can_bind(func: Callable[..., Any]) -> None:
+    plan = make_binding_plan(func)
+    for args, kwargs in product(ARGS, KWARGS):
+        # JSON-RPC params are positional or keyword, not both. The only case with both
+        # is when a context is passed as the first argument.
+        if kwargs and len(args) > 1:
+            continue
+        expected = binds(func, args, kwargs)
+        assert can_bind(plan, len(args), kwargs) == expected, (args, kwargs)
+
+
+def test_get_binding_plan_is_cached() -> None:
+    assert get_binding_plan(one_arg) is get_binding_plan(one_arg)
+
+
+def test_get_binding_plan_unhashable() -> None:
+    class Unhashable:
+        __hash__ = None  # type: ignore
+
+        def __call__(self) -> None:
+            pass
+
+    assert get_binding_plan(Unhashable()).max_args == 0
+
+
+def test_get_binding_plan_not_callable() -> None:
+    with pytest.raises(TypeError):
+        get_binding_plan(1)  # type: ignore
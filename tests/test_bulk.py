@@ -0,0 +1,140 @@
+"""Test bulk.py"""
+import io
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+
+from jsonrpcserver.bulk import (
+    BulkStats,
+    Chunk,
+    bulk_dispatch,
+    dispatch_chunk,
+    main,
+    read_chunks,
+)
+from jsonrpcserver.main import dispatch_to_bytes
+from jsonrpcserver.methods import method
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring
+
+
+@method(name="bulk_square")
+def square(value: int) -> Result:
+    return Success(value * value)
+
+
+METHODS = {"square": square}
+
+
+def request(value: int, id_: object = None) -> bytes:
+    data: Dict[str, Any] = {"jsonrpc": "2.0", "method": "square", "params": [value]}
+    if id_ is not None:
+        data["id"] = id_
+    return json.dumps(data).encode() + b"\n"
+
+
+def test_read_chunks() -> None:
+    file = io.BytesIO(b"a\nb\nc\n")
+    assert list(read_chunks(file, 3)) == [
+        Chunk(1, [b"a\n", b"b\n"]),
+        Chunk(3, [b"c\n"]),
+    ]
+
+
+def test_dispatch_chunk() -> None:
+    assert dispatch_chunk(
+        Chunk(1, [request(2, 1), b"\n", request(3), request(4, 2)]), methods=METHODS
+    ) == (
+        3,
+        b'{"jsonrpc": "2.0", "result": 4, "id": 1}\n'
+        b'{"jsonrpc": "2.0", "result": 16, "id": 2}\n',
+    )
+
+
+def test_dispatch_chunk_line_numbers() -> None:
+    assert dispatch_chunk(
+        Chunk(5, [request(2, 1), request(3), request(4, 2)]),
+        methods=METHODS,
+        line_numbers=True,
+    ) == (
+        3,
+        b'{"line": 5, "response": {"jsonrpc": "2.0", "result": 4, "id": 1}}\n'
+        b'{"line": 7, "response": {"jsonrpc": "2.0", "result": 16, "id": 2}}\n',
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_bulk_dispatch(workers: int) -> None:
+    requests = [request(i, i) for i in range(100)]
+    output = io.BytesIO()
+    stats = bulk_dispatch(
+        io.BytesIO(b"".join(requests)),
+        output,
+        METHODS,
+        workers=workers,
+        chunk_size=200,
+    )
+    assert output.getvalue().splitlines() == [
+        dispatch_to_bytes(r, METHODS) for r in requests
+    ]
+    assert stats.requests == 100
+
+
+def test_bulk_dispatch_unordered() -> None:
+    output = io.BytesIO()
+    bulk_dispatch(
+        io.BytesIO(b"".join(request(i, i) for i in range(100))),
+        output,
+        METHODS,
+        workers=3,
+        ordered=False,
+        line_numbers=True,
+        chunk_size=200,
+    )
+    lines = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert sorted((line["line"], line["response"]["result"]) for line in lines) == [
+        (i + 1, i * i) for i in range(100)
+    ]
+
+
+def test_bulk_dispatch_unordered_requires_line_numbers() -> None:
+    with pytest.raises(ValueError):
+        bulk_dispatch(io.BytesIO(), io.BytesIO(), METHODS, ordered=False)
+
+
+def test_main_unordered_requires_line_numbers(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    with pytest.raises(SystemExit):
+        main(["--unordered"])
+    assert "--unordered requires --line-numbers" in capsys.readouterr().err
+
+
+def test_bulk_stats_rate() -> None:
+    assert BulkStats(100, 2.0).rate == 50.0
+    assert BulkStats(0, 0.0).rate == 0.0
+
+
+def test_main(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    (tmp_path / "in.jsonl").write_bytes(
+        b'{"jsonrpc": "2.0", "method": "bulk_square", "params": [3], "id": 1}\n'
+    )
+    main(
+        [
+            str(tmp_path / "in.jsonl"),
+            "-o",
+            str(tmp_path / "out.jsonl"),
+            "--methods",
+            "tests.test_bulk",
+            "--workers",
+            "2",
+            "--line-numbers",
+        ]
+    )
+    assert (tmp_path / "out.jsonl").read_bytes() == (
+        b'{"line": 1, "response": {"jsonrpc": "2.0", "result": 9, "id": 1}}\n'
+    )
+    assert "Dispatched 1 requests" in capsys.readouterr().err
@@ -0,0 +1,161 @@
+"""Test cache.py"""
+from typing import Any, List
+from unittest.mock import patch
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.cache import Cache, CacheStats, canonical_key
+from jsonrpcserver.either import Left, Right
+from jsonrpcserver.main import dispatch
+from jsonrpcserver.methods import method
+from jsonrpcserver.result import Error, ErrorResult, Result, Success, SuccessResult
+
+# pylint: disable=missing-function-docstring
+
+SUCCESS = Right(SuccessResult(1))
+
+
+def request(params: Any, id_: int = 1) -> str:
+    return f'{{"jsonrpc": "2.0", "method": "double", "params": {params}, "id": {id_}}}'
+
+
+def test_canonical_key() -> None:
+    assert canonical_key({"a": 1, "b": 2}) == canonical_key({"b": 2, "a": 1})
+    assert canonical_key([1]) != canonical_key([True])
+    assert canonical_key([1]) != canonical_key([1.0])
+
+
+def test_get_and_put() -> None:
+    cache = Cache()
+    assert cache.get("key") is None
+    cache.put("key", SUCCESS)
+    assert cache.get("key") is SUCCESS
+    assert cache.stats() == CacheStats(hits=1, misses=1, size=1)
+    assert cache.stats().hit_rate == 0.5
+
+
+def test_errors_not_cached() -> None:
+    cache = Cache()
+    cache.put("key", Left(ErrorResult(1, "Failed")))
+    assert cache.stats().size == 0
+
+
+def test_lru_eviction() -> None:
+    cache = Cache(max_entries=2)
+    cache.put("a", SUCCESS)
+    cache.put("b", SUCCESS)
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", SUCCESS)
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_ttl() -> None:
+    cache = Cache(ttl=10)
+    with patch("jsonrpcserver.cache.time.monotonic", return_value=100.0):
+        cache.put("key", SUCCESS)
+    with patch("jsonrpcserver.cache.time.monotonic", return_value=110.0):
+        assert cache.get("key") is SUCCESS
+    with patch("jsonrpcserver.cache.time.monotonic", return_value=110.1):
+        assert cache.get("key") is None
+    assert cache.stats().size == 0
+
+
+def test_invalidate_and_clear() -> None:
+    cache = Cache()
+    cache.put(canonical_key([1]), SUCCESS)
+    cache.put(canonical_key([2]), SUCCESS)
+    cache.invalidate([1])
+    assert cache.get(canonical_key([1])) is None
+    cache.clear()
+    assert cache.stats().size == 0
+
+
+def test_dispatch() -> None:
+    calls: List[int] = []
+    cache = Cache()
+
+    @method(cache=cache)
+    def double(number: int) -> Result:
+        calls.append(number)
+        return Success(number * 2)
+
+    methods = {"double": double}
+    assert dispatch(request("[2]"), methods) == dispatch(request("[2]"), methods)
+    assert dispatch(request("[2]", 2), methods) == (
+        '{"jsonrpc": "2.0", "result": 4, "id": 2}'
+    )
+    dispatch(request("[3]"), methods)
+    assert calls == [2, 3]
+    assert cache.stats() == CacheStats(hits=2, misses=2, size=2)
+    cache.invalidate([2])
+    dispatch(request("[2]"), methods)
+    assert calls == [2, 3, 2]
+
+
+def test_dispatch_invalid_params_not_cached() -> None:
+    cache = Cache()
+
+    @method(cache=cache)
+    def double(number: int) -> Result:
+        return Success(number * 2)
+
+    assert '"code": -32602' in dispatch(request("[1, 2]"), {"double": double})
+    assert cache.stats() == CacheStats(hits=0, misses=0, size=0)
+
+
+def test_dispatch_error_not_cached() -> None:
+    calls: List[int] = []
+
+    @method(cache=Cache())
+    def double(number: int) -> Result:
+        calls.append(number)
+        return Error(1, "Failed")
+
+    dispatch(request("[2]"), {"double": double})
+    dispatch(request("[2]"), {"double": double})
+    assert calls == [2, 2]
+
+
+def test_one_method_per_cache() -> None:
+    cache = Cache()
+
+    def double(number: int) -> Result:
+        return Success(number * 2)
+
+    def triple(number: int) -> Result:
+        return Success(number * 3)
+
+    method(name="double", cache=cache)(double)
+    method(name="twice", cache=cache)(double)  # The same function is fine
+    with pytest.raises(ValueError):
+        method(cache=cache)(triple)
+
+
+def test_dispatch_key_function() -> None:
+    calls: List[int] = []
+
+    @method(cache=Cache(key=lambda params: str(params["number"])))
+    def double(number: int, verbose: bool = False) -> Result:
+        calls.append(number)
+        return Success(f"{number * 2}" if verbose else number * 2)
+
+    dispatch(request('{"number": 2}'), {"double": double})
+    dispatch(request('{"number": 2, "verbose": true}'), {"double": double})
+    assert calls == [2]
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch() -> None:
+    calls: List[int] = []
+    cache = Cache()
+
+    @method(cache=cache)
+    async def double(number: int) -> Result:
+        calls.append(number)
+        return Success(number * 2)
+
+    first = await async_dispatch(request("[2]"), {"double": double})
+    assert first == await async_dispatch(request("[2]"), {"double": double})
+    assert calls == [2]
+    assert cache.stats() == CacheStats(hits=1, misses=1, size=1)
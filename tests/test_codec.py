@@ -0,0 +1,85 @@
+"""Test codec.py"""
+import json
+
+import pytest
+
+from jsonrpcserver.codec import Codec, Codecs, codecs, fastest_codec, json_codec
+from jsonrpcserver.main import dispatch_to_bytes
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring
+
+REQUEST = '{"jsonrpc": "2.0", "method": "ping", "params": ["a/b"], "id": 1}'
+
+
+def ping(value: str) -> Result:
+    return Success(value)
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+@pytest.mark.parametrize(
+    "request_", [REQUEST, REQUEST.encode(), bytearray(REQUEST.encode())]
+)
+def test_codec_loads(codec: Codec, request_: str) -> None:
+    assert codec.loads(request_) == json.loads(REQUEST)
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+def test_codec_loads_memoryview(codec: Codec) -> None:
+    assert codec.loads(memoryview(REQUEST.encode())) == json.loads(REQUEST)
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+def test_codec_dumps(codec: Codec) -> None:
+    response = {"jsonrpc": "2.0", "result": "a/b", "id": 1}
+    assert json.loads(codec.dumps(response)) == response
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+def test_dispatch_to_bytes_with_codec(codec: Codec) -> None:
+    assert json.loads(
+        dispatch_to_bytes(REQUEST.encode(), {"ping": ping}, codec=codec)
+    ) == {"jsonrpc": "2.0", "result": "a/b", "id": 1}
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+def test_dispatch_to_bytes_with_codec_parse_error(codec: Codec) -> None:
+    response = json.loads(dispatch_to_bytes(b"{", {"ping": ping}, codec=codec))
+    assert response["error"]["code"] == -32700
+
+
+def test_json_codec_is_always_available() -> None:
+    assert codecs["json"] is json_codec
+
+
+def test_codecs_delete() -> None:
+    def load() -> Codec:
+        raise AssertionError("Not loaded")
+
+    registered = Codecs({"json": json_codec}, {"lazy": load})
+    del registered["lazy"]
+    del registered["json"]
+    assert not registered
+    with pytest.raises(KeyError):
+        del registered["json"]
+
+
+def test_fastest_codec() -> None:
+    assert fastest_codec in codecs.values()
+
+
+@pytest.mark.parametrize("codec", codecs.values())
+def test_dispatch_to_bytes_with_codec_batch(codec: Codec) -> None:
+    not_found = '{"jsonrpc": "2.0", "method": "foo", "id": 2}'
+    assert json.loads(
+        dispatch_to_bytes(
+            f"[{REQUEST}, {not_found}]".encode(), {"ping": ping}, codec=codec
+        )
+    ) == [
+        {"jsonrpc": "2.0", "result": "a/b", "id": 1},
+        {
+            "jsonrpc": "2.0",
+            "error": {"code": -32601, "message": "Method not found", "data": "foo"},
+            "id": 2,
+        },
+    ]
@@ -3,11 +3,12 @@
 TODO: Add tests for dispatch_requests (non-pure version)
 """
 import json
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
 from typing import Any, Callable, Dict
 from unittest.mock import Mock, patch, sentinel
 
 import pytest
-from oslash.either import Left, Right  # type: ignore
 
 from jsonrpcserver.codes import (
     ERROR_INTERNAL_ERROR,
@@ -30,8 +31,10 @@ from jsonrpcserver.dispatcher import (
     not_notification,
     to_response,
     validate_args,
+    validate_batch_size,
     validate_request,
 )
+from jsonrpcserver.either import Left, Right
 from jsonrpcserver.exceptions import JsonRpcError
 from jsonrpcserver.main import (
     default_deserializer,
@@ -118,7 +121,10 @@ def test_to_response_InvalidParams_no_data() -> None:
 
 def test_to_response_notification() -> None:
     with pytest.raises(AssertionError):
-        to_response(Request("ping", [], NOID), SuccessResult(result=sentinel.result))
+        to_response(
+            Request("ping", [], NOID),
+            SuccessResult(result=sentinel.result),  # type: ignore
+        )
 
 
 # extract_args
@@ -314,6 +320,47 @@ def test_dispatch_deserialized() -> None:
     ) == Right(SuccessResponse("pong", 1))
 
 
+def test_dispatch_deserialized_executor() -> None:
+    barrier = Barrier(3, timeout=5)
+
+    def wait(value: int) -> Result:
+        barrier.wait()  # Only passes if all three run at the same time
+        return Success(value)
+
+    with ThreadPoolExecutor(3) as executor:
+        assert dispatch_deserialized(
+            methods={"wait": wait},
+            context=NOCONTEXT,
+            post_process=identity,
+            deserialized=[
+                {"jsonrpc": "2.0", "method": "wait", "params": [1], "id": 1},
+                {"jsonrpc": "2.0", "method": "wait", "params": [2]},
+                {"jsonrpc": "2.0", "method": "wait", "params": [3], "id": 3},
+            ],
+            executor=executor,
+        ) == [Right(SuccessResponse(1, 1)), Right(SuccessResponse(3, 3))]
+
+
+# validate_batch_size
+
+
+def test_validate_batch_size() -> None:
+    request = [{"jsonrpc": "2.0", "method": "ping"}] * 2
+    assert validate_batch_size(2, request) == Right(request)
+    assert validate_batch_size(None, request) == Right(request)
+
+
+def test_validate_batch_size_exceeded() -> None:
+    assert validate_batch_size(1, [{}, {}]) == Left(
+        ErrorResponse(
+            ERROR_INVALID_REQUEST,
+            "Invalid request",
+            "The batch exceeds the maximum of 1 requests",
+            None,
+        )
+    )
+
+
 # validate_request
 
 
@@ -0,0 +1,48 @@
+"""Test either.py"""
+from jsonrpcserver.either import Left, Right
+
+# pylint: disable=missing-function-docstring
+
+
+def test_left() -> None:
+    assert Left(1)._error == 1  # pylint: disable=protected-access
+
+
+def test_left_bind() -> None:
+    assert Left(1).bind(lambda x: Right(x + 1)) == Left(1)
+
+
+def test_left_map() -> None:
+    assert Left(1).map(lambda x: x + 1) == Left(1)
+
+
+def test_left_eq() -> None:
+    assert Left(1) == Left(1)
+    assert Left(1) != Left(2)
+    assert Left(1) != Right(1)
+
+
+def test_left_repr() -> None:
+    assert repr(Left(1)) == "Left(1)"
+
+
+def test_right() -> None:
+    assert Right(1)._value == 1  # pylint: disable=protected-access
+
+
+def test_right_bind() -> None:
+    assert Right(1).bind(lambda x: Right(x + 1)) == Right(2)
+
+
+def test_right_map() -> None:
+    assert Right(1).map(lambda x: x + 1) == Right(2)
+
+
+def test_right_eq() -> None:
+    assert Right(1) == Right(1)
+    assert Right(1) != Right(2)
+    assert Right(1) != Left(1)
+
+
+def test_right_repr() -> None:
+    assert repr(Right(1)) == "Right(1)"
@@ -0,0 +1,112 @@
+"""Test hooks.py"""
+from typing import Iterator, List, Tuple
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.either import Left, Right
+from jsonrpcserver.hooks import (
+    Timing,
+    add_hook,
+    describe,
+    error_code,
+    hooks,
+    remove_hook,
+)
+from jsonrpcserver.main import dispatch, dispatch_to_bytes
+from jsonrpcserver.result import ErrorResult, Result, Success
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+SINGLE = '{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+BATCH = (
+    '[{"jsonrpc": "2.0", "method": "ping", "id": 1},'
+    ' {"jsonrpc": "2.0", "method": "missing", "id": 2}]'
+)
+STAGES = ["deserialize", "validate", "lookup", "bind", "call", "post_process"]
+
+
+def ping() -> Result:
+    return Success("pong")
+
+
+async def async_ping() -> Result:
+    return Success("pong")
+
+
+@pytest.fixture
+def timings() -> Iterator[List[Timing]]:
+    recorded: List[Timing] = []
+    add_hook(recorded.append)
+    yield recorded
+    remove_hook(recorded.append)
+
+
+def tags(timings: List[Timing]) -> List[Tuple[str, object, object]]:
+    return [(t.stage, t.method, t.batch_size) for t in timings]
+
+
+def test_add_and_remove_hook() -> None:
+    add_hook(print)
+    assert hooks == [print]
+    remove_hook(print)
+    assert not hooks
+
+
+def test_single(timings: List[Timing]) -> None:
+    dispatch(SINGLE, {"ping": ping})
+    assert tags(timings) == [
+        *((stage, "ping", None) for stage in STAGES),
+        ("serialize", None, None),
+    ]
+    assert all(t.seconds >= 0 for t in timings)
+
+
+def test_batch(timings: List[Timing]) -> None:
+    dispatch(BATCH, {"ping": ping})
+    assert tags(timings) == [
+        ("deserialize", None, 2),
+        ("validate", None, 2),
+        ("lookup", "ping", 2),
+        ("bind", "ping", 2),
+        ("call", "ping", 2),
+        ("post_process", "ping", 2),
+        ("lookup", "missing", 2),
+        ("post_process", "missing", 2),
+        ("serialize", None, None),
+    ]
+
+
+def test_parse_error(timings: List[Timing]) -> None:
+    dispatch_to_bytes("{", {})
+    assert tags(timings) == [("deserialize", None, None), ("serialize", None, None)]
+    assert timings[0].error == -32700
+
+
+def test_errors_and_sizes(timings: List[Timing]) -> None:
+    response = dispatch_to_bytes(BATCH, {"ping": ping})
+    errors = {t.stage: t.error for t in timings if t.method == "missing"}
+    assert errors == {"lookup": -32601, "post_process": None}
+    assert timings[0].size == len(BATCH)
+    assert timings[-1].size == len(response)
+
+
+@pytest.mark.asyncio
+async def test_async(timings: List[Timing]) -> None:
+    await async_dispatch(SINGLE, {"ping": async_ping})
+    assert tags(timings) == [
+        *((stage, "ping", None) for stage in STAGES),
+        ("serialize", None, None),
+    ]
+
+
+def test_error_code() -> None:
+    assert error_code(Left(ErrorResult(-32601, "Method not found"))) == -32601
+    assert error_code(Right(Success("pong"))) is None
+
+
+def test_describe() -> None:
+    assert describe({"method": "ping"}) == ("ping", None)
+    assert describe([{}, {}]) == (None, 2)
+    assert describe({"method": 1}) == (None, None)
+    assert describe(None) == (None, None)
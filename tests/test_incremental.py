@@ -0,0 +1,124 @@
+"""Test incremental.py"""
+import asyncio
+import io
+import json
+from typing import AsyncIterator, List
+
+import pytest
+
+from jsonrpcserver.incremental import (
+    ArraySplitter,
+    read_chunks,
+    read_chunks_async,
+    split,
+    split_async,
+)
+
+# pylint: disable=missing-function-docstring
+
+BATCH = b'[{"a": [1, {"b": "]},\\"["}]}, "x,y", 2 ,\n{"c": {}}]'
+ELEMENTS = [b'{"a": [1, {"b": "]},\\"["}]}', b' "x,y"', b" 2 ", b'\n{"c": {}}']
+
+
+def chunked(data: bytes, size: int) -> List[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", range(1, len(BATCH) + 1))
+def test_split_any_chunk_size(size: int) -> None:
+    splitter = ArraySplitter()
+    assert list(split(splitter, chunked(BATCH, size))) == ELEMENTS
+    assert splitter.is_batch is True
+    assert [json.loads(element) for element in ELEMENTS] == json.loads(BATCH)
+
+
+def test_feed_gives_completed_elements() -> None:
+    splitter = ArraySplitter()
+    assert list(splitter.feed(b'[{"id": 1}, {"i')) == [b'{"id": 1}']
+    assert list(splitter.feed(b'd": 2}]')) == [b' {"id": 2}']
+    assert not list(splitter.close())
+
+
+def test_feed_resumes_inside_string() -> None:
+    splitter = ArraySplitter()
+    assert not list(splitter.feed(b'[{"a": "' + b"x" * 1000))
+    # Scanned to the end, not left at the opening quote
+    assert splitter.pos == len(splitter.buffer)
+    assert not list(splitter.feed(b"x\\"))
+    assert splitter.pos == len(splitter.buffer) - 1  # The escape isn't complete
+    assert list(splitter.feed(b'"x"}, 1]')) == [
+        b'{"a": "' + b"x" * 1001 + b'\\"x"}',
+        b" 1",
+    ]
+
+
+def test_feed_discards_consumed() -> None:
+    splitter = ArraySplitter()
+    list(splitter.feed(b'[{"id": 1}, {"id": 2}, {"i'))
+    assert splitter.buffer == b' {"i'
+
+
+def test_split_empty_batch() -> None:
+    splitter = ArraySplitter()
+    assert not list(split(splitter, [b" [ ", b"] "]))
+    assert splitter.is_batch is True
+
+
+def test_split_not_a_batch() -> None:
+    splitter = ArraySplitter()
+    assert list(split(splitter, [b' {"id"', b": 1}"])) == [b' {"id": 1}']
+    assert splitter.is_batch is False
+
+
+def test_split_empty() -> None:
+    assert list(split(ArraySplitter(), [])) == [b""]
+
+
+@pytest.mark.parametrize(
+    "data,message",
+    [
+        (b"[1,]", "Expecting a value in the batch"),
+        (b"[,1]", "Expecting a value in the batch"),
+        (b"[1,,2]", "Expecting a value in the batch"),
+        (b"[1] 2", "Extra data after the batch"),
+        (b"[1, 2", "Unterminated batch"),
+        (b'[1, "2]', "Unterminated batch"),
+    ],
+)
+def test_split_malformed(data: bytes, message: str) -> None:
+    *elements, error = split(ArraySplitter(), chunked(data, 1))
+    assert all(isinstance(element, bytes) for element in elements)
+    assert isinstance(error, ValueError)
+    assert str(error) == message
+
+
+def test_read_chunks_file() -> None:
+    assert list(read_chunks(io.BytesIO(b"abcde"), 2)) == [b"ab", b"cd", b"e"]
+
+
+def test_read_chunks_iterable() -> None:
+    assert list(read_chunks(iter([b"ab", b"c"]))) == [b"ab", b"c"]
+
+
+@pytest.mark.asyncio
+async def test_read_chunks_async_stream_reader() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"abcde")
+    reader.feed_eof()
+    assert [chunk async for chunk in read_chunks_async(reader, 2)] == [
+        b"ab",
+        b"cd",
+        b"e",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_split_async() -> None:
+    async def chunks() -> AsyncIterator[bytes]:
+        for chunk in chunked(BATCH, 3):
+            yield chunk
+
+    splitter = ArraySplitter()
+    assert [
+        element async for element in split_async(splitter, read_chunks_async(chunks()))
+    ] == ELEMENTS
@@ -0,0 +1,44 @@
+"""Test __init__.py"""
+import subprocess
+import sys
+
+import pytest
+
+import jsonrpcserver
+
+# pylint: disable=missing-function-docstring
+
+
+def test_lazy_names() -> None:
+    for name in jsonrpcserver.__all__:
+        assert getattr(jsonrpcserver, name) is not None
+        assert name in dir(jsonrpcserver)
+
+
+def test_unknown_name() -> None:
+    with pytest.raises(AttributeError):
+        getattr(jsonrpcserver, "nonexistent")
+
+
+HEAVY_MODULES = "{'asyncio', 'http.server', 'jsonschema', 'orjson', 'ujson'}"
+
+
+def imported_heavy_modules(code: str) -> str:
+    """Run code in a fresh interpreter, giving the heavy modules it imported."""
+    code += f"\nimport sys\nprint(sorted({HEAVY_MODULES} & set(sys.modules)))"
+    return subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+
+
+def test_sync_dispatch_imports_no_heavy_modules() -> None:
+    code = (
+        "from jsonrpcserver import dispatch, method, Success\n"
+        "method(lambda: Success('pong'), name='ping')\n"
+        'dispatch(\'{"jsonrpc": "2.0", "method": "ping", "id": 1}\')'
+    )
+    assert imported_heavy_modules(code) == "[]\n"
+
+
+def test_main_imports_no_heavy_modules() -> None:
+    assert imported_heavy_modules("import jsonrpcserver.main") == "[]\n"
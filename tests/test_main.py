@@ -1,10 +1,20 @@
 """Test main.py"""
-from oslash.either import Right  # type: ignore
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List
 
+from jsonrpcserver.either import Right
 from jsonrpcserver.main import (
+    dispatch_incremental,
+    dispatch_to_bytes,
+    dispatch_to_bytes_stream,
     dispatch_to_json,
     dispatch_to_response,
+    dispatch_to_response_stream,
     dispatch_to_serializable,
+    get_thread_pool,
 )
 from jsonrpcserver.response import SuccessResponse
 from jsonrpcserver.result import Result, Success
@@ -22,6 +32,21 @@ def test_dispatch_to_response() -> None:
     ) == Right(SuccessResponse("pong", 1))
 
 
+def test_dispatch_to_response_max_workers() -> None:
+    start = time.perf_counter()
+    assert dispatch_to_response(
+        '[{"jsonrpc": "2.0", "method": "sleep", "params": [0.2], "id": 1},'
+        ' {"jsonrpc": "2.0", "method": "sleep", "params": [0.1], "id": 2}]',
+        {"sleep": sleep},
+        max_workers=2,
+    ) == [Right(SuccessResponse(0.2, 1)), Right(SuccessResponse(0.1, 2))]
+    assert time.perf_counter() - start < 0.3
+
+
+def test_get_thread_pool() -> None:
+    assert get_thread_pool(2) is get_thread_pool(2)
+
+
 def test_dispatch_to_serializable() -> None:
     assert dispatch_to_serializable(
         '{"jsonrpc": "2.0", "method": "ping", "id": 1}', {"ping": ping}
@@ -41,3 +66,161 @@ def test_dispatch_to_json_notification() -> None:
     assert (
         dispatch_to_json('{"jsonrpc": "2.0", "method": "ping"}', {"ping": ping}) == ""
     )
+
+
+def test_dispatch_to_bytes() -> None:
+    assert (
+        dispatch_to_bytes(
+            b'{"jsonrpc": "2.0", "method": "ping", "id": 1}', {"ping": ping}
+        )
+        == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    )
+
+
+def test_dispatch_to_bytes_memoryview() -> None:
+    assert (
+        dispatch_to_bytes(
+            memoryview(b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'),
+            {"ping": ping},
+        )
+        == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    )
+
+
+def test_dispatch_to_bytes_notification() -> None:
+    assert (
+        dispatch_to_bytes(b'{"jsonrpc": "2.0", "method": "ping"}', {"ping": ping})
+        == b""
+    )
+
+
+def sleep(seconds: float) -> Result:
+    time.sleep(seconds)
+    return Success(seconds)
+
+
+def sleeps(*seconds: float) -> str:
+    """A batch of sleep requests, the last a notification."""
+    return json.dumps(
+        [
+            {"jsonrpc": "2.0", "method": "sleep", "params": [s], "id": i}
+            for i, s in enumerate(seconds)
+        ]
+        + [{"jsonrpc": "2.0", "method": "sleep", "params": [0]}]
+    )
+
+
+def test_dispatch_to_response_stream_is_lazy() -> None:
+    called: List[int] = []
+
+    def record(value: int) -> Result:
+        called.append(value)
+        return Success(value)
+
+    responses = dispatch_to_response_stream(
+        '[{"jsonrpc": "2.0", "method": "record", "params": [1], "id": 1},'
+        ' {"jsonrpc": "2.0", "method": "record", "params": [2], "id": 2}]',
+        {"record": record},
+    )
+    assert next(responses) == Right(SuccessResponse(1, 1))
+    assert called == [1]
+    assert list(responses) == [Right(SuccessResponse(2, 2))]
+
+
+def test_dispatch_to_response_stream_ordered() -> None:
+    assert list(
+        dispatch_to_response_stream(sleeps(0.1, 0), {"sleep": sleep}, max_workers=2)
+    ) == [Right(SuccessResponse(0.1, 0)), Right(SuccessResponse(0, 1))]
+
+
+def test_dispatch_to_response_stream_unordered() -> None:
+    with ThreadPoolExecutor(3) as executor:
+        assert list(
+            dispatch_to_response_stream(
+                sleeps(0.1, 0), {"sleep": sleep}, executor=executor, ordered=False
+            )
+        ) == [Right(SuccessResponse(0, 1)), Right(SuccessResponse(0.1, 0))]
+
+
+def test_dispatch_to_bytes_stream() -> None:
+    request = sleeps(0, 0)
+    chunks = list(dispatch_to_bytes_stream(request, {"sleep": sleep}))
+    assert len(chunks) == 3
+    assert b"".join(chunks) == dispatch_to_bytes(request, {"sleep": sleep})
+
+
+def test_dispatch_to_bytes_stream_parse_error() -> None:
+    assert list(dispatch_to_bytes_stream(b"{", {})) == [dispatch_to_bytes(b"{", {})]
+
+
+def test_dispatch_incremental() -> None:
+    request = sleeps(0, 0).encode()
+    chunks = list(
+        dispatch_incremental(io.BytesIO(request), {"sleep": sleep}, chunk_size=5)
+    )
+    assert len(chunks) == 3
+    assert b"".join(chunks) == dispatch_to_bytes(request, {"sleep": sleep})
+
+
+def test_dispatch_incremental_dispatches_as_read() -> None:
+    called: List[int] = []
+
+    def record(value: int) -> Result:
+        called.append(value)
+        return Success(value)
+
+    def chunks() -> Iterator[bytes]:
+        yield b'[{"jsonrpc": "2.0", "method": "record", "params": [1], "id": 1},'
+        assert called == [1]
+        yield b' {"jsonrpc": "2.0", "method": "record", "params": [2], "id": 2}]'
+
+    assert b"".join(dispatch_incremental(chunks(), {"record": record})) == (
+        b'[{"jsonrpc": "2.0", "result": 1, "id": 1},'
+        b' {"jsonrpc": "2.0", "result": 2, "id": 2}]'
+    )
+
+
+def test_dispatch_incremental_invalid_requests() -> None:
+    response = json.loads(
+        b"".join(
+            dispatch_incremental(
+                [b'[{"jsonrpc": "2.0", "method": "ping", "id": 1}, 1, [], {x}]'],
+                {"ping": ping},
+            )
+        )
+    )
+    assert [r.get("result") or r["error"]["code"] for r in response] == [
+        "pong",
+        -32600,
+        -32600,
+        -32700,
+    ]
+
+
+def test_dispatch_incremental_malformed_batch() -> None:
+    response = json.loads(
+        b"".join(
+            dispatch_incremental(
+                [b'[{"jsonrpc": "2.0", "method": "ping", "id": 1}, '], {"ping": ping}
+            )
+        )
+    )
+    assert response[1]["error"] == {
+        "code": -32700,
+        "message": "Parse error",
+        "data": "Unterminated batch",
+    }
+
+
+def test_dispatch_incremental_not_a_batch() -> None:
+    for request in [b'{"jsonrpc": "2.0", "method": "ping", "id": 1}', b"[]", b"{", b""]:
+        assert b"".join(
+            dispatch_incremental([request], {"ping": ping})
+        ) == dispatch_to_bytes(request, {"ping": ping})
+
+
+def test_dispatch_incremental_notifications() -> None:
+    responses = dispatch_incremental(
+        [b'[{"jsonrpc": "2.0", "method": "ping"}]'], {"ping": ping}
+    )
+    assert not list(responses)
@@ -1,5 +1,13 @@
 """Test methods.py"""
-from jsonrpcserver.methods import global_methods, method
+import pytest
+
+from jsonrpcserver.methods import (
+    DEFAULT_OPTIONS,
+    MethodOptions,
+    get_options,
+    global_methods,
+    method,
+)
 
 # pylint: disable=missing-function-docstring
 
@@ -18,3 +26,64 @@ def test_decorator_custom_name() -> None:
         pass
 
     assert callable(global_methods["new_name"])
+
+
+def test_decorator_options() -> None:
+    @method(timeout=2.0)
+    def func() -> None:
+        pass
+
+    assert get_options(global_methods["func"]) == MethodOptions(timeout=2.0)
+
+
+def test_get_options_default() -> None:
+    assert get_options(lambda: None) is DEFAULT_OPTIONS
+
+
+def test_get_options_bound_method() -> None:
+    class Class:  # pylint: disable=too-few-public-methods
+        """Has a method with options."""
+
+        @method(name="bound", timeout=1.0)
+        def func(self) -> None:
+            pass
+
+    assert get_options(Class().func) == MethodOptions(timeout=1.0)
+
+
+def test_decorator_options_bound_method() -> None:
+    class Class:  # pylint: disable=too-few-public-methods
+        """Has a method."""
+
+        def func(self) -> str:
+            return "result"
+
+    method(Class().func, name="bound", timeout=1.0)
+    assert get_options(global_methods["bound"]) == MethodOptions(timeout=1.0)
+    assert global_methods["bound"]() == "result"
+
+
+def test_decorator_options_per_name() -> None:
+    def func() -> None:
+        pass
+
+    method(func, name="one", timeout=1.0)
+    method(func, name="two", timeout=2.0)
+    assert get_options(global_methods["one"]) == MethodOptions(timeout=1.0)
+    assert get_options(global_methods["two"]) == MethodOptions(timeout=2.0)
+    # The function itself is left alone
+    assert get_options(func) is DEFAULT_OPTIONS
+    assert not func.__dict__
+
+
+def test_decorator_unknown_executor() -> None:
+    with pytest.raises(ValueError):
+        method(executor="gpu")
+
+
+def test_decorator_process_executor_coroutine() -> None:
+    async def func() -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        method(func, executor="process")
@@ -0,0 +1,249 @@
+"""Test metrics.py"""
+import asyncio
+import json
+import threading
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import patch
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.main import dispatch
+from jsonrpcserver.metrics import (
+    Exporter,
+    Histogram,
+    Registry,
+    install,
+    merge,
+    registry,
+    render,
+    uninstall,
+)
+from jsonrpcserver.result import Error, Result, Success
+
+# pylint: disable=missing-function-docstring,redefined-outer-name,unused-argument
+
+BATCH = (
+    '[{"jsonrpc": "2.0", "method": "ping", "id": 1},'
+    ' {"jsonrpc": "2.0", "method": "fail", "id": 2},'
+    ' {"jsonrpc": "2.0", "method": "missing", "id": 3}]'
+)
+
+
+def ping() -> Result:
+    return Success("pong")
+
+
+def fail() -> Result:
+    return Error(1, "Failed")
+
+
+async def async_sleep() -> Result:
+    await asyncio.sleep(10)
+    return Success()
+
+
+@pytest.fixture
+def installed() -> Iterator[None]:
+    install()
+    registry.clear()
+    yield
+    uninstall()
+    registry.clear()
+
+
+def test_inc_and_get() -> None:
+    reg = Registry()
+    reg.inc("jsonrpc_calls_total", (("method", "ping"),))
+    reg.inc("jsonrpc_calls_total", (("method", "ping"),), 2)
+    assert reg.get("jsonrpc_calls_total", method="ping") == 3.0
+    assert reg.get("jsonrpc_calls_total", method="other") is None
+
+
+def test_observe() -> None:
+    reg = Registry()
+    reg.observe("jsonrpc_batch_size", (), 2)
+    reg.observe("jsonrpc_batch_size", (), 2000)
+    histogram = reg.get("jsonrpc_batch_size")
+    assert isinstance(histogram, Histogram)
+    assert histogram.buckets[1] == 0
+    assert histogram.buckets[2] == 1
+    assert histogram.buckets[1000] == 1
+    assert histogram.buckets[float("inf")] == 2
+    assert (histogram.sum, histogram.samples) == (2002, 2)
+
+
+def test_shards_are_added_up() -> None:
+    reg = Registry()
+
+    def count() -> None:
+        for _ in range(1000):
+            reg.inc("jsonrpc_calls_total", (("method", "ping"),))
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Folded into the total when their threads finished
+    assert not reg.shards
+    assert reg.get("jsonrpc_calls_total", method="ping") == 4000
+
+
+def test_live_shards_are_kept() -> None:
+    reg = Registry()
+    reg.inc("jsonrpc_calls_total")
+    counted = threading.Event()
+    done = threading.Event()
+
+    def count() -> None:
+        reg.observe("jsonrpc_batch_size", (), 2)
+        counted.set()
+        done.wait()
+
+    thread = threading.Thread(target=count)
+    thread.start()
+    counted.wait()
+    assert len(reg.shards) == 2
+    done.set()
+    thread.join()
+    assert len(reg.shards) == 1
+    histogram = reg.get("jsonrpc_batch_size")
+    assert isinstance(histogram, Histogram) and histogram.samples == 1
+    reg.clear()
+    assert not reg.snapshot()
+
+
+def test_clear() -> None:
+    reg = Registry()
+    reg.inc("jsonrpc_calls_total")
+    reg.clear()
+    assert not reg.snapshot()
+
+
+def test_merge() -> None:
+    key = ("jsonrpc_batch_size", ())
+    merged = merge([{key: [1.0, 2.0]}, {key: [3.0, 4.0]}])
+    assert merged == {key: [4.0, 6.0]}
+
+
+def test_render() -> None:
+    reg = Registry()
+    reg.inc("jsonrpc_calls_total", (("method", 'say "hi"'),))
+    reg.observe("jsonrpc_call_duration_seconds", (("method", "ping"),), 0.002)
+    lines = render(reg.snapshot()).decode().splitlines()
+    assert lines[:3] == [
+        "# HELP jsonrpc_calls_total Requests dispatched to a method.",
+        "# TYPE jsonrpc_calls_total counter",
+        'jsonrpc_calls_total{method="say \\"hi\\""} 1.0',
+    ]
+    assert "# TYPE jsonrpc_call_duration_seconds histogram" in lines
+    assert 'jsonrpc_call_duration_seconds_bucket{method="ping",le="0.001"} 0.0' in lines
+    assert 'jsonrpc_call_duration_seconds_bucket{method="ping",le="0.005"} 1.0' in lines
+    assert 'jsonrpc_call_duration_seconds_bucket{method="ping",le="+Inf"} 1.0' in lines
+    assert 'jsonrpc_call_duration_seconds_count{method="ping"} 1.0' in lines
+
+
+def test_render_empty() -> None:
+    assert render({}) == b""
+
+
+def test_collect(installed: None) -> None:
+    dispatch(BATCH, {"ping": ping, "fail": fail})
+    assert registry.get("jsonrpc_calls_total", method="ping") == 1
+    assert registry.get("jsonrpc_successes_total", method="ping") == 1
+    assert registry.get("jsonrpc_calls_total", method="fail") == 1
+    assert registry.get("jsonrpc_successes_total", method="fail") is None
+    assert registry.get("jsonrpc_errors_total", method="fail", code="1") == 1
+    assert registry.get("jsonrpc_errors_total", method="unknown", code="-32601") == 1
+    assert registry.get("jsonrpc_in_flight", method="ping") == 0
+    duration = registry.get("jsonrpc_call_duration_seconds", method="ping")
+    assert isinstance(duration, Histogram) and duration.samples == 1
+    batch_size = registry.get("jsonrpc_batch_size")
+    assert isinstance(batch_size, Histogram) and batch_size.sum == 3
+    request_bytes = registry.get("jsonrpc_request_bytes")
+    assert isinstance(request_bytes, Histogram) and request_bytes.sum == len(BATCH)
+    assert isinstance(registry.get("jsonrpc_response_bytes"), Histogram)
+
+
+def test_collect_parse_error(installed: None) -> None:
+    dispatch("{", {})
+    assert registry.get("jsonrpc_errors_total", method="unknown", code="-32700") == 1
+
+
+def test_collect_unknown_methods(installed: None) -> None:
+    for name in ("a", "b", "c"):
+        dispatch(f'{{"jsonrpc": "2.0", "method": "{name}", "id": 1}}', {})
+    dispatch('{"jsonrpc": "2.0", "method": "d"}', {})  # A notification
+    dispatch(
+        '{"jsonrpc": "2.0", "method": "e", "id": 1, "x": 1}', {}
+    )  # Invalid request
+    # Made-up method names don't make new series
+    assert {labels for _, labels in registry.snapshot()} <= {
+        (("method", "unknown"),),
+        (("code", "-32600"), ("method", "unknown")),
+        (("code", "-32601"), ("method", "unknown")),
+        (),
+    }
+    assert registry.get("jsonrpc_calls_total", method="unknown") == 4
+
+
+def test_not_installed() -> None:
+    registry.clear()
+    dispatch(BATCH, {"ping": ping, "fail": fail})
+    assert not registry.snapshot()
+
+
+@pytest.mark.asyncio
+async def test_in_flight(installed: None) -> None:
+    request = '{"jsonrpc": "2.0", "method": "sleep", "id": 1}'
+    task = asyncio.ensure_future(async_dispatch(request, {"sleep": async_sleep}))
+    await asyncio.sleep(0.01)
+    assert registry.get("jsonrpc_in_flight", method="sleep") == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert registry.get("jsonrpc_in_flight", method="sleep") == 0
+
+
+@pytest.mark.asyncio
+async def test_in_flight_call_raises(installed: None) -> None:
+    request = '{"jsonrpc": "2.0", "method": "sleep", "id": 1}'
+    with patch("jsonrpcserver.async_dispatcher.call_cached", side_effect=RuntimeError):
+        await async_dispatch(request, {"sleep": async_sleep})
+    assert registry.get("jsonrpc_in_flight", method="sleep") == 0
+
+
+def test_exporter(installed: None) -> None:
+    dispatch('{"jsonrpc": "2.0", "method": "ping", "id": 1}', {"ping": ping})
+    assert b'jsonrpc_calls_total{method="ping"} 1.0' in Exporter().render()
+
+
+def test_exporter_directory(installed: None, tmp_path: Path) -> None:
+    dead_pid = 2**22 + 1  # Above the kernel's limit on pids
+    (tmp_path / f"{dead_pid}.json").write_text(
+        json.dumps(
+            [
+                ["jsonrpc_calls_total", [["method", "ping"]], 2.0],
+                ["jsonrpc_in_flight", [["method", "ping"]], 5.0],
+            ]
+        ),
+        encoding="utf-8",
+    )
+    dispatch('{"jsonrpc": "2.0", "method": "ping", "id": 1}', {"ping": ping})
+    snapshot = Exporter(str(tmp_path)).collect()
+    assert snapshot[("jsonrpc_calls_total", (("method", "ping"),))] == 3.0
+    # The dead worker's gauge is dropped
+    assert snapshot[("jsonrpc_in_flight", (("method", "ping"),))] == 0.0
+
+
+def test_exporter_flush_interval(installed: None, tmp_path: Path) -> None:
+    exporter = Exporter(str(tmp_path), interval=60)
+    exporter.flush()
+    (path,) = tmp_path.iterdir()
+    path.unlink()
+    exporter.flush()
+    assert not list(tmp_path.iterdir())
+    exporter.flush(force=True)
+    assert len(list(tmp_path.iterdir())) == 1
@@ -0,0 +1,196 @@
+"""Test prefork.py"""
+import json
+import os
+import signal
+import socket
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List
+from unittest.mock import patch
+from urllib.error import URLError
+from urllib.request import urlopen
+
+import pytest
+
+from jsonrpcserver import Success, method, prefork as prefork_module
+from jsonrpcserver.async_server import run
+from jsonrpcserver.prefork import Supervisor, prefork
+from jsonrpcserver.result import Result
+from jsonrpcserver.server import serve
+
+# pylint: disable=missing-function-docstring
+
+
+@method
+def worker_pid() -> Result:
+    return Success(os.getpid())
+
+
+@method(name="async_worker_pid")
+async def async_worker_pid() -> Result:
+    return Success(os.getpid())
+
+
+def fork(func: Callable[[], None]) -> int:
+    pid = os.fork()
+    if pid == 0:
+        try:
+            func()
+        finally:
+            os._exit(0)  # pylint: disable=protected-access
+    return pid
+
+
+def stop(pid: int) -> int:
+    os.kill(pid, signal.SIGTERM)
+    _, status = os.waitpid(pid, 0)
+    return status
+
+
+@contextmanager
+def forked(func: Callable[[], None]) -> Iterator[int]:
+    """Run func in a child process, stopping it afterwards."""
+    pid = fork(func)
+    try:
+        yield pid
+    finally:
+        assert stop(pid) == 0
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return int(sock.getsockname()[1])
+
+
+def read_lines(pipe: int, count: int) -> List[str]:
+    data = b""
+    while data.count(b"\n") < count:
+        data += os.read(pipe, 1024)
+    return data.decode().splitlines()[:count]
+
+
+def request(port: int, name: str = "worker_pid") -> int:
+    """Request a worker's pid, retrying while workers are (re)starting."""
+    body = json.dumps({"jsonrpc": "2.0", "method": name, "id": 1}).encode()
+    for _ in range(100):
+        try:
+            with urlopen(f"http://127.0.0.1:{port}", body, timeout=5) as response:
+                return int(json.loads(response.read())["result"])
+        except (URLError, ConnectionError):
+            time.sleep(0.05)
+    raise AssertionError("Server didn't respond")
+
+
+def test_prefork_runs_workers() -> None:
+    read_fd, write_fd = os.pipe()
+
+    def target(index: int) -> None:
+        os.write(write_fd, f"{index}\n".encode())
+        signal.pause()
+
+    pid = fork(lambda: prefork(target, 3))
+    assert sorted(read_lines(read_fd, 3)) == ["0", "1", "2"]
+    assert stop(pid) == 0
+
+
+def test_prefork_restarts_workers(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prefork_module, "RESTART_DELAY", 0)
+    read_fd, write_fd = os.pipe()
+
+    def target(index: int) -> None:
+        os.write(write_fd, f"{index} {os.getpid()}\n".encode())
+        time.sleep(0.01)
+        raise RuntimeError  # Dies, so is restarted
+
+    pid = fork(lambda: prefork(target, 1))
+    lines = read_lines(read_fd, 3)
+    assert stop(pid) == 0
+    assert [line.split()[0] for line in lines] == ["0", "0", "0"]
+    assert len({line.split()[1] for line in lines}) == 3
+
+
+def test_prefork_backs_off(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prefork_module, "RESTART_DELAY", 0.05)
+    read_fd, write_fd = os.pipe()
+
+    def target(_: int) -> None:
+        os.write(write_fd, f"{time.monotonic()}\n".encode())
+        raise RuntimeError
+
+    pid = fork(lambda: prefork(target, 1))
+    starts = [float(line) for line in read_lines(read_fd, 4)]
+    assert stop(pid) == 0
+    # Waits 0.05, 0.1, then 0.2 seconds
+    gaps = [after - before for before, after in zip(starts, starts[1:])]
+    assert gaps[0] < gaps[2] and gaps[2] >= 0.2
+
+
+def test_prefork_stops_during_restart_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prefork_module, "RESTART_DELAY", 60)
+    read_fd, write_fd = os.pipe()
+
+    def target(_: int) -> None:
+        os.write(write_fd, b"started\n")
+        raise RuntimeError
+
+    pid = fork(lambda: prefork(target, 1))
+    read_lines(read_fd, 1)
+    time.sleep(0.05)
+    start = time.monotonic()
+    assert stop(pid) == 0
+    assert time.monotonic() - start < 5
+
+
+def test_restart_delay(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(prefork_module, "RESTART_DELAY", 1)
+    monkeypatch.setattr(prefork_module, "MAX_RESTART_DELAY", 10)
+    delays = [prefork_module.restart_delay(failures) for failures in range(1, 6)]
+    assert delays == [1, 2, 4, 8, 10]
+
+
+def test_reap_skips_unknown_children() -> None:
+    supervisor = Supervisor(lambda _: None, pin_cpus=False)
+    supervisor.children[1001] = 0
+    # A child the supervisor didn't fork, then no more
+    with patch("jsonrpcserver.prefork.os.waitpid", side_effect=[(1002, 1), (0, 0)]):
+        supervisor.reap()
+    assert supervisor.children == {1001: 0}
+    assert not supervisor.restarts
+
+
+def test_prefork_pin_cpus() -> None:
+    read_fd, write_fd = os.pipe()
+
+    def target(_: int) -> None:
+        os.write(write_fd, f"{len(os.sched_getaffinity(0))}\n".encode())
+        signal.pause()
+
+    pid = fork(lambda: prefork(target, 1, pin_cpus=True))
+    assert read_lines(read_fd, 1) == ["1"]
+    assert stop(pid) == 0
+
+
+def test_serve_workers() -> None:
+    port = free_port()
+    with forked(lambda: serve("127.0.0.1", port, workers=2)) as pid:
+        assert request(port) != pid
+
+
+def test_serve_max_requests() -> None:
+    port = free_port()
+    with forked(lambda: serve("127.0.0.1", port, max_requests=1)):
+        # A new worker for each request
+        assert len({request(port) for _ in range(3)}) == 3
+
+
+def test_run_workers() -> None:
+    port = free_port()
+    with forked(lambda: run(host="127.0.0.1", port=port, workers=2)) as pid:
+        assert request(port, "async_worker_pid") != pid
+
+
+def test_run_max_requests() -> None:
+    port = free_port()
+    with forked(lambda: run(host="127.0.0.1", port=port, max_requests=1)):
+        assert len({request(port, "async_worker_pid") for _ in range(3)}) == 3
@@ -0,0 +1,123 @@
+"""Test process_pool.py"""
+import hashlib
+import os
+from typing import Any, Iterator
+
+import pytest
+
+from jsonrpcserver import process_pool
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.exceptions import JsonRpcError
+from jsonrpcserver.main import dispatch
+from jsonrpcserver.methods import method
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring
+
+# Methods run in a worker process have to be module-level, so the worker can find them.
+
+
+@method(executor="process")
+def digest(data: str) -> Result:
+    return Success(hashlib.sha256(data.encode()).hexdigest())
+
+
+@method(executor="process")
+def pid() -> Result:
+    return Success(os.getpid())
+
+
+@method(executor="process")
+def greet(context: str, name: str) -> Result:
+    return Success(f"{context} {name}")
+
+
+@method(executor="process")
+def fail() -> Result:
+    raise JsonRpcError(-1, "Failed", "data")
+
+
+@method(executor="process")
+def divide() -> Result:
+    return Success(1 / 0)
+
+
+@method(executor="process")
+def crash() -> Result:
+    os._exit(1)  # pylint: disable=protected-access
+
+
+METHODS: Any = {
+    "digest": digest,
+    "pid": pid,
+    "greet": greet,
+    "fail": fail,
+    "divide": divide,
+    "crash": crash,
+}
+
+
+def request(name: str, params: str = "[]") -> str:
+    return f'{{"jsonrpc": "2.0", "method": "{name}", "params": {params}, "id": 1}}'
+
+
+@pytest.fixture(autouse=True)
+def shutdown_pool() -> Iterator[None]:
+    yield
+    process_pool.configure()
+
+
+def test_dispatch() -> None:
+    expected = hashlib.sha256(b"abc").hexdigest()
+    assert dispatch(request("digest", '["abc"]'), METHODS) == (
+        f'{{"jsonrpc": "2.0", "result": "{expected}", "id": 1}}'
+    )
+
+
+def test_runs_in_another_process() -> None:
+    assert str(os.getpid()) not in dispatch(request("pid"), METHODS)
+
+
+def test_context() -> None:
+    assert dispatch(request("greet", '["bob"]'), METHODS, context="hi") == (
+        '{"jsonrpc": "2.0", "result": "hi bob", "id": 1}'
+    )
+
+
+def test_jsonrpc_error() -> None:
+    assert dispatch(request("fail"), METHODS) == (
+        '{"jsonrpc": "2.0", "error": {"code": -1, "message": "Failed", "data": "data"},'
+        ' "id": 1}'
+    )
+
+
+def test_exception() -> None:
+    assert '"message": "Internal error"' in dispatch(request("divide"), METHODS)
+
+
+def test_crash_replaces_pool() -> None:
+    response = dispatch(request("crash"), METHODS)
+    assert '"message": "Internal error"' in response
+    assert "terminated abruptly" in response
+    assert '"result"' in dispatch(request("pid"), METHODS)
+
+
+def test_configure() -> None:
+    process_pool.configure(max_workers=1)
+    pids = {dispatch(request("pid"), METHODS) for _ in range(3)}
+    assert len(pids) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch() -> None:
+    expected = hashlib.sha256(b"abc").hexdigest()
+    assert await async_dispatch(request("digest", '["abc"]'), METHODS) == (
+        f'{{"jsonrpc": "2.0", "result": "{expected}", "id": 1}}'
+    )
+
+
+@pytest.mark.asyncio
+async def test_async_crash() -> None:
+    response = await async_dispatch(request("crash"), METHODS)
+    assert '"message": "Internal error"' in response
+    assert '"result"' in await async_dispatch(request("pid"), METHODS)
@@ -0,0 +1,136 @@
+"""Test rate_limit.py"""
+import json
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch as async_dispatch
+from jsonrpcserver.main import dispatch
+from jsonrpcserver.methods import method
+from jsonrpcserver.rate_limit import RateLimit
+from jsonrpcserver.result import Result, Success
+
+# pylint: disable=missing-function-docstring
+
+PING = '{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+RATE_LIMITED = (
+    '{"jsonrpc": "2.0", "error": {"code": -32002, "message": "Rate limit exceeded"},'
+    ' "id": 1}'
+)
+
+
+def test_burst_then_rate() -> None:
+    limit = RateLimit(2, burst=3)
+    with patch("jsonrpcserver.rate_limit.time.monotonic", return_value=100.0):
+        assert [limit.allow(None) for _ in range(4)] == [True, True, True, False]
+    with patch("jsonrpcserver.rate_limit.time.monotonic", return_value=100.5):
+        assert [limit.allow(None) for _ in range(2)] == [True, False]
+    with patch("jsonrpcserver.rate_limit.time.monotonic", return_value=200.0):
+        assert [limit.allow(None) for _ in range(4)] == [True, True, True, False]
+
+
+def test_default_burst() -> None:
+    assert RateLimit(10).burst == 10
+    assert RateLimit(0.1).burst == 1
+
+
+def test_per_client() -> None:
+    limit = RateLimit(1, key=str)
+    assert limit.allow("alice")
+    assert not limit.allow("alice")
+    assert limit.allow("bob")
+
+
+def test_max_clients() -> None:
+    limit = RateLimit(1, key=str, max_clients=2)
+    for client in ("a", "b", "c"):
+        limit.allow(client)
+    assert list(limit.buckets) == ["b", "c"]
+
+
+def test_dispatch() -> None:
+    calls: List[None] = []
+
+    @method(rate_limit=RateLimit(1, burst=1))
+    def ping() -> Result:
+        calls.append(None)
+        return Success("pong")
+
+    assert dispatch(PING, {"ping": ping}) == (
+        '{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+    )
+    assert dispatch(PING, {"ping": ping}) == RATE_LIMITED
+    assert len(calls) == 1
+
+
+def test_dispatch_before_binding() -> None:
+    @method(rate_limit=RateLimit(1, burst=1))
+    def ping() -> Result:
+        return Success("pong")
+
+    request = '{"jsonrpc": "2.0", "method": "ping", "params": [1], "id": 1}'
+    assert '"code": -32602' in dispatch(request, {"ping": ping})
+    assert dispatch(request, {"ping": ping}) == RATE_LIMITED
+
+
+def test_dispatch_per_client() -> None:
+    @method(rate_limit=RateLimit(1, burst=1, key=str))
+    def ping(_: str) -> Result:
+        return Success("pong")
+
+    assert '"result"' in dispatch(PING, {"ping": ping}, context="alice")
+    assert dispatch(PING, {"ping": ping}, context="alice") == RATE_LIMITED
+    assert '"result"' in dispatch(PING, {"ping": ping}, context="bob")
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch() -> None:
+    @method(rate_limit=RateLimit(1, burst=1))
+    async def ping() -> Result:
+        return Success("pong")
+
+    assert '"result"' in await async_dispatch(PING, {"ping": ping})
+    assert await async_dispatch(PING, {"ping": ping}) == RATE_LIMITED
+
+
+def user_key(context: Dict[str, str]) -> str:
+    return context["user"]
+
+
+BATCH = (
+    '[{"jsonrpc": "2.0", "method": "limited", "id": 1},'
+    ' {"jsonrpc": "2.0", "method": "ping", "id": 2}]'
+)
+
+
+def test_dispatch_key_error() -> None:
+    @method(rate_limit=RateLimit(1, key=user_key))
+    def limited(_: Any) -> Result:
+        return Success("ok")
+
+    def ping(_: Any) -> Result:
+        return Success("pong")
+
+    # The key function fails for this context, only failing its own request.
+    response = json.loads(
+        dispatch(BATCH, {"limited": limited, "ping": ping}, context={})
+    )
+    assert response[0]["error"]["code"] == -32603
+    assert response[1] == {"jsonrpc": "2.0", "result": "pong", "id": 2}
+
+
+@pytest.mark.asyncio
+async def test_async_dispatch_key_error() -> None:
+    @method(rate_limit=RateLimit(1, key=user_key))
+    async def limited(_: Any) -> Result:
+        return Success("ok")
+
+    async def ping(_: Any) -> Result:
+        return Success("pong")
+
+    response = json.loads(
+        await async_dispatch(BATCH, {"limited": limited, "ping": ping}, context={})
+    )
+    assert response[0]["error"]["code"] == -32603
+    assert response[1] == {"jsonrpc": "2.0", "result": "pong", "id": 2}
@@ -1,8 +1,11 @@
 """Test response.py"""
+import json
+from typing import Any, AsyncIterator, List
 from unittest.mock import sentinel
 
-from oslash.either import Left, Right  # type: ignore
+import pytest
 
+from jsonrpcserver.either import Left, Right
 from jsonrpcserver.response import (
     ErrorResponse,
     InvalidRequestResponse,
@@ -10,8 +13,13 @@ from jsonrpcserver.response import (
     ParseErrorResponse,
     ServerErrorResponse,
     SuccessResponse,
+    join_bytes,
+    join_bytes_stream,
+    join_bytes_stream_async,
+    to_bytes,
     to_serializable,
 )
+from jsonrpcserver.sentinels import NODATA
 
 # pylint: disable=missing-function-docstring,invalid-name,duplicate-code
 
@@ -106,3 +114,70 @@ def test_to_serializable_list() -> None:
             "id": sentinel.id,
         }
     ]
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        Right(SuccessResponse("foo", 1)),
+        Right(SuccessResponse({"foo": [1, None]}, "abc")),
+        Right(SuccessResponse(None, None)),
+        Right(SuccessResponse(1, 1.5)),
+        Right(SuccessResponse(1, True)),
+        Left(ErrorResponse(-32000, "Server error", "foo", 1)),
+        Left(ErrorResponse(-32000, "Server error", NODATA, None)),
+        Left(ErrorResponse(1, "foo", {"bar": "baz"}, "abc")),
+    ],
+)
+def test_to_bytes(response: Any) -> None:
+    """to_bytes should give the same as serializing the dict with json.dumps"""
+    assert (
+        to_bytes(response, lambda x: json.dumps(x).encode())
+        == json.dumps(to_serializable(response)).encode()
+    )
+
+
+def test_join_bytes() -> None:
+    assert join_bytes(b"{}") == b"{}"
+
+
+def test_join_bytes_batch() -> None:
+    assert join_bytes([b"{}", b"{}"]) == b"[{}, {}]"
+
+
+def test_join_bytes_none() -> None:
+    assert join_bytes(None) == b""
+
+
+def test_join_bytes_stream() -> None:
+    assert list(join_bytes_stream(False, [b"{}"])) == [b"{}"]
+
+
+def test_join_bytes_stream_batch() -> None:
+    assert list(join_bytes_stream(True, iter([b"{}", b"{}"]))) == [
+        b"[{}",
+        b", {}",
+        b"]",
+    ]
+
+
+def test_join_bytes_stream_empty() -> None:
+    assert not list(join_bytes_stream(True, []))
+    assert not list(join_bytes_stream(False, []))
+
+
+async def aiter_(items: List[bytes]) -> AsyncIterator[bytes]:
+    for item in items:
+        yield item
+
+
+@pytest.mark.parametrize(
+    "is_batch,responses",
+    [(False, [b"{}"]), (True, [b"{}", b"{}"]), (True, []), (False, [])],
+)
+@pytest.mark.asyncio
+async def test_join_bytes_stream_async(is_batch: bool, responses: List[bytes]) -> None:
+    parts = [
+        part async for part in join_bytes_stream_async(is_batch, aiter_(responses))
+    ]
+    assert parts == list(join_bytes_stream(is_batch, responses))
@@ -1,8 +1,7 @@
 """Test result.py"""
 from unittest.mock import sentinel
 
-from oslash.either import Left, Right  # type: ignore
-
+from jsonrpcserver.either import Left, Right
 from jsonrpcserver.result import (
     Error,
     ErrorResult,
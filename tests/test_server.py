@@ -1,11 +1,86 @@
 """Test server.py"""
+import threading
+from typing import Iterator, List
 from unittest.mock import Mock, patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
 
-from jsonrpcserver.server import serve
+import pytest
 
-# pylint: disable=missing-function-docstring
+from jsonrpcserver import metrics
+from jsonrpcserver.hooks import hooks
+from jsonrpcserver.metrics import Exporter
+from jsonrpcserver.result import Result, Success
+from jsonrpcserver.server import JsonRpcHTTPServer, RequestHandler, serve
 
+# pylint: disable=missing-function-docstring,redefined-outer-name
 
-@patch("jsonrpcserver.server.HTTPServer")
+
+@patch("jsonrpcserver.server.JsonRpcHTTPServer")
 def test_serve(*_: Mock) -> None:
     serve()
+
+
+@patch("jsonrpcserver.server.JsonRpcHTTPServer")
+def test_serve_metrics(server_class: Mock) -> None:
+    installed: List[bool] = []
+    serve_forever = server_class.return_value.serve_forever
+    serve_forever.side_effect = lambda: installed.append(metrics.collect in hooks)
+    serve(metrics=True)
+    assert isinstance(server_class.return_value.exporter, Exporter)
+    # Collected while serving, not after
+    assert installed == [True]
+    assert metrics.collect not in hooks
+
+
+@patch("jsonrpcserver.server.prefork")
+def test_serve_metrics_workers(prefork_: Mock) -> None:
+    serve(workers=2, metrics=True)
+    prefork_.assert_called_once()
+    assert metrics.collect not in hooks
+
+
+@pytest.fixture
+def server() -> Iterator[JsonRpcHTTPServer]:
+    server = JsonRpcHTTPServer(("127.0.0.1", 0), RequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def url(server: JsonRpcHTTPServer, path: str) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def ping() -> Result:
+    return Success("pong")
+
+
+def test_metrics(server: JsonRpcHTTPServer) -> None:
+    server.exporter = Exporter()
+    metrics.install()
+    metrics.registry.clear()
+    try:
+        with patch.dict("jsonrpcserver.methods.global_methods", {"ping": ping}):
+            body = b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+            with urlopen(Request(url(server, "/"), body)) as response:
+                assert (
+                    response.read() == b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+                )
+        with urlopen(url(server, "/metrics")) as response:
+            assert response.headers["Content-Type"] == metrics.CONTENT_TYPE
+            assert b'jsonrpc_calls_total{method="ping"} 1.0' in response.read()
+    finally:
+        metrics.uninstall()
+
+
+def test_metrics_not_served(server: JsonRpcHTTPServer) -> None:
+    try:
+        urlopen(url(server, "/metrics"))  # pylint: disable=consider-using-with
+    except HTTPError as exc:
+        assert exc.code == 404
+    else:
+        pytest.fail("Expected a 404")
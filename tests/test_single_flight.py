@@ -0,0 +1,161 @@
+"""Test single_flight.py"""
+import asyncio
+from typing import List
+
+import pytest
+
+from jsonrpcserver.async_main import dispatch
+from jsonrpcserver.cache import Cache
+from jsonrpcserver.methods import method
+from jsonrpcserver.result import Result, Success
+from jsonrpcserver.single_flight import coalesce, flights
+
+# pylint: disable=missing-function-docstring
+
+
+def request(params: str, id_: int) -> str:
+    return f'{{"jsonrpc": "2.0", "method": "slow", "params": {params}, "id": {id_}}}'
+
+
+@pytest.mark.asyncio
+async def test_coalesce() -> None:
+    calls: List[int] = []
+
+    async def start() -> int:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    results = await asyncio.gather(*(coalesce("key", start) for _ in range(3)))
+    assert results == [1, 1, 1]
+    assert not flights
+    assert await coalesce("key", start) == 2  # A new call, once the first completed
+
+
+@pytest.mark.asyncio
+async def test_coalesce_one_caller_cancelled() -> None:
+    async def start() -> str:
+        await asyncio.sleep(0.02)
+        return "done"
+
+    first = asyncio.ensure_future(coalesce("key", start))
+    second = asyncio.ensure_future(coalesce("key", start))
+    await asyncio.sleep(0.005)
+    first.cancel()
+    assert await second == "done"
+    assert first.cancelled()
+    assert not flights
+
+
+@pytest.mark.asyncio
+async def test_coalesce_all_callers_cancelled() -> None:
+    started = asyncio.Event()
+    cancelled: List[bool] = []
+
+    async def start() -> None:
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    callers = [asyncio.ensure_future(coalesce("key", start)) for _ in range(2)]
+    await started.wait()
+    for caller in callers:
+        caller.cancel()
+    await asyncio.wait(callers)
+    await asyncio.sleep(0)
+    assert cancelled == [True]
+    assert not flights
+
+
+@pytest.mark.asyncio
+async def test_dispatch() -> None:
+    calls: List[int] = []
+
+    @method(single_flight=True)
+    async def slow(number: int) -> Result:
+        calls.append(number)
+        await asyncio.sleep(0.01)
+        return Success(number)
+
+    methods = {"slow": slow}
+    responses = await asyncio.gather(
+        dispatch(request("[1]", 1), methods),
+        dispatch(request("[1]", 2), methods),
+        dispatch(request("[2]", 3), methods),
+    )
+    assert list(responses) == [
+        '{"jsonrpc": "2.0", "result": 1, "id": 1}',
+        '{"jsonrpc": "2.0", "result": 1, "id": 2}',
+        '{"jsonrpc": "2.0", "result": 2, "id": 3}',
+    ]
+    assert calls == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_coalesce_caller_timeout() -> None:
+    async def start() -> str:
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.ensure_future(coalesce("key", start, timeout=0.01))
+    second = asyncio.ensure_future(coalesce("key", start))
+    with pytest.raises(asyncio.TimeoutError):
+        await first
+    # The call carries on for the other caller
+    assert await second == "done"
+    assert not flights
+
+
+@pytest.mark.asyncio
+async def test_dispatch_timeout_is_per_caller() -> None:
+    @method(single_flight=True)
+    async def slow(number: int) -> Result:
+        await asyncio.sleep(0.05)
+        return Success(number)
+
+    methods = {"slow": slow}
+    responses = await asyncio.gather(
+        dispatch(request("[1]", 1), methods, timeout=0.01),
+        dispatch(request("[1]", 2), methods),
+    )
+    assert '"code": -32001' in responses[0]
+    assert responses[1] == '{"jsonrpc": "2.0", "result": 1, "id": 2}'
+
+
+@pytest.mark.asyncio
+async def test_dispatch_batch() -> None:
+    calls: List[int] = []
+
+    @method(single_flight=True)
+    async def slow(number: int) -> Result:
+        calls.append(number)
+        await asyncio.sleep(0.01)
+        return Success(number)
+
+    batch = f'[{request("[1]", 1)}, {request("[1]", 2)}]'
+    assert await dispatch(batch, {"slow": slow}) == (
+        '[{"jsonrpc": "2.0", "result": 1, "id": 1},'
+        ' {"jsonrpc": "2.0", "result": 1, "id": 2}]'
+    )
+    assert calls == [1]
+
+
+@pytest.mark.asyncio
+async def test_dispatch_with_cache() -> None:
+    calls: List[int] = []
+    cache = Cache()
+
+    @method(single_flight=True, cache=cache)
+    async def slow(number: int) -> Result:
+        calls.append(number)
+        await asyncio.sleep(0.01)
+        return Success(number)
+
+    methods = {"slow": slow}
+    await asyncio.gather(*(dispatch(request("[1]", i), methods) for i in range(3)))
+    await dispatch(request("[1]", 4), methods)
+    assert calls == [1]
+    assert cache.stats().hits == 1
@@ -0,0 +1,251 @@
+"""Test stream_server.py"""
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, List, Tuple
+from unittest.mock import patch
+
+import pytest
+import pytest_asyncio
+
+from jsonrpcserver.result import Result, Success
+from jsonrpcserver.stream_server import (
+    FramingError,
+    StreamServer,
+    frame,
+    read_message,
+)
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+PING = b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+PONG = b'{"jsonrpc": "2.0", "result": "pong", "id": 1}'
+
+
+async def ping() -> Result:
+    return Success("pong")
+
+
+async def sleep(seconds: float) -> Result:
+    await asyncio.sleep(seconds)
+    return Success(seconds)
+
+
+def sleep_request(seconds: float, request_id: int) -> bytes:
+    return json.dumps(
+        {"jsonrpc": "2.0", "method": "sleep", "params": [seconds], "id": request_id}
+    ).encode()
+
+
+async def receive(reader: asyncio.StreamReader) -> Any:
+    message = await asyncio.wait_for(read_message(reader, "length", 1 << 20), 2)
+    assert message is not None
+    return json.loads(message)
+
+
+@pytest_asyncio.fixture
+async def server() -> AsyncIterator[StreamServer]:
+    server = StreamServer({"ping": ping, "sleep": sleep}, idle_timeout=1)
+    await server.start("127.0.0.1", 0)
+    yield server
+    await server.shutdown(timeout=1)
+
+
+async def connect(server: StreamServer) -> Streams:
+    return await asyncio.open_connection("127.0.0.1", server.port)
+
+
+@pytest.mark.parametrize("framing", ["length", "newline"])
+@pytest.mark.asyncio
+async def test_read_message(framing: str) -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame(PING, framing) + frame(PONG, framing))
+    reader.feed_eof()
+    for expected in (PING, PONG):
+        message = await read_message(reader, framing, 100)
+        assert message is not None and message.strip() == expected
+    assert await read_message(reader, framing, 100) is None
+
+
+@pytest.mark.asyncio
+async def test_read_message_newline_skips_blank_lines() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(b"\r\n\n" + PING + b"\r\n")
+    assert await read_message(reader, "newline", 100) == PING + b"\r\n"
+
+
+@pytest.mark.asyncio
+async def test_read_message_too_big() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame(PING, "length"))
+    with pytest.raises(FramingError):
+        await read_message(reader, "length", len(PING) - 1)
+
+
+@pytest.mark.asyncio
+async def test_read_message_incomplete() -> None:
+    reader = asyncio.StreamReader()
+    reader.feed_data(frame(PING, "length")[:-1])
+    reader.feed_eof()
+    with pytest.raises(FramingError):
+        await read_message(reader, "length", 100)
+
+
+def test_framing() -> None:
+    assert frame(b"{}", "length") == b"\x00\x00\x00\x02{}"
+    assert frame(b"{}", "newline") == b"{}\n"
+    with pytest.raises(ValueError):
+        StreamServer(framing="xml")
+
+
+@pytest.mark.asyncio
+async def test_request(server: StreamServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(frame(PING, "length"))
+    assert await receive(reader) == json.loads(PONG)
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_newline() -> None:
+    server = StreamServer({"ping": ping}, framing="newline")
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writer.write(PING + b"\n")
+    assert await reader.readline() == PONG + b"\n"
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_unix_socket(tmp_path: Path) -> None:
+    path = str(tmp_path / "jsonrpc.sock")
+    server = StreamServer({"ping": ping})
+    await server.start_unix(path)
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(frame(PING, "length"))
+    assert await receive(reader) == json.loads(PONG)
+    writer.close()
+    await server.shutdown()
+    assert not Path(path).exists()
+
+
+@pytest.mark.asyncio
+async def test_pipelined_out_of_order(server: StreamServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(
+        frame(sleep_request(0.2, 1), "length")
+        + frame(sleep_request(0.1, 2), "length")
+        + frame(PING.replace(b'"id": 1', b'"id": 3'), "length")
+    )
+    responses = [await receive(reader) for _ in range(3)]
+    # Dispatched concurrently, so the responses come as they're ready
+    assert [response["id"] for response in responses] == [3, 2, 1]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_write_coalescing() -> None:
+    release = asyncio.Event()
+
+    async def wait() -> Result:
+        await release.wait()
+        return Success()
+
+    server = StreamServer({"wait": wait})
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writes: List[bytes] = []
+    original = asyncio.StreamWriter.write
+
+    def record(stream_writer: asyncio.StreamWriter, data: bytes) -> None:
+        if stream_writer is not writer:
+            writes.append(data)
+        original(stream_writer, data)
+
+    with patch.object(asyncio.StreamWriter, "write", record):
+        for request_id in range(3):
+            message = {"jsonrpc": "2.0", "method": "wait", "id": request_id}
+            writer.write(frame(json.dumps(message).encode(), "length"))
+        await asyncio.sleep(0.05)
+        release.set()
+        responses = [await receive(reader) for _ in range(3)]
+    # Ready at the same time, so written together
+    assert len(writes) == 1
+    assert [response["id"] for response in responses] == [0, 1, 2]
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_notification(server: StreamServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(
+        frame(b'{"jsonrpc": "2.0", "method": "ping"}', "length") + frame(PING, "length")
+    )
+    assert await receive(reader) == json.loads(PONG)
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_message_too_big() -> None:
+    server = StreamServer({"ping": ping}, max_message_size=10)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writer.write(frame(PING, "length"))
+    assert await asyncio.wait_for(reader.read(), 1) == b""
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_backpressure() -> None:
+    server = StreamServer({"sleep": sleep}, max_pipeline=2)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writer.write(b"".join(frame(sleep_request(0.1, i), "length") for i in range(4)))
+    await asyncio.sleep(0.05)
+    # Only max_pipeline requests have been read and dispatched
+    connection = next(iter(server.connections.values()))
+    assert len(connection.tasks) == 2
+    responses = [await receive(reader) for _ in range(4)]
+    assert sorted(response["id"] for response in responses) == [0, 1, 2, 3]
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout() -> None:
+    server = StreamServer({"ping": ping}, idle_timeout=0.05)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await connect(server)
+    writer.write(frame(PING, "length"))
+    assert await receive(reader) == json.loads(PONG)
+    # Closed once idle
+    assert await asyncio.wait_for(reader.read(), 1) == b""
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_finishes_requests_in_flight(server: StreamServer) -> None:
+    reader, writer = await connect(server)
+    writer.write(frame(sleep_request(0.1, 1), "length"))
+    await asyncio.sleep(0.01)
+    await server.shutdown(timeout=1)
+    assert (await receive(reader))["id"] == 1
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_max_connections() -> None:
+    server = StreamServer({"ping": ping}, max_connections=1)
+    await server.start("127.0.0.1", 0)
+    _, writer1 = await connect(server)
+    await asyncio.sleep(0.01)
+    reader2, writer2 = await connect(server)
+    assert await asyncio.wait_for(reader2.read(), 1) == b""
+    writer1.close()
+    writer2.close()
+    await server.shutdown()
@@ -0,0 +1,100 @@
+"""Test validator.py
+
+The built-in validator must accept and reject exactly the same requests as the
+jsonschema validator, so most of these tests check the two against each other.
+"""
+import random
+from decimal import Decimal
+from typing import Any, Callable, List
+
+import pytest
+
+from jsonrpcserver.main import jsonschema_validator
+from jsonrpcserver.validator import validate
+
+# pylint: disable=missing-function-docstring
+
+REQUEST = {"jsonrpc": "2.0", "method": "ping"}
+
+CASES: List[Any] = [
+    # Valid
+    REQUEST,
+    {**REQUEST, "id": 1},
+    {**REQUEST, "id": 1.5},
+    {**REQUEST, "id": "abc"},
+    {**REQUEST, "id": None},
+    {**REQUEST, "id": Decimal("1.5")},
+    {**REQUEST, "params": []},
+    {**REQUEST, "params": [1, 2]},
+    {**REQUEST, "params": {}},
+    {**REQUEST, "params": {"foo": "bar"}, "id": 1},
+    {**REQUEST, "method": ""},
+    [REQUEST],
+    [REQUEST, {**REQUEST, "id": 1}],
+    # Invalid
+    {},
+    [],
+    [[]],
+    [[REQUEST]],
+    None,
+    1,
+    "",
+    "string",
+    True,
+    {"jsonrpc": "2.0"},
+    {"method": "ping"},
+    {**REQUEST, "jsonrpc": "1.0"},
+    {**REQUEST, "jsonrpc": 2.0},
+    {**REQUEST, "jsonrpc": 2},
+    {**REQUEST, "jsonrpc": None},
+    {**REQUEST, "method": 1},
+    {**REQUEST, "method": None},
+    {**REQUEST, "method": ["ping"]},
+    {**REQUEST, "id": True},
+    {**REQUEST, "id": False},
+    {**REQUEST, "id": []},
+    {**REQUEST, "id": {}},
+    {**REQUEST, "params": "foo"},
+    {**REQUEST, "params": 1},
+    {**REQUEST, "params": None},
+    {**REQUEST, "params": True},
+    {**REQUEST, "foo": "bar"},
+    {**REQUEST, "note": "id has a 'note' keyword, but it's not a property"},
+    {**REQUEST, 1: "non-string key"},
+    [REQUEST, {}],
+    [REQUEST, 1],
+    [REQUEST, None],
+]
+
+
+def is_valid(validator: Callable[[Any], Any], request: Any) -> bool:
+    try:
+        validator(request)
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
+@pytest.mark.parametrize("request_", CASES)
+def test_validate_conforms_to_schema(request_: Any) -> None:
+    assert is_valid(validate, request_) == is_valid(jsonschema_validator, request_)
+
+
+def test_validate_conforms_to_schema_random() -> None:
+    values: List[Any] = [None, True, 0, 1.5, "", "2.0", "ping", [], [1], {}, {"a": 1}]
+    keys = ["jsonrpc", "method", "id", "params", "foo"]
+    rand = random.Random(0)
+    for _ in range(2000):
+        request = {
+            key: rand.choice(values) for key in rand.sample(keys, rand.randint(0, 5))
+        }
+        assert is_valid(validate, request) == is_valid(jsonschema_validator, request)
+
+
+def test_validate_returns_request() -> None:
+    assert validate(REQUEST) is REQUEST
+
+
+def test_validate_invalid() -> None:
+    with pytest.raises(ValueError):
+        validate({})
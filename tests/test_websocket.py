@@ -0,0 +1,279 @@
+"""Test websocket.py"""
+import asyncio
+import json
+import os
+from typing import AsyncIterator, List, Tuple
+
+import pytest
+import pytest_asyncio
+
+from jsonrpcserver.async_server import HttpServer
+from jsonrpcserver.background import AsyncBackgroundQueue
+from jsonrpcserver.result import Result, Success
+from jsonrpcserver.websocket import (
+    BINARY,
+    CLOSE,
+    CONTINUATION,
+    PING,
+    PONG,
+    TEXT,
+    accept_key,
+    encode_frame,
+    handshake_response,
+    is_upgrade,
+    read_frame,
+    unmask,
+)
+
+# pylint: disable=missing-function-docstring,redefined-outer-name
+
+Streams = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+HANDSHAKE = (
+    b"GET / HTTP/1.1\r\n"
+    b"Host: localhost\r\n"
+    b"Upgrade: websocket\r\n"
+    b"Connection: keep-alive, Upgrade\r\n"
+    b"Sec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n"
+    b"Sec-WebSocket-Version: 13\r\n"
+    b"\r\n"
+)
+
+
+async def ping() -> Result:
+    return Success("pong")
+
+
+async def sleep(seconds: float) -> Result:
+    await asyncio.sleep(seconds)
+    return Success(seconds)
+
+
+def request(method: str, params: List[float], request_id: int) -> bytes:
+    return json.dumps(
+        {"jsonrpc": "2.0", "method": method, "params": params, "id": request_id}
+    ).encode()
+
+
+# A minimal client, sending masked frames as the RFC requires of clients.
+
+
+def send(writer: asyncio.StreamWriter, payload: bytes, opcode: int = TEXT) -> None:
+    writer.write(encode_frame(opcode, payload, os.urandom(4)))
+
+
+async def receive(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    frame = await asyncio.wait_for(read_frame(reader, 1 << 20), 2)
+    assert frame.fin and not frame.masked
+    return frame.opcode, frame.payload
+
+
+async def open_websocket(server: HttpServer) -> Streams:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(HANDSHAKE)
+    head = await reader.readuntil(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 101 Switching Protocols\r\n")
+    assert b"Sec-WebSocket-Accept: s3pPLMBiTxaQ9kYGzzhZRbK+xOo=\r\n" in head
+    return reader, writer
+
+
+@pytest_asyncio.fixture
+async def server() -> AsyncIterator[HttpServer]:
+    server = HttpServer({"ping": ping, "sleep": sleep}, idle_timeout=1)
+    await server.start("127.0.0.1", 0)
+    yield server
+    await server.shutdown(timeout=1)
+
+
+def test_accept_key() -> None:
+    # The example from RFC 6455
+    assert accept_key("dGhlIHNhbXBsZSBub25jZQ==") == "s3pPLMBiTxaQ9kYGzzhZRbK+xOo="
+
+
+def test_is_upgrade() -> None:
+    assert is_upgrade({"upgrade": "WebSocket", "connection": "keep-alive, Upgrade"})
+    assert not is_upgrade({"upgrade": "websocket"})
+    assert not is_upgrade({"connection": "upgrade"})
+
+
+def test_handshake_response() -> None:
+    headers = {"sec-websocket-key": "abc", "sec-websocket-version": "13"}
+    response = handshake_response(headers)
+    assert response is not None and b"Sec-WebSocket-Protocol" not in response
+    response = handshake_response({**headers, "sec-websocket-protocol": "a, jsonrpc"})
+    assert response is not None
+    assert b"Sec-WebSocket-Protocol: jsonrpc\r\n" in response
+    assert handshake_response({"sec-websocket-key": "abc"}) is None
+
+
+def test_unmask() -> None:
+    mask = b"\x01\x02\x03\x04"
+    payload = b"hello world"
+    masked = bytes(byte ^ mask[i % 4] for i, byte in enumerate(payload))
+    assert unmask(masked, mask) == payload
+    assert unmask(b"", mask) == b""
+
+
+@pytest.mark.parametrize("length", [0, 125, 126, 65535, 65536])
+@pytest.mark.asyncio
+async def test_frame_round_trip(length: int) -> None:
+    payload = os.urandom(length)
+    for mask in (b"", b"abcd"):
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_frame(BINARY, payload, mask))
+        frame = await read_frame(reader, length)
+        assert frame == (True, BINARY, payload, bool(mask))
+
+
+@pytest.mark.asyncio
+async def test_request(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    send(writer, b'{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    assert await receive(reader) == (
+        TEXT,
+        b'{"jsonrpc": "2.0", "result": "pong", "id": 1}',
+    )
+    send(writer, b'{"jsonrpc": "2.0", "method": "ping", "id": 2}', BINARY)
+    assert await receive(reader) == (
+        BINARY,
+        b'{"jsonrpc": "2.0", "result": "pong", "id": 2}',
+    )
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_out_of_order(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    send(writer, request("sleep", [0.2], 1))
+    send(writer, request("sleep", [0.1], 2))
+    send(writer, request("ping", [], 3))
+    responses = [json.loads((await receive(reader))[1]) for _ in range(3)]
+    # Run concurrently, so responses come as they're ready
+    assert [response["id"] for response in responses] == [3, 2, 1]
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_fragmented_message_with_ping(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    message = b'{"jsonrpc": "2.0", "method": "ping", "id": 1}'
+    mask = os.urandom(4)
+    writer.write(bytes([TEXT, 0x80 | 10]) + mask + unmask(message[:10], mask))
+    send(writer, b"are you there", PING)
+    writer.write(
+        bytes([0x80 | CONTINUATION, 0x80 | len(message) - 10])
+        + mask
+        + unmask(message[10:], mask)
+    )
+    assert await receive(reader) == (PONG, b"are you there")
+    assert await receive(reader) == (
+        TEXT,
+        b'{"jsonrpc": "2.0", "result": "pong", "id": 1}',
+    )
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_notification(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    send(writer, b'{"jsonrpc": "2.0", "method": "ping"}')
+    send(writer, b'{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    # No response to the notification
+    assert json.loads((await receive(reader))[1])["id"] == 1
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_client_close(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    send(writer, request("sleep", [0.05], 1))
+    send(writer, b"\x03\xe8", CLOSE)
+    # Requests in flight are finished before closing
+    assert json.loads((await receive(reader))[1])["id"] == 1
+    assert await receive(reader) == (CLOSE, b"\x03\xe8")
+    assert await reader.read() == b""
+
+
+@pytest.mark.asyncio
+async def test_unmasked_frame(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    writer.write(encode_frame(TEXT, b"{}"))
+    opcode, payload = await receive(reader)
+    assert (opcode, payload[:2]) == (CLOSE, b"\x03\xea")  # 1002, Protocol error
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_message_too_big() -> None:
+    server = HttpServer({"ping": ping}, max_body_size=10)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await open_websocket(server)
+    send(writer, b'{"jsonrpc": "2.0", "method": "ping", "id": 1}')
+    opcode, payload = await receive(reader)
+    assert (opcode, payload[:2]) == (CLOSE, b"\x03\xf1")  # 1009, Message too big
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_bad_handshake(server: HttpServer) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.port)
+    writer.write(HANDSHAKE.replace(b"Version: 13", b"Version: 8"))
+    head = await reader.readuntil(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 400 Bad Request\r\n")
+    writer.close()
+
+
+@pytest.mark.asyncio
+async def test_backpressure() -> None:
+    server = HttpServer({"sleep": sleep}, max_pipeline=2)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await open_websocket(server)
+    for request_id in range(4):
+        send(writer, request("sleep", [0.1], request_id))
+    await asyncio.sleep(0.05)
+    # Only max_pipeline messages have been read and dispatched
+    websocket = next(iter(server.connections.values())).websocket
+    assert websocket is not None and len(websocket.tasks) == 2
+    responses = [json.loads((await receive(reader))[1]) for _ in range(4)]
+    assert sorted(response["id"] for response in responses) == [0, 1, 2, 3]
+    writer.close()
+    await server.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_shutdown_finishes_requests_in_flight(server: HttpServer) -> None:
+    reader, writer = await open_websocket(server)
+    send(writer, request("sleep", [0.1], 1))
+    await asyncio.sleep(0.01)
+    await server.shutdown(timeout=1)
+    assert json.loads((await receive(reader))[1])["id"] == 1
+    assert await receive(reader) == (CLOSE, b"\x03\xe9")  # 1001, Going away
+
+
+@pytest.mark.asyncio
+async def test_queue_full() -> None:
+    background = AsyncBackgroundQueue(max_pending=1, overflow="reject")
+    server = HttpServer({"sleep": sleep}, background=background)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await open_websocket(server)
+    for _ in range(2):
+        send(writer, b'{"jsonrpc": "2.0", "method": "sleep", "params": [10]}')
+    opcode, payload = await receive(reader)
+    assert (opcode, payload[:2]) == (CLOSE, b"\x03\xf5")  # 1013, Try again later
+    writer.close()
+    await server.shutdown(timeout=0.01)
+
+
+@pytest.mark.asyncio
+async def test_idle_timeout() -> None:
+    server = HttpServer({"sleep": sleep}, idle_timeout=0.05)
+    await server.start("127.0.0.1", 0)
+    reader, writer = await open_websocket(server)
+    # Not idle while a request is in flight
+    send(writer, request("sleep", [0.1], 1))
+    assert json.loads((await receive(reader))[1])["id"] == 1
+    opcode, payload = await receive(reader)
+    assert (opcode, payload[:2]) == (CLOSE, b"\x03\xe9")  # 1001, Going away
+    writer.close()
+    await server.shutdown()